@@ -1,3 +1,35 @@
 FROM gcc:latest
+# Interpreter of the test runner, and ccache for the compiler containers
+RUN apt-get update \
+    && apt-get install -y --no-install-recommends python3 ccache \
+    && rm -rf /var/lib/apt/lists/*
+# Precompile <bits/stdc++.h> with the flags of the judge, g++ picks the .gch
+# next to the header when the flags match
+RUN header=$(echo '#include <bits/stdc++.h>' \
+        | g++ -std=c++17 -x c++ -H -fsyntax-only - 2>&1 \
+        | grep -m1 'bits/stdc++.h' | awk '{print $2}') \
+    && g++ -std=c++17 -x c++-header "$header" -o "$header.gch"
+# g++ of /opt/ccache/bin goes through ccache, compiler containers put it
+# first in PATH. /ccache is owned by the sandbox user so that a new ccache
+# volume mounted there is writable.
+RUN mkdir -p /opt/ccache/bin \
+    && ln -s /usr/bin/ccache /opt/ccache/bin/g++ \
+    && mkdir /ccache && chown 1000:1000 /ccache
+# testlib.h for special judges of problems, pinned to a commit of testlib
+# and the sha256 of the header there, so that builds are reproducible:
+#   docker build --build-arg TESTLIB_COMMIT=<commit> \
+#       --build-arg TESTLIB_SHA256=<sha256> -t cpp-eval-env -f Dockerfile.cpp .
+# Without a pin the image is built without testlib.h, and checkers including
+# it fail to compile. A commit without its sha256 fails the build.
+ARG TESTLIB_COMMIT=""
+ARG TESTLIB_SHA256=""
+RUN if [ -z "$TESTLIB_COMMIT" ]; then \
+        echo "testlib.h is not pinned, special judges cannot include it"; \
+    else \
+        curl -fsSL -o /usr/local/include/testlib.h \
+            "https://raw.githubusercontent.com/MikeMirzayanov/testlib/${TESTLIB_COMMIT}/testlib.h" \
+        && echo "${TESTLIB_SHA256}  /usr/local/include/testlib.h" | sha256sum -c - \
+        && chmod 644 /usr/local/include/testlib.h; \
+    fi
 WORKDIR /app
-CMD ["/bin/bash"]
\ No newline at end of file
+CMD ["/bin/bash"]
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Request, Response
 import sqlite3
 import json
+from app import testcase_store
 
 export_data = APIRouter()
 
@@ -54,7 +55,9 @@ async def exporting(request: Request, response: Response):
                 "output_description": row[4],
                 "samples": json.loads(row[5]),
                 "constraints": row[6],
-                "testcases": json.loads(row[7]),
+                "testcases": testcase_store.load_testcases(
+                    testcase_store.load_manifest(row[7])
+                ),
                 "hint": row[8],
                 "source": row[9],
                 "tags": json.loads(row[10]) if row[10] else [],
@@ -62,7 +65,12 @@ async def exporting(request: Request, response: Response):
                 "memory_limit": row[12],
                 "author": row[13],
                 "difficulty": row[14],
-                "public_cases": True if row[15] else False
+                "public_cases": True if row[15] else False,
+                "fail_fast": row[16] if row[16] else 0,
+                "checker": row[17] if row[17] else "exact",
+                "eps": row[18] if row[18] is not None else 1e-6,
+                "checker_code": row[19] if row[19] else "",
+                "output_limit": row[20] if row[20] else 64
             })
 
         # Get all submissions
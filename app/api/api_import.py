@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Request, Response, UploadFile, File, HTTPException
 import sqlite3
 import json
+from app import testcase_store
+from app.problem_data import valid_judge_settings
 
 import_data = APIRouter()
 
@@ -66,24 +68,47 @@ async def importing(request: Request, response: Response, file: UploadFile = Fil
             )
         
         for problem_data in data["problems"]:
+            testcases = json.dumps(
+                testcase_store.store_testcases(problem_data['testcases'])
+            )
+            
+            # A replaced problem keeps its testcase version, bumped if its
+            # test cases changed
+            cursor.execute(
+                "SELECT testcases, testcase_version FROM problems WHERE id = ?",
+                (problem_data['id'], )
+            )
+            row = cursor.fetchone()
+            version = 1
+            if row:
+                version = (row[1] or 1) + (0 if row[0] == testcases else 1)
+            
             cursor.execute(
                 """INSERT OR REPLACE INTO problems (
                     id, title, description, input_description, output_description, 
                     samples, constraints, testcases, hint, source, tags, 
-                    time_limit, memory_limit, author, difficulty, public_cases
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    time_limit, memory_limit, author, difficulty, public_cases,
+                    fail_fast, checker, eps, checker_code, output_limit,
+                    testcase_version
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
                 (
                     problem_data['id'], problem_data['title'],
                     problem_data['description'], problem_data['input_description'],
                     problem_data['output_description'],
                     json.dumps(problem_data['samples']),
                     problem_data['constraints'], 
-                    json.dumps(problem_data['testcases']),
+                    testcases,
                     problem_data['hint'], problem_data['source'],
                     json.dumps(problem_data['tags']),
                     problem_data['time_limit'], problem_data['memory_limit'],
                     problem_data['author'], problem_data['difficulty'],
-                    1 if problem_data.get('public_cases') else 0
+                    1 if problem_data.get('public_cases') else 0,
+                    problem_data.get('fail_fast', 0),
+                    problem_data.get('checker', 'exact'),
+                    problem_data.get('eps', 1e-6),
+                    problem_data.get('checker_code', ''),
+                    problem_data.get('output_limit', 64),
+                    version
                 )
             )
             
@@ -126,7 +151,7 @@ submission_keys = [
     "language", "code", "details", "score", "counts",
 ]
 
-result_list = ["AC", "WA", "TLE", "MLE", "RE", "CE", "UNK"]
+result_list = ["AC", "WA", "TLE", "MLE", "OLE", "RE", "CE", "UNK", "SKIPPED"]
     
 def validate(data: dict) -> bool:
     """
@@ -182,6 +207,14 @@ def validate(data: dict) -> bool:
             return False
         if not isinstance(problem["time_limit"], float):
             return False
+        if not valid_judge_settings(
+            problem.get("fail_fast", 0),
+            problem.get("checker", "exact"),
+            problem.get("eps", 1e-6),
+            problem.get("checker_code", ""),
+            problem.get("output_limit", 64)
+        ):
+            return False
         
         if not isinstance(problem["samples"], list):
             return False
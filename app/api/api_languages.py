@@ -1,13 +1,14 @@
 from fastapi import APIRouter, Request, Response
 import sqlite3
 import json
+from app import language_registry
 
 languages = APIRouter()
 
 @languages.post('/')
 async def add_language(request: Request, response: Response):
     """
-    Add a new language.
+    Add a new language by admin. Built-in languages cannot be replaced.
     
     Args:
         name: name of the language.
@@ -17,12 +18,26 @@ async def add_language(request: Request, response: Response):
         source_template: template of the code.
         time_limit: limit of time by default.
         memory_limit: limit of memory by default.
+        image: image of the sandbox.
+        time_factor: multiplier of time limits of problems, 1 by default.
+        memory_factor: multiplier of memory limits of problems, 1 by default.
+    
+    Returns:
+        200: success.
+        400: format error, or the language exists.
+        401: not logged in.
+        403: insufficient permissions.
     """
     # Check whether user logged in
     if "user_id" not in request.session:
         response.status_code = 401
         return {"code": 401, "msg": "not logged in", "data": None}
     
+    # Commands of languages run in the judge for every submission
+    if request.session["role"] != "admin":
+        response.status_code = 403
+        return {"code": 403, "msg": "insufficient permissions", "data": None}
+    
     try:
         data = await request.json()
     except json.decoder.JSONDecodeError:
@@ -38,6 +53,27 @@ async def add_language(request: Request, response: Response):
     for item in optional:
         if item not in data:
             data[item] = ""
+    if "image" not in data:
+        data["image"] = ""
+    
+    # Commands and names are used by the judge as they are
+    for item in ("name", "file_ext", "compile_cmd", "run_cmd", "image"):
+        if not isinstance(data[item], str):
+            response.status_code = 400
+            return {"code": 400, "msg": "format error", "data": None}
+    
+    if data["name"] in language_registry.BUILTIN_LANGUAGES:
+        response.status_code = 400
+        return {"code": 400, "msg": "language exists", "data": None}
+    
+    # Multipliers of limits have to be positive numbers
+    for item in ("time_factor", "memory_factor"):
+        if item not in data:
+            data[item] = 1.0
+        factor = data[item]
+        if isinstance(factor, bool) or not isinstance(factor, (int, float)) or factor <= 0:
+            response.status_code = 400
+            return {"code": 400, "msg": "format error", "data": None}
     
     with sqlite3.connect('./app/oj_system.db') as conn:
         cursor = conn.cursor()
@@ -45,14 +81,17 @@ async def add_language(request: Request, response: Response):
             cursor.execute(
                     """INSERT INTO languages (
                         name, file_ext, compile_cmd, run_cmd,
-                        source_template, time_limit, memory_limit
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                        source_template, time_limit, memory_limit,
+                        image, time_factor, memory_factor
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
                     (
                         data["name"], data["file_ext"],data["compile_cmd"],
                         data["run_cmd"], data["source_template"],
-                        data["time_limit"], data["memory_limit"]
+                        data["time_limit"], data["memory_limit"],
+                        data["image"], data["time_factor"], data["memory_factor"]
                     )
                 )
+            language_registry.invalidate(cursor)
         except sqlite3.IntegrityError:
             response.status_code = 400
             return {"code": 400, "msg": "language exists", "data": None}
@@ -67,7 +106,7 @@ async def add_language(request: Request, response: Response):
 @languages.get('/')
 async def get_language_info(request: Request, response: Response):
     """
-    Get information of all languages.
+    Get information of all languages, the built-in ones first.
 
     Returns:
         401: not logged in.
@@ -83,9 +122,10 @@ async def get_language_info(request: Request, response: Response):
         cursor.execute("SELECT * FROM languages")
         rows = cursor.fetchall()
     
-    all_languages = []
+    all_languages = list(language_registry.BUILTIN_LANGUAGES)
     for item in rows:
-        all_languages.append(item[0])
+        if item[0] not in all_languages:
+            all_languages.append(item[0])
         
     return {
         "code": 200,
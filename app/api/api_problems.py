@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Request, Response
 import sqlite3
-from app.problem_data import ProblemProfile
+from app.problem_data import ProblemProfile, valid_judge_settings
+from app import testcase_store
+from app.judge_queue import create_batch
 import json
 
 problems = APIRouter()
@@ -59,9 +61,27 @@ async def post(request: Request, response: Response):
     except TypeError:
         response.status_code = 400
         return {"code": 400, "msg": "missing field / format error", "data": None}
+    if not valid_judge_settings(
+        problem_profile.fail_fast,
+        problem_profile.checker,
+        problem_profile.eps,
+        problem_profile.checker_code,
+        problem_profile.output_limit
+    ):
+        response.status_code = 400
+        return {"code": 400, "msg": "missing field / format error", "data": None}
     
     problem_data = problem_profile.to_dict()
     
+    # Test data goes to the store, the sheet keeps its manifest
+    try:
+        problem_data['testcases'] = json.dumps(
+            testcase_store.store_testcases(problem_profile.testcases)
+        )
+    except (KeyError, TypeError):
+        response.status_code = 400
+        return {"code": 400, "msg": "missing field / format error", "data": None}
+    
     with sqlite3.connect('./app/oj_system.db') as conn:
         cursor = conn.cursor()
         
@@ -76,8 +96,10 @@ async def post(request: Request, response: Response):
             """INSERT INTO problems (
                 id, title, description, input_description, output_description, 
                 samples, constraints, testcases, hint, source, tags, 
-                time_limit, memory_limit, author, difficulty, public_cases
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                time_limit, memory_limit, author, difficulty, public_cases,
+                fail_fast, checker, eps, checker_code, output_limit,
+                testcase_version
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
             (
                 problem_data['id'], problem_data['title'],
                 problem_data['description'], problem_data['input_description'],
@@ -85,7 +107,10 @@ async def post(request: Request, response: Response):
                 problem_data['constraints'], problem_data['testcases'],
                 problem_data['hint'], problem_data['source'], problem_data['tags'],
                 problem_data['time_limit'], problem_data['memory_limit'],
-                problem_data['author'], problem_data['difficulty'], 0
+                problem_data['author'], problem_data['difficulty'], 0,
+                problem_data['fail_fast'], problem_data['checker'],
+                problem_data['eps'], problem_data['checker_code'],
+                problem_data['output_limit'], 1
             )
         )
         conn.commit()
@@ -128,7 +153,9 @@ async def get_info(problem_id: str, request: Request, response: Response):
             problem_info["output_description"] = row[4]
             problem_info["samples"] = json.loads(row[5])
             problem_info["constraints"] = row[6]
-            problem_info["testcases"] = json.loads(row[7])
+            problem_info["testcases"] = testcase_store.load_testcases(
+                testcase_store.load_manifest(row[7])
+            )
             problem_info["hint"] = row[8] if row[8] else ''
             problem_info["source"] = row[9] if row[9] else ''
             problem_info["tags"] = json.loads(row[10]) if row[10] else []
@@ -136,6 +163,12 @@ async def get_info(problem_id: str, request: Request, response: Response):
             problem_info["memory_limit"] = row[12]
             problem_info["author"] = row[13] if row[13] else ''
             problem_info["difficulty"] = row[14] if row[14] else ''
+            problem_info["fail_fast"] = row[16] if row[16] else 0
+            problem_info["checker"] = row[17] if row[17] else "exact"
+            problem_info["eps"] = row[18] if row[18] is not None else 1e-6
+            problem_info["checker_code"] = row[19] if row[19] else ''
+            problem_info["output_limit"] = row[20] if row[20] else 64
+            problem_info["testcase_version"] = row[21] if row[21] else 1
             
             return {"code": 200, "msg": "success", "data": problem_info}
         
@@ -232,3 +265,98 @@ async def set_visibility(problem_id: str, request: Request, response: Response):
             "msg": "log visibility updated",
             "data": {"problem_id": problem_id, "public_cases": public_cases}
         }
+
+@problems.put('/{problem_id}/testcases')
+async def update_testcases(problem_id: str, request: Request, response: Response):
+    """
+    Replace or append test cases of a problem, bumping its testcase version.
+    
+    Args:
+        problem_id (str): id of the problem.
+        testcases (list): test cases, each one is {input, output}.
+        mode (str): "replace" (default) or "append".
+        rejudge (bool): rejudge judged submissions of the problem in a
+            rejudge batch, only cases whose content changed run again.
+            Default to False.
+
+    Returns:
+        400: format error.
+        401: not logged in.
+        403: insufficient permissions.
+        404: problem not found.
+        200: success.
+    """
+    if "user_id" not in request.session:
+        response.status_code = 401
+        return {"code": 401, "msg": "not logged in", "data": None}
+    
+    # Check permission
+    if request.session["role"] != "admin":
+        response.status_code = 403
+        return {"code": 403, "msg": "insufficient permissions", "data": None}
+    
+    try:
+        data = await request.json()
+    except json.decoder.JSONDecodeError:
+        response.status_code = 400
+        return {"code": 400, "msg": "format error", "data": None}
+    
+    if not isinstance(data, dict) or not isinstance(data.get("testcases"), list) \
+            or data.get("mode", "replace") not in ("replace", "append") \
+            or not isinstance(data.get("rejudge", False), bool):
+        response.status_code = 400
+        return {"code": 400, "msg": "format error", "data": None}
+    
+    try:
+        manifest = testcase_store.store_testcases(data["testcases"])
+    except (KeyError, TypeError):
+        response.status_code = 400
+        return {"code": 400, "msg": "format error", "data": None}
+    
+    with sqlite3.connect('./app/oj_system.db') as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT testcases, testcase_version FROM problems WHERE id = ?",
+            (problem_id, )
+        )
+        row = cursor.fetchone()
+        if not row:
+            response.status_code = 404
+            return {"code": 404, "msg": "problem not found", "data": None}
+        
+        if data.get("mode", "replace") == "append":
+            manifest = testcase_store.load_manifest(row[0]) + manifest
+        version = (row[1] or 1) + 1
+        cursor.execute(
+            "UPDATE problems SET testcases = ?, testcase_version = ? WHERE id = ?",
+            (json.dumps(manifest), version, problem_id)
+        )
+        
+        submission_ids = []
+        if data.get("rejudge", False):
+            cursor.execute(
+                """SELECT id FROM submissions
+                WHERE problem_id = ? AND status != 'pending' ORDER BY id""",
+                (problem_id, )
+            )
+            submission_ids = [row[0] for row in cursor.fetchall()]
+        conn.commit()
+    
+    # Logs of the submissions keep the hash of each case, see
+    # code_judge.judge_in_docker
+    batch_id = None
+    if data.get("rejudge", False):
+        batch_id, _ = await create_batch(submission_ids, {"problem_id": problem_id})
+    
+    response.status_code = 200
+    return {
+        "code": 200,
+        "msg": "testcases updated",
+        "data": {
+            "id": problem_id,
+            "testcase_version": version,
+            "testcases": len(manifest),
+            "rejudged": len(submission_ids),
+            "batch_id": batch_id
+        }
+    }
@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Request, Response
 import sqlite3
 from app.initialize_table import create_table
+from app import language_registry
+from app import testcase_store
 from shutil import rmtree
 import time
 
@@ -30,6 +32,7 @@ async def reset_sys(request: Request, response: Response):
         rmtree("./app/submission")
     except Exception:
         pass
+    testcase_store.clear()
 
     with sqlite3.connect('./app/oj_system.db') as conn:
         cursor = conn.cursor()
@@ -38,6 +41,10 @@ async def reset_sys(request: Request, response: Response):
         cursor.execute("DROP TABLE IF EXISTS problems")
         cursor.execute("DROP TABLE IF EXISTS submissions")
         cursor.execute("DROP TABLE IF EXISTS languages")
+        language_registry.invalidate(cursor)
+        cursor.execute("DROP TABLE IF EXISTS judge_queue")
+        cursor.execute("DROP TABLE IF EXISTS judge_results")
+        cursor.execute("DROP TABLE IF EXISTS rejudge_batches")
         
     await create_table()
     request.session.pop("user_id")
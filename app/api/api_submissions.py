@@ -2,8 +2,9 @@ from fastapi import APIRouter, Request, Response
 import os
 import json
 import sqlite3
-import asyncio
-from app.code_judge import judge_in_docker
+from app import judge_config
+from app.judge_queue import enqueue, create_batch, batch_progress_sync, cancel_batch_sync, \
+    cancel_sync
 from app.page import get_page_detail
 from datetime import datetime
 
@@ -20,7 +21,7 @@ async def submit(request: Request, response: Response):
         code: code to be judged.
         
     Returns:
-        200: success.
+        200: success, with position of the submission in the judge queue.
         400: format error.
         403: banned user.
         404: problem not found.
@@ -85,21 +86,18 @@ async def submit(request: Request, response: Response):
         
         submission_id = cursor.lastrowid
     
-    # Start to judge    
-    asyncio.create_task(
-        judge_in_docker(
-            submission_id, 
-            data["problem_id"], 
-            data["code"],
-            data["language"]
-        )
-    )
+    # Wait in the judge queue
+    position = await enqueue(submission_id)
         
     response.status_code = 200
     return {
         "code": 200,
         "msg": "success",
-        "data": {"submission_id": str(submission_id), "status": "pending"}
+        "data": {
+            "submission_id": str(submission_id),
+            "status": "pending",
+            "queue_position": position
+        }
     }
         
 @submissions.get('/{submission_id}/')
@@ -256,9 +254,13 @@ async def rejudge(
     
     Args:
         submission_id (int): id of submission
+        force (optional, body): run the code again even if identical code
+            was judged on the same tests, for timing-sensitive problems.
     
     Returns:
-        200: success.
+        200: success, a submission already queued is not queued again, one
+            being judged is queued again behind its running job.
+        400: format error.
         401: not logged in.
         403: insufficient permissions.
         404: submission not found.
@@ -273,6 +275,18 @@ async def rejudge(
         response.status_code = 403
         return {"code": 403, "msg": "insufficient permissions", "data": None}
     
+    # The body is optional
+    data = {}
+    if await request.body():
+        try:
+            data = await request.json()
+        except json.decoder.JSONDecodeError:
+            response.status_code = 400
+            return {"code": 400, "msg": "format error", "data": None}
+    if not isinstance(data, dict) or not isinstance(data.get("force", False), bool):
+        response.status_code = 400
+        return {"code": 400, "msg": "format error", "data": None}
+    
     with sqlite3.connect('./app/oj_system.db') as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM submissions WHERE id = ?", (submission_id,))
@@ -280,15 +294,210 @@ async def rejudge(
         if not row:
             response.status_code = 404
             return {"code": 404, "msg": "submission not found", "data": None}
-        else:
-            asyncio.create_task(judge_in_docker(submission_id, row[2], row[3], row[4]))
-            response.status_code = 200
-            return {
-                "code": 200,
-                "msg": "rejudge started",
-                "data": {"submission_id": str(submission_id), "status": "pending"}
-            }
+    
+    position = await enqueue(submission_id, force=data.get("force", False))
+    response.status_code = 200
+    return {
+        "code": 200,
+        "msg": "rejudge started",
+        "data": {
+            "submission_id": str(submission_id),
+            "status": "pending",
+            "queue_position": position
+        }
+    }
  
+@submissions.post('/rejudge')
+async def rejudge_batch(request: Request, response: Response):
+    """
+    Rejudge submissions selected by filters in a background batch, queued
+    below live submissions and throttled, see app/judge_queue.py.
+    
+    Args:
+        problem_id (optional): id of the problem.
+        language (optional): language of the code.
+        status (optional): status of the submission, pending ones are never
+            selected since they are judged anyway.
+        min_id, max_id (optional): range of submission ids, both included.
+        force (optional): run the code again even if results can be reused.
+    
+    Returns:
+        200: success, with the id of the batch.
+        400: format error, or too many submissions selected.
+        401: not logged in.
+        403: insufficient permissions.
+    """
+    if "user_id" not in request.session:
+        response.status_code = 401
+        return {"code": 401, "msg": "not logged in", "data": None}
+    
+    # Check permission
+    if request.session["role"] != "admin":
+        response.status_code = 403
+        return {"code": 403, "msg": "insufficient permissions", "data": None}
+    
+    try:
+        data = await request.json()
+    except json.decoder.JSONDecodeError:
+        response.status_code = 400
+        return {"code": 400, "msg": "format error", "data": None}
+    if not isinstance(data, dict):
+        response.status_code = 400
+        return {"code": 400, "msg": "format error", "data": None}
+    
+    # Conditions of each filter given
+    filter_types = {
+        "problem_id": (str, "problem_id = ?"),
+        "language": (str, "language = ?"),
+        "status": (str, "status = ?"),
+        "min_id": (int, "id >= ?"),
+        "max_id": (int, "id <= ?"),
+    }
+    filters: dict = {}
+    conditions = ["status != 'pending'"]
+    params: list = []
+    for name, (filter_type, condition) in filter_types.items():
+        if data.get(name) is None:
+            continue
+        if not isinstance(data[name], filter_type) or isinstance(data[name], bool):
+            response.status_code = 400
+            return {"code": 400, "msg": "format error", "data": None}
+        filters[name] = data[name]
+        conditions.append(condition)
+        params.append(data[name])
+    if not isinstance(data.get("force", False), bool):
+        response.status_code = 400
+        return {"code": 400, "msg": "format error", "data": None}
+    
+    with sqlite3.connect('./app/oj_system.db') as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"""SELECT id FROM submissions WHERE {" AND ".join(conditions)}
+            ORDER BY id LIMIT ?""",
+            (*params, judge_config.REJUDGE_LIMIT + 1)
+        )
+        submission_ids = [row[0] for row in cursor.fetchall()]
+    
+    if len(submission_ids) > judge_config.REJUDGE_LIMIT:
+        response.status_code = 400
+        return {"code": 400, "msg": "too many submissions", "data": None}
+    
+    # Submissions already queued or being judged are left to their jobs
+    batch_id, queued = await create_batch(
+        submission_ids, filters, data.get("force", False)
+    )
+    response.status_code = 200
+    return {
+        "code": 200,
+        "msg": "rejudge started",
+        "data": {
+            "batch_id": batch_id,
+            "total": queued,
+            "merged": len(submission_ids) - queued
+        }
+    }
+
+@submissions.get('/rejudge/{batch_id}')
+async def get_rejudge_batch(batch_id: int, request: Request, response: Response):
+    """
+    Get the progress of a rejudge batch.
+    
+    Returns:
+        200: success.
+        401: not logged in.
+        403: insufficient permissions.
+        404: batch not found.
+    """
+    if "user_id" not in request.session:
+        response.status_code = 401
+        return {"code": 401, "msg": "not logged in", "data": None}
+    
+    # Check permission
+    if request.session["role"] != "admin":
+        response.status_code = 403
+        return {"code": 403, "msg": "insufficient permissions", "data": None}
+    
+    progress = batch_progress_sync(batch_id)
+    if progress is None:
+        response.status_code = 404
+        return {"code": 404, "msg": "batch not found", "data": None}
+    
+    response.status_code = 200
+    return {"code": 200, "msg": "success", "data": progress}
+
+@submissions.post('/rejudge/{batch_id}/cancel')
+async def cancel_rejudge_batch(batch_id: int, request: Request, response: Response):
+    """
+    Cancel a rejudge batch, its submissions not judged yet keep their result.
+    
+    Returns:
+        200: success, with the progress of the batch.
+        401: not logged in.
+        403: insufficient permissions.
+        404: batch not found.
+    """
+    if "user_id" not in request.session:
+        response.status_code = 401
+        return {"code": 401, "msg": "not logged in", "data": None}
+    
+    # Check permission
+    if request.session["role"] != "admin":
+        response.status_code = 403
+        return {"code": 403, "msg": "insufficient permissions", "data": None}
+    
+    progress = cancel_batch_sync(batch_id)
+    if progress is None:
+        response.status_code = 404
+        return {"code": 404, "msg": "batch not found", "data": None}
+    
+    response.status_code = 200
+    return {"code": 200, "msg": "rejudge cancelled", "data": progress}
+
+@submissions.post('/{submission_id}/cancel')
+async def cancel(submission_id: int, request: Request, response: Response):
+    """
+    Cancel judging of a submission by admin. A judge running it kills its
+    sandbox and moves on to the next job.
+    
+    Args:
+        submission_id (int): id of submission
+    
+    Returns:
+        200: success, "cancelled" if its jobs were only queued, "cancelling"
+            while the judge running one stops.
+        401: not logged in.
+        403: insufficient permissions.
+        404: submission not found.
+        409: submission not being judged.
+    """
+    if "user_id" not in request.session:
+        response.status_code = 401
+        return {"code": 401, "msg": "not logged in", "data": None}
+    
+    # Check permission
+    if request.session["role"] != "admin":
+        response.status_code = 403
+        return {"code": 403, "msg": "insufficient permissions", "data": None}
+    
+    with sqlite3.connect('./app/oj_system.db') as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM submissions WHERE id = ?", (submission_id,))
+        if not cursor.fetchone():
+            response.status_code = 404
+            return {"code": 404, "msg": "submission not found", "data": None}
+    
+    status = cancel_sync(submission_id)
+    if status is None:
+        response.status_code = 409
+        return {"code": 409, "msg": "submission not being judged", "data": None}
+    
+    response.status_code = 200
+    return {
+        "code": 200,
+        "msg": "cancel success",
+        "data": {"submission_id": str(submission_id), "status": status}
+    }
+
 @submissions.get('/{submission_id}/log')   
 async def see_log(submission_id: int, request: Request, response: Response):
     if "user_id" not in request.session:
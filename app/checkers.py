@@ -0,0 +1,391 @@
+"""
+Checkers comparing the output of a case with its answer.
+
+The default checker compares bytes chunk by chunk, so memory does not grow
+with the size of the output. Both sides are first put in a canonical form,
+following the line comparison the judge always had:
+
+    answer: everything after its last newline is ignored.
+    output: one trailing space of each line is ignored, the last line may
+        miss its newline and up to two trailing newlines are accepted in
+        total. An empty output is always wrong.
+
+Every line then ends with a newline on both sides and the canonical forms
+have to be equal.
+
+The float checker splits both sides into whitespace separated tokens instead.
+Numbers match when they differ by at most eps, absolutely or relatively to
+the answer, other tokens have to be equal. When NumPy is installed, outputs
+made only of numbers are parsed and compared in bulk first, and only outputs
+which are not accepted that way are compared token by token.
+
+The special mode runs a testlib-style checker program of the problem in the
+sandbox instead, see `code_judge.run_checker`.
+"""
+import math
+import os
+import stat
+import warnings
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Bytes read from a file at a time.
+CHUNK_SIZE = 1 << 16
+
+# Tokens compared at a time by the float checker.
+TOKEN_BLOCK = 1 << 16
+
+# Checker modes of problems.
+MODES = ("exact", "float", "special")
+
+@dataclass
+class CheckResult:
+    """
+    Verdict of a checker.
+
+    Attributes:
+        result (str): "AC" or "WA".
+        message (str): where the output is wrong, empty when it is accepted.
+    """
+    result: str
+    message: str = ""
+
+def read_chunks(path: str, end: int | None = None) -> Iterator[bytes]:
+    """
+    Read a file chunk by chunk, stopping at offset `end` if it is given.
+
+    Outputs are written by sandboxes, so a symbolic link is never followed.
+    """
+    with os.fdopen(os.open(path, os.O_RDONLY | os.O_NOFOLLOW), "rb") as f:
+        remaining = end
+        while remaining is None or remaining > 0:
+            size = CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining)
+            chunk = f.read(size)
+            if not chunk:
+                return
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+def answer_end(path: str) -> int:
+    """
+    Offset just after the last newline of a file, 0 if it has none.
+    """
+    with open(path, "rb") as f:
+        end = f.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(0, end - CHUNK_SIZE)
+            f.seek(start)
+            index = f.read(end - start).rfind(b"\n")
+            if index >= 0:
+                return start + index + 1
+            end = start
+    return 0
+
+def canonical_output(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Canonical form of an output given chunk by chunk.
+
+    A space at the end of a chunk and newlines at the end of the output so
+    far are held back, until the next chunk tells whether they end a line or
+    the output.
+    """
+    space = False
+    newlines = 0
+    content = False
+    for chunk in chunks:
+        body = chunk.rstrip(b"\n")
+        count = len(chunk) - len(body)
+        if not body:
+            # A held space ends its line here
+            space = False
+            newlines += count
+            continue
+
+        data = (b" " if space else b"\n" * newlines) + body
+        data = data.replace(b" \n", b"\n")
+        space = False
+        if data.endswith(b" "):
+            data = data[:-1]
+            space = count == 0
+        newlines = count
+        content = True
+        if data:
+            yield data
+
+    # The last line gets its newline, two trailing newlines are dropped
+    if content:
+        yield b"\n" * (1 + max(0, newlines - 2))
+    elif newlines > 1:
+        yield b"\n" * (newlines - 1)
+
+def describe(data: bytes) -> str:
+    """
+    Readable form of the byte at a mismatch.
+    """
+    if not data:
+        return "end of output"
+    if data == b"\n":
+        return "end of line"
+    if 0x20 <= data[0] < 0x7f:
+        return f"'{data.decode()}'"
+    return f"byte 0x{data[0]:02x}"
+
+def compare(expected: Iterable[bytes], actual: Iterable[bytes]) -> CheckResult:
+    """
+    Compare two canonical forms, stopping at the first mismatch.
+    """
+    expected = iter(expected)
+    actual = iter(actual)
+    expected_buffer = b""
+    actual_buffer = b""
+    line = 1
+    column = 1
+    while True:
+        while not expected_buffer:
+            expected_buffer = next(expected, None)
+            if expected_buffer is None:
+                expected_buffer = b""
+                break
+        while not actual_buffer:
+            actual_buffer = next(actual, None)
+            if actual_buffer is None:
+                actual_buffer = b""
+                break
+        if not expected_buffer and not actual_buffer:
+            return CheckResult("AC")
+
+        size = min(len(expected_buffer), len(actual_buffer))
+        same = size
+        if expected_buffer[:size] != actual_buffer[:size] or size == 0:
+            same = next(
+                (i for i in range(size) if expected_buffer[i] != actual_buffer[i]),
+                size
+            )
+
+        # Move the position over the matched bytes
+        matched = expected_buffer[:same]
+        newline = matched.rfind(b"\n")
+        if newline >= 0:
+            line += matched.count(b"\n")
+            column = same - newline
+        else:
+            column += same
+
+        if same < size or size == 0:
+            return CheckResult(
+                "WA",
+                f"line {line}, column {column}: expected "
+                f"{describe(expected_buffer[same:same + 1])}, found "
+                f"{describe(actual_buffer[same:same + 1])}"
+            )
+        expected_buffer = expected_buffer[size:]
+        actual_buffer = actual_buffer[size:]
+
+def token_blocks(chunks: Iterable[bytes]) -> Iterator[list]:
+    """
+    Whitespace separated tokens of a file given chunk by chunk, in blocks of
+    about TOKEN_BLOCK tokens.
+    """
+    rest = b""
+    block: list = []
+    for chunk in chunks:
+        data = rest + chunk
+        tokens = data.split()
+        rest = b""
+        if tokens and not data[-1:].isspace():
+            # The last token may go on in the next chunk
+            rest = tokens.pop()
+        block += tokens
+        if len(block) >= TOKEN_BLOCK:
+            yield block
+            block = []
+    if rest:
+        block.append(rest)
+    if block:
+        yield block
+
+def tokens_match(expected: bytes, actual: bytes, eps: float) -> bool:
+    """
+    Whether two tokens match, as numbers if both of them are numbers.
+    """
+    try:
+        expected_value = float(expected)
+        actual_value = float(actual)
+    except ValueError:
+        return expected == actual
+    if math.isnan(expected_value) or math.isnan(actual_value):
+        return math.isnan(expected_value) and math.isnan(actual_value)
+    if expected_value == actual_value:
+        return True
+    diff = abs(actual_value - expected_value)
+    return diff <= eps or diff <= eps * abs(expected_value)
+
+def first_mismatch(expected: list, actual: list, eps: float) -> int | None:
+    """
+    Index of the first pair of tokens which do not match.
+
+    Args:
+        expected (list): tokens of the answer.
+        actual (list): tokens of the output, as many as expected.
+        eps (float): absolute or relative tolerance of numbers.
+
+    Returns:
+        int: the index, None if all of them match.
+    """
+    for i, (expected_token, actual_token) in enumerate(zip(expected, actual)):
+        if not tokens_match(expected_token, actual_token, eps):
+            return i
+    return None
+
+def parse_numbers(data: bytes):
+    """
+    Parse whitespace separated numbers with NumPy.
+
+    Raises:
+        ValueError: a token is not a number.
+    """
+    if not data or data.isspace():
+        # Parsed as [-1.] by NumPy
+        return numpy.empty(0)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        return numpy.fromstring(data, sep=" ")
+
+def number_blocks(chunks: Iterable[bytes]) -> Iterator:
+    """
+    Numbers of a file given chunk by chunk, as an array for each chunk.
+
+    Raises:
+        ValueError: a token is not a number.
+    """
+    rest = b""
+    for chunk in chunks:
+        data = rest + chunk
+        rest = b""
+        if not data[-1:].isspace():
+            # The last token may go on in the next chunk
+            parts = data.rsplit(None, 1)
+            if len(parts) < 2:
+                rest = data
+                continue
+            data, rest = parts
+        yield parse_numbers(data)
+    if rest:
+        yield parse_numbers(rest)
+
+def numbers_match(answer_path: str, output_path: str, eps: float) -> bool:
+    """
+    Whether both files are made only of numbers and all of them match.
+
+    Returns:
+        bool: True if the output is accepted, False if it has to be compared
+        token by token.
+    """
+    expected_blocks = number_blocks(read_chunks(answer_path))
+    actual_blocks = number_blocks(read_chunks(output_path))
+    expected = numpy.empty(0)
+    actual = numpy.empty(0)
+    try:
+        while True:
+            if expected.size == 0:
+                expected = next(expected_blocks, None)
+            if actual.size == 0:
+                actual = next(actual_blocks, None)
+            if expected is None or actual is None:
+                return expected is None and actual is None
+
+            size = min(expected.size, actual.size)
+            expected_values = expected[:size]
+            actual_values = actual[:size]
+            with numpy.errstate(invalid="ignore"):
+                diff = numpy.abs(actual_values - expected_values)
+                match = (expected_values == actual_values) \
+                    | (diff <= eps) \
+                    | (diff <= eps * numpy.abs(expected_values)) \
+                    | (numpy.isnan(expected_values) & numpy.isnan(actual_values))
+            if not match.all():
+                return False
+            expected = expected[size:]
+            actual = actual[size:]
+    except (ValueError, DeprecationWarning):
+        return False
+
+def describe_token(token: bytes | None) -> str:
+    """
+    Readable form of a token at a mismatch.
+    """
+    if token is None:
+        return "end of output"
+    if len(token) > 32:
+        token = token[:32] + b"..."
+    return f"'{token.decode(errors='replace')}'"
+
+def check_floats(answer_path: str, output_path: str, eps: float) -> CheckResult:
+    """
+    Compare tokens of an output with its answer, numbers within eps.
+    """
+    if numpy is not None and numbers_match(answer_path, output_path, eps):
+        return CheckResult("AC")
+
+    expected_blocks = token_blocks(read_chunks(answer_path))
+    actual_blocks = token_blocks(read_chunks(output_path))
+    expected: list = []
+    actual: list = []
+    index = 0
+    while True:
+        if not expected:
+            expected = next(expected_blocks, [])
+        if not actual:
+            actual = next(actual_blocks, [])
+        size = min(len(expected), len(actual))
+        if size == 0 and not expected and not actual:
+            return CheckResult("AC")
+
+        wrong = first_mismatch(expected[:size], actual[:size], eps) if size else 0
+        if wrong is not None:
+            return CheckResult(
+                "WA",
+                f"token {index + wrong + 1}: expected "
+                f"{describe_token(expected[wrong] if wrong < len(expected) else None)}, "
+                f"found {describe_token(actual[wrong] if wrong < len(actual) else None)}"
+            )
+        index += size
+        expected = expected[size:]
+        actual = actual[size:]
+
+def check_files(
+    answer_path: str,
+    output_path: str,
+    mode: str = "exact",
+    eps: float = 0.0
+) -> CheckResult:
+    """
+    Compare an output file with its answer file.
+
+    Args:
+        answer_path (str): path of the answer.
+        output_path (str): path of the output.
+        mode (str): "exact" or "float", see MODES.
+        eps (float): tolerance of numbers in the float mode.
+
+    Returns:
+        CheckResult: the verdict.
+    """
+    if not stat.S_ISREG(os.lstat(output_path).st_mode):
+        return CheckResult("WA", "output is not a regular file")
+
+    if mode == "float":
+        return check_floats(answer_path, output_path, eps)
+
+    if os.path.getsize(output_path) == 0:
+        return CheckResult("WA", "empty output")
+    return compare(
+        read_chunks(answer_path, answer_end(answer_path)),
+        canonical_output(read_chunks(output_path))
+    )
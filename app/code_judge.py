@@ -1,19 +1,38 @@
 import asyncio
-import docker
 import sqlite3
 import json
 import os
-import io
-import tarfile
-import time
-import threading
 import re
-import tracemalloc
+import shutil
+import stat
+import tempfile
+import weakref
+from collections.abc import Awaitable, Callable
+from app import checkers
+from app import compile_cache
+from app import container_pool
+from app import judge_config
+from app import judge_runtime
+from app import language_registry
+from app import result_cache
+from app import run_engine
+from app import sandbox_runner
+from app import testcase_store
 
-stdout_output = b""
-stderr_output = b""
+# Task judging each job of the judge queue in this process, by job id, so
+# that cancelled jobs can be stopped, see app/judge_queue.py.
+running_tasks: dict[int, asyncio.Task] = {}
 
-running_tasks = {}
+# Lease semaphore of each pool, with the event loop it belongs to, see
+# `lease_slots`.
+_lease_slots: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+# Checkers are linked statically, so that they run in the sandbox of any
+# language
+CHECKER_COMPILE_CMD = "g++ -o checker checker.cpp -std=c++17 -O2 -static"
+
+# Bytes of compiler output kept for a compilation.
+COMPILE_OUTPUT_LIMIT = 1 << 16
 
 async def get_requirements(problem_id: str) -> tuple:
     """
@@ -23,7 +42,9 @@ async def get_requirements(problem_id: str) -> tuple:
         problem_id(int): id of the problem
         
     Returns:
-        A tuple containing test cases, time limit, memory limit.
+        A tuple containing the manifest of test cases, time limit, memory
+        limit, the fail-fast policy, the checker mode, its eps, the checker
+        program of the special mode and the output limit.
     """
     loop = asyncio.get_event_loop()
     return await loop.run_in_executor(None, get_requirements_sync, problem_id)
@@ -34,48 +55,40 @@ def get_requirements_sync(problem_id: str) -> tuple:
         
         # Get info of the problem.
         cursor.execute(
-                """SELECT testcases, time_limit, memory_limit
-                FROM problems WHERE id = ?""",
+                """SELECT testcases, time_limit, memory_limit, fail_fast,
+                checker, eps, checker_code, output_limit FROM problems
+                WHERE id = ?""",
                 (problem_id, )
             )
         problem_row = cursor.fetchone()
         
-    return (json.loads(problem_row[0]), problem_row[1], problem_row[2])
+    return (
+        testcase_store.load_manifest(problem_row[0]),
+        problem_row[1],
+        problem_row[2],
+        problem_row[3] or 0,
+        problem_row[4] or "exact",
+        problem_row[5] if problem_row[5] is not None else 1e-6,
+        problem_row[6] or "",
+        problem_row[7] or 64
+    )
 
-def run_code(container, language: str):
+def get_log_sync(submission_id: int) -> list:
     """
-    Run code in container and get output of outs and errors.
+    Get the log of a submission, empty if it was never judged.
     """
-    global stdout_output
-    global stderr_output
-    
-    # Initialize output
-    stdout_output = b""
-    stderr_output = b""
-    
+    with sqlite3.connect('./app/oj_system.db') as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT log FROM submissions WHERE id = ?", (submission_id, ))
+        row = cursor.fetchone()
+    if not row or not row[0]:
+        return []
     try:
-        if language == "python":
-            exec_result = container.exec_run(
-                cmd = ["/bin/sh", "-c", "python main.py < input.txt"],
-                workdir = "/submission",
-                demux = True
-            )
-        else:
-            exec_result = container.exec_run(
-                cmd = ["/bin/sh", "-c", "./main < input.txt"],
-                workdir = "/submission",
-                demux = True
-            )
-            
-        if exec_result.output:
-            stdout, stderr = exec_result.output
-            if stdout:
-                stdout_output += stdout
-            if stderr:
-                stderr_output += stderr
-    except Exception:
-        stderr_output = b'RE'
-    
+        log = json.loads(row[0])
+    except ValueError:
+        return []
+    return log if isinstance(log, list) else []
+
 def validate_python(code: str) -> bool:
     """
     Check code written in python.
@@ -122,6 +135,13 @@ def validate_cpp(code: str) -> bool:
     
     return True
 
+# Checks of the code of languages before judging, other languages rely on
+# their sandbox only.
+VALIDATORS: dict[str, Callable[[str], bool]] = {
+    "python": validate_python,
+    "cpp": validate_cpp,
+}
+
 async def update_log(
     submission_id: int,
     log: list
@@ -205,11 +225,35 @@ def update_log_sync(
         
         conn.commit()
           
+def fail_submission_sync(submission_id: int, problem_id: str):
+    """
+    Leave every case of a submission whose judging failed unknown, so that
+    it does not stay pending. A submission judged before keeps its result.
+    """
+    with sqlite3.connect('./app/oj_system.db') as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT status FROM submissions WHERE id = ?", (submission_id, ))
+        row = cursor.fetchone()
+    if not row or row[0] != "pending":
+        return
+    
+    try:
+        cases = len(get_requirements_sync(problem_id)[0])
+    except (sqlite3.Error, TypeError, ValueError, OSError):
+        # The problem is gone or broken
+        cases = 0
+    log = [
+        {"id": i + 1, "result": "UNK", "time": 0.0, "memory": 0}
+        for i in range(cases)
+    ]
+    update_log_sync(submission_id, "error", 0, cases * 10, log)
+
 async def judge_in_docker(
     submission_id: int,
     problem_id: str,
     code: str,
-    language: str
+    language: str,
+    force: bool = False
 ):
     """
     Judge codes in docker.
@@ -219,195 +263,677 @@ async def judge_in_docker(
         problem_id (int): id of the problem
         code (str): code to be judged
         language (str): languange of the code
+        force (bool): run the code even if identical code was judged on the
+            same tests before
     """
     # Get requirements of the submission
     requirements = await get_requirements(problem_id)
     test_cases = requirements[0]
     time_limit = requirements[1]
     memory_limit = requirements[2]
+    fail_fast = requirements[3]
+    checker = requirements[4]
+    eps = requirements[5]
+    checker_code = requirements[6]
+    output_limit = requirements[7]
     
     log: list[dict] = []
     for i in range(len(test_cases)):
         log.append({"id": i + 1, "result": "UNK", "time": 0.0, "memory": 0})
-        
-    if language == "cpp":
-        if not validate_cpp(code):
-            await update_log(submission_id, log)
-            return
-    elif language == "python":
-        if not validate_python(code):
-            await update_log(submission_id, log)
-            return
-    else:
+    
+    # Unknown languages, and languages without an image in Docker, are not run
+    loop = asyncio.get_event_loop()
+    registered = await loop.run_in_executor(
+        None, language_registry.get_language, language
+    )
+    if registered is None or \
+        (judge_config.SANDBOX_BACKEND == "docker" and not registered.image):
         await update_log(submission_id, log)
         return
-        
-    os.makedirs(f"./app/submission/{submission_id}", exist_ok=True)
     
-    if language == "cpp":
-        with open(f"./app/submission/{submission_id}/main.cpp", "w", encoding="utf-8") as f:
-            f.write(code)
-    elif language == "python":
-        with open(f"./app/submission/{submission_id}/main.py", "w", encoding="utf-8") as f:
-            f.write(code)
+    validator = VALIDATORS.get(language)
+    if validator is not None and not validator(code):
+        await update_log(submission_id, log)
+        return
+    
+    # Identical code judged on the same tests takes the stored log
+    result_key = (
+        result_cache.code_hash(code, registered),
+        language,
+        result_cache.testset_version(requirements)
+    )
+    if not force:
+        stored = await loop.run_in_executor(None, result_cache.lookup_sync, *result_key)
+        if stored is not None and len(stored) == len(log):
+            await update_log(submission_id, stored)
+            return
     
-    client: docker.DockerClient = docker.from_env()
+    # Cases of the previous log of the submission whose hash is unchanged
+    # keep their verdict, only the other ones run. Fail-fast policies depend
+    # on the order of all cases, so their problems run every case.
+    hashes = result_cache.case_hashes(requirements, registered)
+    reused: dict = {}
+    if not force and fail_fast == 0:
+        previous = await loop.run_in_executor(None, get_log_sync, submission_id)
+        reused = result_cache.reusable_cases(previous, hashes)
+    pending = [i for i in range(len(test_cases)) if i not in reused]
     
-    seccomp_profile_path = os.path.abspath('./app/default_seccomp.json')
-    with open(seccomp_profile_path, 'r') as f:
-        seccomp_profile = json.load(f)
+    if pending:
+        # Lease a warm sandbox, its /submission is a directory of the host
+        pool = await loop.run_in_executor(None, judge_runtime.get_pool, language)
+        sandbox = await lease_sandbox(pool)
+        try:
+            await judge_in_sandbox(
+                sandbox, code, registered, [test_cases[i] for i in pending],
+                time_limit, memory_limit, [log[i] for i in pending],
+                fail_fast, checker, eps, checker_code, output_limit
+            )
+        finally:
+            await release_sandbox(pool, sandbox)
+    
+    if reused:
+        for i, entry in reused.items():
+            log[i] = dict(entry, id=i + 1)
         
-    # Compile
-    if language == "cpp":
-        compile_container = client.containers.run(
-            "cpp-eval-env",
-            name=f'oj_compile_{submission_id}',
-            detach=True,
-            remove=False,
-            volumes={
-                os.path.abspath(f"./app/submission/{submission_id}"): {
-                    'bind': '/submission',
-                    'mode': 'rw'
-                }
-            },
-            working_dir='/submission',
-            command=['sh', '-c', 'g++ -o main main.cpp -std=c++17 2>&1']
+        # Cases after a runtime error are RE, like in a full run
+        for i, entry in enumerate(log):
+            if entry["result"] == "RE":
+                for later in log[i + 1:]:
+                    later["result"] = "RE"
+                break
+    
+    for i, entry in enumerate(log):
+        entry["hash"] = hashes[i]
+    
+    # Update log
+    await loop.run_in_executor(None, result_cache.store_sync, *result_key, log)
+    await update_log(submission_id, log)
+
+async def judge_in_sandbox(
+    sandbox: container_pool.Sandbox,
+    code: str,
+    language: language_registry.Language,
+    test_cases: list,
+    time_limit: float,
+    memory_limit: int,
+    log: list,
+    fail_fast: int = 0,
+    checker: str = "exact",
+    eps: float = 1e-6,
+    checker_code: str = "",
+    output_limit: int = 64
+):
+    """
+    Compile and run code in a leased sandbox.
+
+    Args:
+        sandbox (Sandbox): sandbox leased for the submission
+        code (str): code to be judged
+        language (Language): languange of the code
+        test_cases (list): manifest of test cases of the problem
+        time_limit (float): time limit of each test case, before the
+            multiplier of the language
+        memory_limit (int): memory limit in MB, before the multiplier of
+            the language
+        log (list): log to be filled
+        fail_fast (int): stop after this many failed cases, 0 runs all cases
+        checker (str): checker mode of the problem, see app/checkers.py
+        eps (float): tolerance of the float checker
+        checker_code (str): checker program of the special mode
+        output_limit (int): limit of the output of each test case in MB
+    """
+    time_limit = time_limit * language.time_factor
+    memory_limit = max(1, round(memory_limit * language.memory_factor))
+    
+    loop = asyncio.get_event_loop()
+    special = checker == "special"
+    checker_entry = None
+    checker_binary = None
+    if special:
+        # Shared by all submissions of the problem through the compile cache
+        checker_entry = await compile_source(
+            checker_code, "checker.cpp", "checker", CHECKER_COMPILE_CMD,
+            language_registry.BUILTIN_LANGUAGES["cpp"]
         )
-        
-        # Wait for compile
-        compile_result = compile_container.wait()
-        compile_logs = compile_container.logs()
-        compile_container.remove(force=True)
-        
-        if compile_result['StatusCode'] != 0:
-            for j in range(len(test_cases)):
-                log[j]["result"] = "CE"
-            await update_log(submission_id, log)
+        if checker_entry.binary is None:
+            # A broken checker leaves the log unknown
             return
-        os.chmod(f"./app/submission/{submission_id}/main", 0o755)
+        checker_binary = checker_entry.binary
     
-    for i, item in enumerate(test_cases):
-        # Prepare for the container, written by gemini.
-        container_args = {
-            'name': f'oj_{submission_id}_{i}',
-            'detach': True,
-            'remove': False,
-            'mem_limit': str(memory_limit) + 'm',
-            'pids_limit': 128, 
-            'cpu_period': 100000,
-            'cpu_quota': int(time_limit * 100000),
-            'network_disabled': True,
-            'read_only': True,
-            'tmpfs': {'/tmp': 'rw,noexec,nosuid,size=64m'},
-            'user': '1000:1000',
-            'security_opt': [f'seccomp={json.dumps(seccomp_profile)}',
-                             'no-new-privileges'],
-            'cap_drop': ['ALL'],
-            'volumes': { 
-                os.path.abspath(f"./app/submission/{submission_id}"): { 
-                    'bind': '/submission', 
-                    'mode': 'rw' 
-                }
-            },
-            'working_dir': '/submission', 
-            'stdin_open': True, 
-        }
-        if language == "python":
-            container = client.containers.run("python-eval-env", **container_args)
+    try:
+        # Compile
+        if language.compiled:
+            if not await compile_submission(sandbox, code, language):
+                for j in range(len(test_cases)):
+                    log[j]["result"] = "CE"
+                return
         else:
-            container = client.containers.run("cpp-eval-env", **container_args)
-        
-        # Prepare for input
-        input_data = str(item["input"]).encode("utf-8")
-        tar_stream = io.BytesIO()
-        with tarfile.open(fileobj=tar_stream, mode="w") as tar:
-            tarinfo = tarfile.TarInfo(name="input.txt")
-            tarinfo.size = len(input_data)
-            tar.addfile(tarinfo, io.BytesIO(input_data))
-        tar_stream.seek(0)
-        container.put_archive("/submission", tar_stream.read())
-
-        # Run code
-        start_time = time.monotonic()
-        tracemalloc.start()
-        before = tracemalloc.take_snapshot()
-
-        exec_thread = threading.Thread(target = run_code, args = (container, language))
-        exec_thread.start()
-        exec_thread.join(timeout = time_limit)
+            write_workdir_file(sandbox, language.source, code.encode("utf-8"))
         
-        log[i]["time"] = time.monotonic() - start_time
+        # Cases running at the same time get a CPU and their memory limit each,
+        # runners share the memory of the sandbox too. Answers are copied into
+        # the sandbox for special judges, so their cases run one at a time.
+        parallel = 1 if special else max(1, min(judge_config.CASE_PARALLELISM, len(test_cases)))
+        runners = 1 if judge_config.JUDGE_MODE == "batch" else parallel
+        sandbox.set_limits(
+            parallel * memory_limit + runners * judge_config.RUNNER_MEMORY,
+            parallel * 100000
+        )
         
-        after = tracemalloc.take_snapshot()
-        delta_mem = after.compare_to(before, 'lineno')
+        # Inputs are read from the store mounted in the sandbox
+        cases: list = []
+        for i, item in enumerate(test_cases):
+            cases.append({
+                "id": i + 1,
+                "input": sandbox.input_path(item["input"]),
+                "output": f"{i + 1}.out",
+                "error": f"{i + 1}.err",
+            })
         
-        log[i]["memory"] = (sum(stat.size for stat in delta_mem) // 1024) / 1024
+        spec = {
+            "cmd": language.run_args(),
+            "time_limit": time_limit,
+            "wall_limit": time_limit * judge_config.WALL_TIME_FACTOR
+                + judge_config.WALL_TIME_EXTRA,
+            "stop_on_error": True,
+            "parallel": parallel,
+            "output_limit": output_limit * 1024 * 1024,
+        }
         
-        container.reload()
+        # Cases are judged as soon as their reports arrive, so that judging stops
+        # once the fail-fast policy of the problem is met
+        failures = 0
+        stopped = False
         
-        if container.attrs['State'].get('OOMKilled'):
-            log[i]["result"] = "MLE"
-            log[i]["memory"] = memory_limit
-            container.remove(force = True)
-            continue
+        def count(i: int) -> bool:
+            nonlocal failures, stopped
+            if log[i]["result"] != "AC":
+                failures += 1
+            if fail_fast > 0 and failures >= fail_fast:
+                stopped = True
+            return stopped
         
-        if exec_thread.is_alive():
-            log[i]["result"] = "TLE"
-            log[i]["time"] = time_limit
-            container.stop(timeout = 1)
-            container.remove(force = True)
-            continue
+        async def on_report(report: dict) -> bool:
+            if report["status"] == "skipped" or special:
+                return False
+            i = report["id"] - 1
+            if judge_case(report, time_limit, memory_limit, log[i]):
+                # Comparing large outputs takes a while, out of the event loop
+                check = await loop.run_in_executor(
+                    None,
+                    checkers.check_files,
+                    testcase_store.file_path("output", test_cases[i]["output"]),
+                    os.path.join(sandbox.workdir, f"{report['id']}.out"),
+                    checker,
+                    eps
+                )
+                log[i]["result"] = check.result
+                if check.message:
+                    log[i]["message"] = check.message
+            return count(i)
         
-        if stderr_output.decode():
-            # If RE, making following tests is unnecessary
-            container.remove(force = True)
-            for j in range(i, len(test_cases)):
-                log[j]["result"] = "RE"
-            break
+        if judge_config.JUDGE_MODE == "batch" and not special:
+            # All cases with one call of the runner
+            reports = await run_cases(sandbox, dict(spec, cases=cases), "cases", on_report)
+        else:
+            # A call of the runner for each case, cases are started in order and
+            # not after a runtime error, like the runner does
+            slots = asyncio.Semaphore(parallel)
+            stop = False
         
-        container.remove(force = True)
-        ans_out = str(item["output"]).split('\n')
-        test_out = str(stdout_output.decode()).split('\n')
+            async def run_case(case: dict) -> dict | None:
+                nonlocal stop
+                async with slots:
+                    if stop or stopped:
+                        return None
+                    report = (await run_cases(
+                        sandbox,
+                        dict(spec, cases=[case], parallel=1),
+                        str(case["id"]),
+                        on_report
+                    ))[0]
+                    if report is None:
+                        stop = True
+                        return report
+                    if special:
+                        # The runner has exited, the checker runs on its own
+                        i = case["id"] - 1
+                        if judge_case(report, time_limit, memory_limit, log[i]):
+                            check = await run_checker(
+                                sandbox, checker_binary, test_cases[i], case
+                            )
+                            log[i]["result"] = check.result
+                            if check.message:
+                                log[i]["message"] = check.message
+                        count(i)
+                    if sandbox_runner.is_runtime_error(report):
+                        stop = True
+                    return report
         
-        ans_out.pop()
+            reports = await asyncio.gather(*(run_case(case) for case in cases))
         
-        # Filter output
-        if not test_out:
-            log[i]["result"] = "WA"
-            continue
-            
-        if test_out[-1] == '':
-            test_out.pop()
+        for i, report in enumerate(reports):
+            if report is None:
+                if stopped:
+                    # Skipped by the fail-fast policy
+                    log[i]["result"] = "SKIPPED"
+                    continue
+                # Runner itself failed, leave the log unknown
+                break
         
-        if not test_out:
-            log[i]["result"] = "WA"
-            continue
-        if test_out[-1] == '':
-            test_out.pop()
+            if report["status"] == "skipped":
+                # Skipped after a runtime error
+                log[i]["result"] = "RE"
+                continue
         
-        log[i]["result"] = "AC"
+            if log[i]["result"] == "RE":
+                # If RE, making following tests is unnecessary
+                for j in range(i, len(test_cases)):
+                    log[j]["result"] = "RE"
+                break
+    finally:
+        if checker_entry is not None:
+            await loop.run_in_executor(None, compile_cache.discard, checker_entry)
+
+def judge_case(
+    report: dict,
+    time_limit: float,
+    memory_limit: int,
+    entry: dict
+) -> bool:
+    """
+    Fill the log entry of a case from its report.
+
+    Args:
+        report (dict): report of the case from the runner
+        time_limit (float): time limit of each test case
+        memory_limit (int): memory limit in MB
+        entry (dict): log entry of the case
+
+    Returns:
+        bool: whether the case ran within its limits, its output has to be
+        checked then.
+    """
+    entry["time"] = report["cpu_time"]
+    entry["memory"] = report["memory"]
+    
+    if report["status"] == "timeout":
+        entry["result"] = "TLE"
+        entry["time"] = time_limit
+        return False
+    
+    if report["oom_killed"] or report["memory"] > memory_limit:
+        entry["result"] = "MLE"
+        entry["memory"] = memory_limit
+        return False
+    
+    if report.get("output_limit_exceeded"):
+        entry["result"] = "OLE"
+        return False
+    
+    if sandbox_runner.is_runtime_error(report):
+        entry["result"] = "RE"
+        return False
+    
+    return True
+
+async def run_checker(
+    sandbox: container_pool.Sandbox,
+    binary: str,
+    test_case: dict,
+    case: dict
+) -> checkers.CheckResult:
+    """
+    Run the special judge of a problem on a case in the sandbox, as
+    `checker input output answer` like testlib expects.
+
+    Every process of the submission is killed first. The checker then runs
+    in a fresh directory written by the judge only, see `prepare_check`, so
+    that the submission can neither pass it a link instead of its output,
+    read the answer nor replace the checker. The directory is removed right
+    after.
+
+    Args:
+        sandbox (Sandbox): sandbox leased for the submission
+        binary (str): host path of the compiled checker
+        test_case (dict): manifest of the case
+        case (dict): case of the runner spec
+
+    Returns:
+        CheckResult: AC on exit code 0, WA on 1 or 2 (wrong answer and
+        presentation error of testlib) or when the output is not a regular
+        file, UNK when the checker failed.
+    """
+    loop = asyncio.get_event_loop()
+    await loop.run_in_executor(None, sandbox.kill)
+    
+    directory = await loop.run_in_executor(
+        None, prepare_check, sandbox, binary, test_case, case
+    )
+    if directory is None:
+        return checkers.CheckResult("WA", "output is not a regular file")
+    try:
+        # testlib writes its comment to stderr, only the start of it is kept
+        result = await run_engine.run(
+            sandbox,
+            [
+                "sh", "-c",
+                'cd "$1" && shift && ulimit -f 64; exec ./checker "$@" > checker.log 2>&1',
+                "sh", directory, case["input"], "output", "answer"
+            ],
+            judge_config.CHECKER_TIME_LIMIT
+        )
+        message = read_workdir_file(
+            sandbox, os.path.join(directory, "checker.log"), 200
+        ).strip()
+    finally:
+        await loop.run_in_executor(
+            None, shutil.rmtree, os.path.join(sandbox.workdir, directory), True
+        )
+    
+    if result.timed_out:
+        return checkers.CheckResult("UNK", "checker timed out")
+    if result.exit_code == 0:
+        return checkers.CheckResult("AC")
+    if result.exit_code in (1, 2):
+        return checkers.CheckResult("WA", message)
+    return checkers.CheckResult("UNK", message)
+
+def prepare_check(
+    sandbox: container_pool.Sandbox,
+    binary: str,
+    test_case: dict,
+    case: dict
+) -> str | None:
+    """
+    Make a fresh directory of the work directory for a run of the special
+    judge, holding a copy of the output of the case, the answer, the
+    checker and an empty checker.log, the only file the checker may write.
+
+    The output is opened without following links and copied only if it is
+    a regular file, the directory itself is readable by the sandbox user
+    but only writable by the judge.
+
+    Returns:
+        str: the directory relative to the work directory, None if the
+        output is not a regular file.
+    """
+    try:
+        fd = os.open(
+            os.path.join(sandbox.workdir, case["output"]),
+            os.O_RDONLY | os.O_NOFOLLOW | os.O_NONBLOCK
+        )
+    except OSError:
+        return None
+    with os.fdopen(fd, "rb") as output:
+        if not stat.S_ISREG(os.fstat(output.fileno()).st_mode):
+            return None
+        directory = tempfile.mkdtemp(prefix="check_", dir=sandbox.workdir)
+        os.chmod(directory, 0o755)
+        with open(os.path.join(directory, "output"), "xb") as f:
+            shutil.copyfileobj(output, f)
+    
+    shutil.copyfile(
+        testcase_store.file_path("output", test_case["output"]),
+        os.path.join(directory, "answer")
+    )
+    shutil.copyfile(binary, os.path.join(directory, "checker"))
+    open(os.path.join(directory, "checker.log"), "xb").close()
+    for name, mode in (
+        ("output", 0o644), ("answer", 0o644), ("checker", 0o755), ("checker.log", 0o666)
+    ):
+        os.chmod(os.path.join(directory, name), mode)
+    return os.path.basename(directory)
+
+def read_workdir_file(
+    sandbox: container_pool.Sandbox,
+    name: str,
+    limit: int
+) -> str:
+    """
+    Read the start of a file written in the work directory of the sandbox,
+    so that the judge never holds more than `limit` bytes of it.
+
+    Returns:
+        str: the text, empty if the file is missing or not a regular file.
+    """
+    try:
+        fd = os.open(os.path.join(sandbox.workdir, name), os.O_RDONLY | os.O_NOFOLLOW)
+    except OSError:
+        return ""
+    with os.fdopen(fd, "rb") as f:
+        return f.read(limit).decode(errors="replace")
+
+def write_workdir_file(
+    sandbox: container_pool.Sandbox,
+    name: str,
+    data,
+    mode: int = 0o644
+):
+    """
+    Write a file into the work directory of the sandbox.
+
+    The directory is writable by the sandbox, so whatever it left at the
+    path is removed first and the file is created exclusively, never
+    following a symbolic link out of the directory.
+
+    Args:
+        sandbox (Sandbox): sandbox leased for the submission
+        name (str): name of the file
+        data (bytes | file): content, a file is copied chunk by chunk
+        mode (int): permissions of the file
+    """
+    path = os.path.join(sandbox.workdir, name)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW, mode)
+    with os.fdopen(fd, "wb") as f:
+        if isinstance(data, bytes):
+            f.write(data)
+        else:
+            shutil.copyfileobj(data, f)
+    os.chmod(path, mode)
+
+def copy_workdir_file(
+    sandbox: container_pool.Sandbox,
+    name: str,
+    path: str,
+    mode: int = 0o644
+):
+    """
+    Copy a file of the host into the work directory of the sandbox, see
+    `write_workdir_file`.
+    """
+    with open(path, "rb") as f:
+        write_workdir_file(sandbox, name, f, mode)
+
+def lease_slots(pool: container_pool.ContainerPool) -> asyncio.Semaphore:
+    """
+    Semaphore of the sandboxes of a pool for the running event loop.
+    Leases wait on it before taking a thread, so that threads of the
+    default executor, which also release sandboxes, never all wait for a
+    sandbox.
+    """
+    loop = asyncio.get_running_loop()
+    slots = _lease_slots.get(pool)
+    if slots is None or slots[0] is not loop:
+        slots = (loop, asyncio.Semaphore(pool.size))
+        _lease_slots[pool] = slots
+    return slots[1]
+
+async def lease_sandbox(pool: container_pool.ContainerPool) -> container_pool.Sandbox:
+    """
+    Lease a sandbox of a pool out of the event loop, once one of its slots
+    is free, see `lease_slots`. If the caller is cancelled while the lease
+    runs, it still completes in its thread, and the sandbox is released then
+    instead of leaking.
+    """
+    loop = asyncio.get_event_loop()
+    slots = lease_slots(pool)
+    await slots.acquire()
+    future = loop.run_in_executor(None, pool.lease)
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        def release(done: asyncio.Future):
+            if done.cancelled() or done.exception() is not None:
+                slots.release()
+                return
+            released = loop.run_in_executor(None, pool.release, done.result())
+            released.add_done_callback(lambda _: slots.release())
+        future.add_done_callback(release)
+        raise
+    except BaseException:
+        slots.release()
+        raise
+
+async def release_sandbox(pool: container_pool.ContainerPool, sandbox: container_pool.Sandbox):
+    """
+    Release a sandbox out of the event loop, even if the caller is cancelled
+    meanwhile, then free its slot.
+    """
+    loop = asyncio.get_event_loop()
+    slots = lease_slots(pool)
+    released = loop.run_in_executor(None, pool.release, sandbox)
+    released.add_done_callback(lambda _: slots.release())
+    await asyncio.shield(released)
+
+async def compile_source(
+    code: str,
+    source: str,
+    binary: str,
+    command: str,
+    language: language_registry.Language,
+    sandbox: container_pool.Sandbox | None = None
+) -> compile_cache.CompileEntry:
+    """
+    Compile code in a compiler container of its language leased for it, only
+    when the same source was not compiled with the same command before.
+
+    Args:
+        code (str): code to be compiled
+        source (str): file name of the code
+        binary (str): file name of the binary built by the command
+        command (str): command compiling the code
+        language (Language): language whose image compiles the code
+        sandbox (Sandbox, optional): sandbox the binary is copied
+            into, through the host
+
+    Returns:
+        CompileEntry: the compilation. Without a sandbox, its binary is a
+        private copy of the cached one, removed by `compile_cache.discard`.
+    """
+    # The cache lives on disk, it is read and written out of the event loop
+    key = compile_cache.cache_key(code, language.image, command)
+    loop = asyncio.get_event_loop()
+    entry = await loop.run_in_executor(None, compile_cache.checkout, key)
+    if entry is not None:
+        if entry.success and sandbox is not None:
+            try:
+                await loop.run_in_executor(
+                    None, copy_workdir_file, sandbox, binary, entry.binary, 0o755
+                )
+            finally:
+                await loop.run_in_executor(None, compile_cache.discard, entry)
+            return compile_cache.CompileEntry(True, entry.output)
+        return entry
+    
+    # Building the runtime may read the database and call Docker
+    pool = await loop.run_in_executor(
+        None, judge_runtime.get_pool, language.name, True
+    )
+    compiler = await lease_sandbox(pool)
+    try:
+        with open(os.path.join(compiler.workdir, source), "w", encoding="utf-8") as f:
+            f.write(code)
+        compile_result = await run_engine.run(
+            compiler,
+            ['sh', '-c', f'{command} > compile.log 2>&1'],
+            judge_config.COMPILE_TIME_LIMIT
+        )
         
-        # Check output
-        if len(test_out) != len(ans_out):
-            log[i]["result"] = "WA"
-            continue
+        # Killed compilations are not cached, they may pass next time
+        if compile_result.timed_out:
+            return compile_cache.CompileEntry(False, "compilation timed out")
         
-        for ans, test in zip(ans_out, test_out):
-            if len(test) == 0:
-                if len(ans) != 0:
-                    log[i]["result"] = "WA"
-                    break
-            
-            elif test[-1] == ' ':
-                if ans != test[0 : -1]:
-                    log[i]["result"] = "WA"
-                    break
-                    
-            else:
-                if ans != test:
-                    log[i]["result"] = "WA"
-                    break
+        success = compile_result.exit_code == 0
+        output = read_workdir_file(compiler, "compile.log", COMPILE_OUTPUT_LIMIT)
+        built = os.path.join(compiler.workdir, binary)
+        if success and sandbox is not None:
+            await loop.run_in_executor(
+                None, copy_workdir_file, sandbox, binary, built, 0o755
+            )
+        await loop.run_in_executor(
+            None, compile_cache.store, key, success, output, built if success else None
+        )
+        kept = None
+        if success and sandbox is None:
+            kept = await loop.run_in_executor(None, compile_cache.keep, built)
+    finally:
+        await release_sandbox(pool, compiler)
     
-    # Update log
-    await update_log(submission_id, log)
-    
\ No newline at end of file
+    return compile_cache.CompileEntry(success, output, kept)
+
+async def compile_submission(
+    sandbox: container_pool.Sandbox,
+    code: str,
+    language: language_registry.Language
+) -> bool:
+    """
+    Get the binary `main` of a submission in a compiled language into the
+    sandbox.
+
+    Args:
+        sandbox (Sandbox): sandbox leased for the submission
+        code (str): code to be compiled
+        language (Language): language of the code
+
+    Returns:
+        bool: whether the code compiled.
+    """
+    entry = await compile_source(
+        code, language.source, "main", language.compile_cmd, language, sandbox
+    )
+    return entry.success
+
+async def run_cases(
+    sandbox: container_pool.Sandbox,
+    spec: dict,
+    name: str,
+    on_report: Callable[[dict], Awaitable[bool]] | None = None
+) -> list:
+    """
+    Run cases of a spec with the runner in the sandbox.
+
+    Args:
+        sandbox (Sandbox): sandbox leased for the submission
+        spec (dict): spec of the runner, see app/sandbox_runner.py
+        name (str): name of the spec file
+        on_report (Callable, optional): coroutine called with each report
+            once it arrives, the runner is killed once it returns True
+
+    Returns:
+        list: report of each case, None for cases the runner did not report.
+    """
+    write_workdir_file(sandbox, f"{name}.json", json.dumps(spec).encode("utf-8"))
+    
+    reports: dict = {}
+    
+    async def on_line(line: bytes) -> bool:
+        try:
+            report = json.loads(line)
+        except ValueError:
+            return False
+        reports[report["id"]] = report
+        return on_report is not None and await on_report(report)
+    
+    # The runner enforces limits of each case by itself
+    await run_engine.stream(
+        sandbox,
+        sandbox.RUNNER + [f"{name}.json"],
+        len(spec["cases"]) * (spec["wall_limit"] + 1) + judge_config.COMPILE_TIME_LIMIT,
+        on_line
+    )
+    return [reports.get(case["id"]) for case in spec["cases"]]
@@ -0,0 +1,167 @@
+"""
+Content-addressed cache of compilations.
+
+An entry is a directory named by the hash of the source, the compiler image
+and the command. It holds `result.json` with the exit status and output of
+the compiler, and the binary `main` when compiling succeeded. Entries are
+touched when they are used, and the least recently used ones are removed
+once the cache grows over its size limit. Judges check binaries out into
+private directories of the cache, so that an eviction by another worker
+never removes a binary in use.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from dataclasses import dataclass
+from app import judge_config
+
+@dataclass
+class CompileEntry:
+    """
+    A cached compilation.
+
+    Attributes:
+        success (bool): whether the source compiled.
+        output (str): output of the compiler.
+        binary (str): path of the binary, None if compiling failed.
+    """
+    success: bool
+    output: str
+    binary: str | None = None
+
+def cache_key(source: str, image: str, command: str) -> str:
+    """
+    Key of a compilation.
+
+    Args:
+        source (str): source code.
+        image (str): image of the compiler.
+        command (str): command compiling the source.
+    """
+    data = json.dumps([image, command, source], ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+def lookup(key: str) -> CompileEntry | None:
+    """
+    Get a cached compilation, marking it as recently used.
+
+    Returns:
+        CompileEntry: the entry, None if it is not cached.
+    """
+    entry_dir = os.path.join(judge_config.COMPILE_CACHE_DIR, key)
+    try:
+        with open(os.path.join(entry_dir, "result.json"), "r", encoding="utf-8") as f:
+            result = json.load(f)
+        os.utime(entry_dir)
+    except (OSError, ValueError):
+        return None
+
+    binary = os.path.join(entry_dir, "main") if result["success"] else None
+    return CompileEntry(result["success"], result["output"], binary)
+
+def checkout(key: str) -> CompileEntry | None:
+    """
+    Get a cached compilation like `lookup`, with its binary linked into a
+    private directory that eviction leaves alone. The binary is removed by
+    `discard` once used.
+
+    Returns:
+        CompileEntry: the entry, None if it is not cached or was evicted
+        since the lookup.
+    """
+    entry = lookup(key)
+    if entry is None or entry.binary is None:
+        return entry
+    try:
+        binary = _private(entry.binary, os.link)
+    except FileNotFoundError:
+        return None
+    return CompileEntry(entry.success, entry.output, binary)
+
+def keep(path: str) -> str:
+    """
+    Copy a binary built outside the cache into a private directory, see
+    `checkout`.
+
+    Returns:
+        str: path of the copy.
+    """
+    return _private(path, shutil.copy)
+
+def discard(entry: CompileEntry):
+    """
+    Remove the binary of an entry got from `checkout`, entries of `lookup`
+    are left in the cache.
+    """
+    if entry.binary is None:
+        return
+    directory = os.path.dirname(entry.binary)
+    if os.path.basename(directory).startswith(".use_"):
+        shutil.rmtree(directory, ignore_errors=True)
+
+def _private(path: str, copy) -> str:
+    os.makedirs(judge_config.COMPILE_CACHE_DIR, exist_ok=True)
+    directory = tempfile.mkdtemp(dir=judge_config.COMPILE_CACHE_DIR, prefix=".use_")
+    try:
+        copy(path, os.path.join(directory, "main"))
+    except OSError:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+    return os.path.join(directory, "main")
+
+def store(key: str, success: bool, output: str, binary: str | None = None):
+    """
+    Cache a compilation.
+
+    Args:
+        key (str): key of the compilation.
+        success (bool): whether the source compiled.
+        output (str): output of the compiler.
+        binary (str, optional): path of the compiled binary.
+    """
+    os.makedirs(judge_config.COMPILE_CACHE_DIR, exist_ok=True)
+
+    # Build the entry aside, so that readers never see half of it
+    tmp_dir = tempfile.mkdtemp(dir=judge_config.COMPILE_CACHE_DIR, prefix=".tmp_")
+    try:
+        if success:
+            shutil.copyfile(binary, os.path.join(tmp_dir, "main"))
+            os.chmod(os.path.join(tmp_dir, "main"), 0o755)
+        with open(os.path.join(tmp_dir, "result.json"), "w", encoding="utf-8") as f:
+            json.dump({"success": success, "output": output}, f)
+        os.rename(tmp_dir, os.path.join(judge_config.COMPILE_CACHE_DIR, key))
+    except OSError:
+        # Stored by another worker at the same time
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return
+
+    evict(judge_config.COMPILE_CACHE_SIZE * 1024 * 1024)
+
+def evict(max_bytes: int):
+    """
+    Remove least recently used entries until the cache fits in `max_bytes`.
+    """
+    entries = []
+    total = 0
+    for key in os.listdir(judge_config.COMPILE_CACHE_DIR):
+        if key.startswith("."):
+            continue
+        entry_dir = os.path.join(judge_config.COMPILE_CACHE_DIR, key)
+        try:
+            size = sum(
+                os.path.getsize(os.path.join(entry_dir, name))
+                for name in os.listdir(entry_dir)
+            )
+            entries.append((os.path.getmtime(entry_dir), size, entry_dir))
+        except OSError:
+            continue
+        total += size
+
+    entries.sort()
+    for _, size, entry_dir in entries:
+        if total <= max_bytes:
+            break
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        total -= size
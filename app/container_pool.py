@@ -0,0 +1,451 @@
+import docker
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections.abc import Callable
+from app import judge_config
+from app import testcase_store
+
+logger = logging.getLogger(__name__)
+
+class Sandbox:
+    """
+    Interface of a sandbox backend, a place where submissions run confined.
+
+    Commands run with the working directory as current directory, it is
+    /submission in containers and lives on the host, so files are written
+    to it directly.
+
+    Attributes:
+        workdir (str): host path of the working directory.
+        uses (int): number of leases served by the sandbox.
+    """
+    # Command running app/sandbox_runner.py in the sandbox.
+    RUNNER: list = ["python3", "/judge/sandbox_runner.py"]
+
+    def __init__(self, workdir: str):
+        self.workdir = workdir
+        self.uses = 0
+
+    def input_path(self, digest: str) -> str:
+        """
+        Path of a stored input as commands in the sandbox see it.
+        """
+        return testcase_store.sandbox_path(digest)
+
+    def set_limits(self, memory_limit: int, cpu_quota: int):
+        """
+        Update limits of the sandbox if they changed.
+
+        Args:
+            memory_limit (int): memory limit in MB, swap is not allowed.
+            cpu_quota (int): cpu quota in a period of 100000.
+        """
+        raise NotImplementedError
+
+    def exec_run(self, cmd: list) -> tuple:
+        """
+        Run a command and wait for it.
+
+        Returns:
+            A tuple containing the exit code, None if it is unknown, the
+            standard output and the standard error.
+        """
+        raise NotImplementedError
+
+    def exec_stream(self, cmd: list, on_stdout: Callable[[bytes], None]) -> tuple:
+        """
+        Run a command, passing its standard output to `on_stdout` chunk by
+        chunk as it is written.
+
+        Returns:
+            A tuple containing the exit code and the standard error.
+        """
+        raise NotImplementedError
+
+    def kill(self):
+        """
+        Kill every process running in the sandbox.
+        """
+        raise NotImplementedError
+
+    def reset(self):
+        """
+        Make the sandbox clean for the next lease.
+        """
+        self.kill()
+        for name in os.listdir(self.workdir):
+            path = os.path.join(self.workdir, name)
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+
+    def healthy(self) -> bool:
+        """
+        Check whether the sandbox can still be leased.
+        """
+        return os.path.isdir(self.workdir)
+
+    def remove(self):
+        """
+        Remove the sandbox and its working directory.
+        """
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+class PooledContainer(Sandbox):
+    """
+    A warm sandbox container together with its working directory, which is
+    bind-mounted to /submission.
+
+    Attributes:
+        container: the running docker container.
+    """
+    def __init__(self, container, workdir: str):
+        super().__init__(workdir)
+        self.container = container
+        self.memory_limit = None
+        self.cpu_quota = None
+
+    def set_limits(self, memory_limit: int, cpu_quota: int):
+        """
+        Update cgroup limits of the container if they changed.
+        """
+        if (memory_limit, cpu_quota) == (self.memory_limit, self.cpu_quota):
+            return
+
+        self.container.update(
+            mem_limit=f"{memory_limit}m",
+            memswap_limit=f"{memory_limit}m",
+            cpu_quota=cpu_quota
+        )
+        self.memory_limit = memory_limit
+        self.cpu_quota = cpu_quota
+
+    def exec_run(self, cmd: list) -> tuple:
+        exec_result = self.container.exec_run(
+            cmd = cmd,
+            workdir = "/submission",
+            demux = True
+        )
+        stdout, stderr = exec_result.output or (None, None)
+        return exec_result.exit_code, stdout or b"", stderr or b""
+
+    def exec_stream(self, cmd: list, on_stdout: Callable[[bytes], None]) -> tuple:
+        api = self.container.client.api
+        exec_id = api.exec_create(self.container.id, cmd, workdir="/submission")["Id"]
+        error = b""
+        for stdout, stderr in api.exec_start(exec_id, stream=True, demux=True):
+            if stderr:
+                error += stderr
+            if stdout:
+                on_stdout(stdout)
+        return api.exec_inspect(exec_id)["ExitCode"], error
+
+    def kill(self):
+        """
+        Kill every process in the container except its init process.
+        """
+        self.container.exec_run(["/bin/sh", "-c", "kill -9 -1"])
+
+    def reset(self):
+        """
+        Make the container clean for the next lease, its /tmp tmpfs lives as
+        long as the container like the working directory.
+        """
+        super().reset()
+        exit_code, _, _ = self.exec_run(["find", "/tmp", "-mindepth", "1", "-delete"])
+        if exit_code != 0:
+            raise RuntimeError("failed to clean /tmp of the sandbox")
+
+    def healthy(self) -> bool:
+        """
+        Check whether the container is still running.
+        """
+        try:
+            self.container.reload()
+        except docker.errors.APIError:
+            return False
+        return self.container.status == "running"
+
+    def remove(self):
+        """
+        Remove the container and its working directory.
+        """
+        try:
+            self.container.remove(force=True)
+        except docker.errors.APIError:
+            pass
+        super().remove()
+
+class ContainerPool:
+    """
+    Pre-started sandbox containers of one image.
+
+    Containers are leased for a whole submission, reset when they are
+    returned and recycled after serving `max_uses` leases. Other sandbox
+    backends reuse the pool by overriding `_start`.
+    """
+    def __init__(
+        self,
+        client: docker.DockerClient,
+        image: str,
+        container_args: dict,
+        size: int,
+        max_uses: int
+    ):
+        self.client = client
+        self.image = image
+        self.container_args = container_args
+        self.size = size
+        self.max_uses = max_uses
+
+        self._idle: list[Sandbox] = []
+        self._created = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def _make_workdir(self) -> str:
+        os.makedirs(judge_config.SANDBOX_DIR, exist_ok=True)
+        workdir = tempfile.mkdtemp(
+            prefix=f"{self.image}_",
+            dir=os.path.abspath(judge_config.SANDBOX_DIR)
+        )
+
+        # The sandbox user has to write compiled files
+        os.chmod(workdir, 0o777)
+        return workdir
+
+    def _start(self) -> Sandbox:
+        workdir = self._make_workdir()
+        args = dict(self.container_args)
+        volumes = {
+            workdir: {'bind': '/submission', 'mode': 'rw'},
+            os.path.abspath('./app/sandbox_runner.py'): {
+                'bind': '/judge/sandbox_runner.py',
+                'mode': 'ro'
+            },
+        }
+        volumes.update(args.pop('volumes', {}))
+
+        try:
+            container = self.client.containers.run(
+                self.image,
+                volumes=volumes,
+                **args
+            )
+        except Exception:
+            shutil.rmtree(workdir, ignore_errors=True)
+            raise
+
+        return PooledContainer(container, workdir)
+
+    def warm(self):
+        """
+        Start containers until the pool is full.
+        """
+        while True:
+            with self._cond:
+                if self._created >= self.size:
+                    return
+                self._created += 1
+            self._put(self._start_or_forget())
+
+    def _start_or_forget(self) -> Sandbox:
+        try:
+            return self._start()
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+    def _put(self, item: Sandbox):
+        with self._cond:
+            self._idle.append(item)
+            self._cond.notify()
+
+    def _discard(self, item: Sandbox):
+        item.remove()
+        with self._cond:
+            self._created -= 1
+            self._cond.notify()
+
+    def lease(self) -> Sandbox:
+        """
+        Get a healthy container, waiting if all of them are leased.
+        """
+        while True:
+            with self._cond:
+                while not self._idle and self._created >= self.size:
+                    self._cond.wait()
+
+                if self._idle:
+                    item = self._idle.pop()
+                else:
+                    item = None
+                    self._created += 1
+
+            if item is None:
+                item = self._start_or_forget()
+            elif not item.healthy():
+                logger.warning("Replacing unhealthy sandbox of %s", self.image)
+                self._discard(item)
+                continue
+
+            item.uses += 1
+            return item
+
+    def release(self, item: Sandbox):
+        """
+        Return a leased container to the pool.
+        """
+        try:
+            item.reset()
+        except Exception:
+            logger.exception("Failed to reset sandbox of %s", self.image)
+            self._discard(item)
+            return
+
+        if self._closed:
+            # Pool of an old judge runtime
+            self._discard(item)
+            return
+
+        if item.uses < self.max_uses:
+            self._put(item)
+            return
+
+        # Recycle worn out container
+        self._discard(item)
+        try:
+            self.warm()
+        except Exception:
+            logger.exception("Failed to start sandbox of %s", self.image)
+
+    def close(self):
+        """
+        Remove all idle containers, containers leased at the moment are
+        removed once they are released.
+        """
+        with self._cond:
+            self._closed = True
+            idle = self._idle
+            self._idle = []
+            self._created -= len(idle)
+        for item in idle:
+            item.remove()
+
+def process_alive(pid: int) -> bool:
+    """
+    Check whether a process of this host is alive.
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def reap_orphans(client: docker.DockerClient):
+    """
+    Remove sandbox containers left by judge processes which are gone, found
+    by their `oj.pool` label, together with their working directories.
+    """
+    try:
+        containers = client.containers.list(all=True, filters={"label": "oj.pool"})
+    except docker.errors.APIError:
+        logger.exception("Failed to list sandbox containers")
+        return
+
+    for container in containers:
+        try:
+            pid = int(container.labels.get("oj.pool", ""))
+        except ValueError:
+            continue
+        if process_alive(pid):
+            continue
+        workdirs = [
+            mount["Source"] for mount in container.attrs.get("Mounts", [])
+            if mount.get("Destination") == "/submission"
+        ]
+        try:
+            container.remove(force=True)
+        except docker.errors.APIError:
+            continue
+        for workdir in workdirs:
+            shutil.rmtree(workdir, ignore_errors=True)
+        logger.info("Removed sandbox container of dead judge %s", pid)
+
+def sandbox_args(seccomp: str) -> dict:
+    """
+    Arguments of a locked-down sandbox container.
+
+    Args:
+        seccomp (str): serialized seccomp profile, see app/judge_runtime.py.
+    """
+    # Written by gemini.
+    return {
+        'detach': True,
+        'remove': False,
+        'command': ['sleep', 'infinity'],
+        'labels': {'oj.pool': str(os.getpid())},
+        'mem_limit': '128m',
+        'memswap_limit': '128m',
+        'pids_limit': 128,
+        'cpu_period': 100000,
+        'cpu_quota': 100000,
+        'network_disabled': True,
+        'read_only': True,
+        'tmpfs': {'/tmp': 'rw,noexec,nosuid,size=64m'},
+        'user': '1000:1000',
+        'security_opt': [f'seccomp={seccomp}',
+                         'no-new-privileges'],
+        'cap_drop': ['ALL'],
+        'working_dir': '/submission',
+        'volumes': {
+            testcase_store.input_dir(): {
+                'bind': testcase_store.SANDBOX_PATH,
+                'mode': 'ro'
+            },
+        },
+    }
+
+def compiler_args(seccomp: str, ccache: bool = False) -> dict:
+    """
+    Arguments of a compiler container.
+
+    Compiler containers only run compilers, never submissions. Those of the
+    built-in C++ are the only ones mounting the ccache volume shared by all
+    their compilations, compilers of registered languages run commands of
+    their own and could poison it.
+
+    Args:
+        seccomp (str): serialized seccomp profile.
+        ccache (bool): mount the ccache volume.
+    """
+    args = sandbox_args(seccomp)
+    args.update({
+        'mem_limit': f'{judge_config.COMPILE_MEMORY_LIMIT}m',
+        'memswap_limit': f'{judge_config.COMPILE_MEMORY_LIMIT}m',
+        'volumes': {},
+    })
+    if not ccache:
+        return args
+    args.update({
+        'volumes': {
+            judge_config.CCACHE_VOLUME: {'bind': '/ccache', 'mode': 'rw'},
+        },
+        'environment': {
+            'PATH': '/opt/ccache/bin:/usr/local/sbin:/usr/local/bin'
+                ':/usr/sbin:/usr/bin:/sbin:/bin',
+            'CCACHE_DIR': '/ccache',
+            'CCACHE_MAXSIZE': f'{judge_config.CCACHE_SIZE}M',
+            # Needed by ccache to cache compilations using the PCH
+            'CCACHE_SLOPPINESS': 'pch_defines,time_macros',
+        },
+    })
+    return args
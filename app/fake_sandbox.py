@@ -0,0 +1,179 @@
+"""
+Fake sandbox backend, simulating compilers, the runner and checkers in the
+judge process.
+
+It lets tests and benchmarks push submissions through the whole pipeline
+without Docker, deterministically. Nothing submitted is ever executed: the
+verdict of every case comes from a directive in the source, such as
+
+    # fake: TLE
+    // fake: CE
+
+with one of AC (the default), WA, TLE, MLE, RE, OLE and CE. Accepted cases
+write the answer of their input, found through the manifests of the
+problems. Compiling and running each case take FAKE_COMPILE_LATENCY and
+FAKE_RUN_LATENCY seconds. (OJ_FAKE_COMPILE_LATENCY, OJ_FAKE_RUN_LATENCY)
+"""
+import json
+import os
+import re
+import shutil
+import signal
+import sqlite3
+import threading
+import time
+from collections.abc import Callable
+from app import checkers
+from app import container_pool
+from app import judge_config
+from app import testcase_store
+
+DIRECTIVE = re.compile(rb"fake:\s*(AC|WA|TLE|MLE|RE|OLE|CE)\b")
+
+# Answer of each input hash, read from the manifests of the problems.
+_answers: dict[str, str] = {}
+_answers_lock = threading.Lock()
+
+def directive(path: str) -> str:
+    """
+    Verdict a source or fake binary asks for.
+    """
+    try:
+        with open(path, "rb") as f:
+            match = DIRECTIVE.search(f.read())
+    except OSError:
+        return "RE"
+    return match.group(1).decode() if match else "AC"
+
+def answer_path(input_path: str) -> str | None:
+    """
+    Path of the answer of a stored input, None if no problem has it.
+    """
+    digest = os.path.basename(input_path)
+    with _answers_lock:
+        if digest not in _answers:
+            with sqlite3.connect('./app/oj_system.db') as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT testcases FROM problems")
+                for (testcases, ) in cursor.fetchall():
+                    for item in testcase_store.load_manifest(testcases):
+                        _answers[item["input"]] = item["output"]
+        output = _answers.get(digest)
+    return testcase_store.file_path("output", output) if output else None
+
+class FakeSandbox(container_pool.Sandbox):
+    """
+    A working directory on the host where commands are simulated.
+    """
+    RUNNER: list = ["fake-runner"]
+
+    def __init__(self, workdir: str):
+        super().__init__(workdir)
+        self._killed = threading.Event()
+
+    def input_path(self, digest: str) -> str:
+        return os.path.abspath(testcase_store.file_path("input", digest))
+
+    def set_limits(self, memory_limit: int, cpu_quota: int):
+        pass
+
+    def exec_run(self, cmd: list) -> tuple:
+        command = " ".join(cmd)
+        if "> compile.log" in command:
+            return self._compile()
+        if "./checker" in command:
+            return self._check(*cmd[-4:])
+        return 0, b"", b""
+
+    def _compile(self) -> tuple:
+        # A compiler sandbox only holds the source, which builds the binary
+        # named after it, like main.cpp builds main
+        time.sleep(judge_config.FAKE_COMPILE_LATENCY)
+        source = os.listdir(self.workdir)[0]
+        binary = os.path.splitext(source)[0]
+        source_path = os.path.join(self.workdir, source)
+        log_path = os.path.join(self.workdir, "compile.log")
+        if directive(source_path) == "CE":
+            with open(log_path, "w") as f:
+                f.write(f"{source}: fake compile error\n")
+            return 1, b"", b""
+
+        # The fake binary keeps the source, and so its directive
+        shutil.copyfile(source_path, os.path.join(self.workdir, binary))
+        open(log_path, "w").close()
+        return 0, b"", b""
+
+    def _check(self, directory: str, input_path: str, output: str, answer: str) -> tuple:
+        # The checker runs in its own directory of the workdir
+        directory = os.path.join(self.workdir, directory)
+        check = checkers.check_files(
+            os.path.join(directory, answer),
+            os.path.join(directory, output)
+        )
+        with open(os.path.join(directory, "checker.log"), "w") as f:
+            f.write("ok" if check.result == "AC" else check.message)
+        return (0 if check.result == "AC" else 1), b"", b""
+
+    def exec_stream(self, cmd: list, on_stdout: Callable[[bytes], None]) -> tuple:
+        self._killed.clear()
+        with open(os.path.join(self.workdir, cmd[-1]), "r", encoding="utf-8") as f:
+            spec = json.load(f)
+        program = spec["cmd"][-1]
+        verdict = directive(os.path.join(self.workdir, program))
+
+        stopped = False
+        for case in spec["cases"]:
+            if stopped:
+                on_stdout(json.dumps({"id": case["id"], "status": "skipped"}).encode() + b"\n")
+                continue
+            if self._killed.wait(judge_config.FAKE_RUN_LATENCY):
+                return None, b""
+            report = self._run_case(case, verdict, spec["time_limit"])
+            if verdict == "RE" and spec.get("stop_on_error"):
+                stopped = True
+            on_stdout(json.dumps(report).encode() + b"\n")
+        return 0, b""
+
+    def _run_case(self, case: dict, verdict: str, time_limit: float) -> dict:
+        output = ""
+        if verdict == "AC":
+            answer = answer_path(case["input"])
+            output = testcase_store.read("output", os.path.basename(answer)) if answer else ""
+        elif verdict == "WA":
+            output = "fake wrong answer\n"
+        with open(os.path.join(self.workdir, case["output"]), "w", encoding="utf-8") as f:
+            f.write(output)
+        error = "fake runtime error\n" if verdict == "RE" else ""
+        with open(os.path.join(self.workdir, case["error"]), "w", encoding="utf-8") as f:
+            f.write(error)
+
+        report = {
+            "id": case["id"],
+            "status": "timeout" if verdict == "TLE" else "finished",
+            "exit_code": 1 if verdict == "RE" else 0,
+            "signal": None,
+            "time": judge_config.FAKE_RUN_LATENCY,
+            "cpu_time": time_limit if verdict == "TLE" else judge_config.FAKE_RUN_LATENCY,
+            "memory": 1.0,
+            "oom_killed": verdict == "MLE",
+            "output_size": len(output.encode()),
+            "error_size": len(error),
+            "output_limit_exceeded": verdict == "OLE",
+        }
+        if verdict in ("MLE", "OLE"):
+            report["exit_code"] = None
+            report["signal"] = signal.SIGKILL if verdict == "MLE" else signal.SIGXFSZ
+        return report
+
+    def kill(self):
+        self._killed.set()
+
+class FakePool(container_pool.ContainerPool):
+    """
+    Pool of fake sandboxes, leased like containers.
+    """
+    def __init__(self, name: str, size: int, max_uses: int):
+        super().__init__(None, name, {}, size, max_uses)
+
+    def _start(self) -> FakeSandbox:
+        return FakeSandbox(self._make_workdir())
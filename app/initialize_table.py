@@ -1,6 +1,7 @@
 import sqlite3
 import bcrypt
 from datetime import datetime
+from app import testcase_store
 
 async def create_table():
     """
@@ -42,9 +43,25 @@ async def create_table():
             memory_limit INTEGER,
             author TEXT,
             difficulty TEXT,
-            public_cases INTEGER
+            public_cases INTEGER,
+            fail_fast INTEGER,
+            checker TEXT,
+            eps REAL,
+            checker_code TEXT,
+            output_limit INTEGER,
+            testcase_version INTEGER
         )
     ''')
+    add_missing_columns(
+        cursor,
+        "problems",
+        {
+            "fail_fast": "INTEGER", "checker": "TEXT", "eps": "REAL",
+            "checker_code": "TEXT", "output_limit": "INTEGER",
+            "testcase_version": "INTEGER"
+        }
+    )
+    testcase_store.migrate(cursor)
     conn.commit()
     
     # Create table of submissions
@@ -74,7 +91,81 @@ async def create_table():
             run_cmd TEXT NOT NULL,
             source_template TEXT,
             time_limit REAL,
-            memory_limit INTEGER
+            memory_limit INTEGER,
+            image TEXT,
+            time_factor REAL,
+            memory_factor REAL
+        )
+    ''')
+    add_missing_columns(
+        cursor,
+        "languages",
+        {"image": "TEXT", "time_factor": "REAL", "memory_factor": "REAL"}
+    )
+    conn.commit()
+    
+    # Create table of config_versions, bumped on changes of settings kept in
+    # tables so that every process reloads them
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS config_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+    ''')
+    conn.commit()
+    
+    # Create table of judge_queue
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS judge_queue (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            submission_id INTEGER NOT NULL,
+            priority INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            enqueue_time TEXT NOT NULL,
+            worker INTEGER,
+            force INTEGER,
+            batch_id INTEGER,
+            FOREIGN KEY (submission_id) REFERENCES submissions (id)
+        )
+    ''')
+    add_missing_columns(
+        cursor,
+        "judge_queue",
+        {"worker": "INTEGER", "force": "INTEGER", "batch_id": "INTEGER"}
+    )
+    
+    # Judges take the next job in this order
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS judge_queue_order
+        ON judge_queue (status, priority DESC, id)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS judge_queue_batch ON judge_queue (batch_id)
+    ''')
+    conn.commit()
+    
+    # Create table of rejudge_batches
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rejudge_batches (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filters TEXT NOT NULL,
+            total INTEGER NOT NULL,
+            cancelled INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            create_time TEXT NOT NULL
+        )
+    ''')
+    conn.commit()
+    
+    # Create table of judge_results, logs reused by identical code
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS judge_results (
+            code_hash TEXT NOT NULL,
+            language TEXT NOT NULL,
+            testset_version TEXT NOT NULL,
+            log TEXT NOT NULL,
+            judge_time TEXT NOT NULL,
+            PRIMARY KEY (code_hash, language, testset_version)
         )
     ''')
     conn.commit()
@@ -114,4 +205,19 @@ async def create_table():
         )
         conn.commit()
         
-    conn.close()
\ No newline at end of file
+    conn.close()
+
+def add_missing_columns(cursor: sqlite3.Cursor, table: str, columns: dict):
+    """
+    Add columns introduced after the table was created.
+
+    Args:
+        cursor (sqlite3.Cursor): cursor of the database.
+        table (str): name of the table.
+        columns (dict): name and type of each column.
+    """
+    cursor.execute(f"PRAGMA table_info({table})")
+    existing = {row[1] for row in cursor.fetchall()}
+    for name, column_type in columns.items():
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
@@ -0,0 +1,106 @@
+import os
+
+# Settings of the judge, each one can be overridden by the environment
+# variable written next to it.
+
+# Images of the sandbox of the built-in languages, other languages are
+# registered with theirs, see app/language_registry.py.
+IMAGES: dict = {
+    "python": "python-eval-env",
+    "cpp": "cpp-eval-env",
+}
+
+# Number of warm containers kept for each language. (OJ_POOL_SIZE)
+POOL_SIZE: int = int(os.environ.get("OJ_POOL_SIZE", "2"))
+
+# A container is recycled after serving this many runs. (OJ_POOL_MAX_USES)
+POOL_MAX_USES: int = int(os.environ.get("OJ_POOL_MAX_USES", "50"))
+
+# Memory limit while compiling, in MB. (OJ_COMPILE_MEMORY_LIMIT)
+COMPILE_MEMORY_LIMIT: int = int(os.environ.get("OJ_COMPILE_MEMORY_LIMIT", "1024"))
+
+# Host directory holding the working directory of every pooled container.
+SANDBOX_DIR: str = os.environ.get("OJ_SANDBOX_DIR", "./app/sandbox")
+
+# "batch" runs all test cases of a submission with one call of the runner
+# inside the sandbox, "case" execs every test case separately. (OJ_JUDGE_MODE)
+JUDGE_MODE: str = os.environ.get("OJ_JUDGE_MODE", "batch")
+
+# Memory reserved for the runner in the sandbox, in MB.
+RUNNER_MEMORY: int = 32
+
+# Number of submissions judged at the same time. (OJ_JUDGE_CONCURRENCY)
+JUDGE_CONCURRENCY: int = int(os.environ.get("OJ_JUDGE_CONCURRENCY", "4"))
+
+# Jobs of rejudge batches running at the same time over all judges, so that
+# live submissions are never starved. (OJ_REJUDGE_CONCURRENCY)
+REJUDGE_CONCURRENCY: int = int(os.environ.get("OJ_REJUDGE_CONCURRENCY", "1"))
+
+# Submissions a rejudge batch may select at most. (OJ_REJUDGE_LIMIT)
+REJUDGE_LIMIT: int = int(os.environ.get("OJ_REJUDGE_LIMIT", "10000"))
+
+# Seconds between two polls of an idle judge queue.
+QUEUE_POLL_INTERVAL: float = 0.2
+
+# Number of judge worker processes started with the app, 0 means workers are
+# started separately by `python -m app.judge_worker`. (OJ_JUDGE_WORKERS)
+JUDGE_WORKERS: int = int(os.environ.get("OJ_JUDGE_WORKERS", "2"))
+
+# Judge inside the event loop of the app instead of worker processes, only
+# meant for development and tests. (OJ_INLINE_JUDGE)
+INLINE_JUDGE: bool = os.environ.get("OJ_INLINE_JUDGE", "0") == "1"
+
+# Seconds before a compilation is killed.
+COMPILE_TIME_LIMIT: float = 30.0
+
+# Threads waiting for runs in sandboxes. (OJ_RUN_THREADS)
+RUN_THREADS: int = int(os.environ.get("OJ_RUN_THREADS", "16"))
+
+# Wall time limit of a case is time_limit * WALL_TIME_FACTOR + WALL_TIME_EXTRA
+# seconds, time limits themselves are on CPU time.
+WALL_TIME_FACTOR: float = 2.0
+WALL_TIME_EXTRA: float = 1.0
+
+# Directory and size limit in MB of the compile cache.
+# (OJ_COMPILE_CACHE_DIR, OJ_COMPILE_CACHE_SIZE)
+COMPILE_CACHE_DIR: str = os.environ.get("OJ_COMPILE_CACHE_DIR", "./app/compile_cache")
+COMPILE_CACHE_SIZE: int = int(os.environ.get("OJ_COMPILE_CACHE_SIZE", "512"))
+
+# Docker volume shared by the compiler containers, which never run
+# submissions, and size limit in MB of ccache. (OJ_CCACHE_VOLUME, OJ_CCACHE_SIZE)
+CCACHE_VOLUME: str = os.environ.get("OJ_CCACHE_VOLUME", "oj-ccache")
+CCACHE_SIZE: int = int(os.environ.get("OJ_CCACHE_SIZE", "1024"))
+
+# Directory of the content-addressed test data store. (OJ_TESTCASE_DIR)
+TESTCASE_DIR: str = os.environ.get("OJ_TESTCASE_DIR", "./app/testcases")
+
+# Test cases of a submission run at the same time, each one gets its own CPU
+# and memory limit in the sandbox. (OJ_CASE_PARALLELISM)
+CASE_PARALLELISM: int = int(os.environ.get("OJ_CASE_PARALLELISM", "1"))
+
+# Seconds before a special judge of a problem is killed on a case.
+CHECKER_TIME_LIMIT: float = 10.0
+
+# "docker" runs submissions in pooled containers, "local" runs them as
+# confined processes of the host, see app/local_sandbox.py, and "fake" only
+# simulates them for tests and benchmarks, see app/fake_sandbox.py.
+# (OJ_SANDBOX_BACKEND)
+SANDBOX_BACKEND: str = os.environ.get("OJ_SANDBOX_BACKEND", "docker")
+
+# Users of the local backend's processes when the judge runs as root, each
+# sandbox of the host runs as its own user, from LOCAL_SANDBOX_UID to
+# LOCAL_SANDBOX_UID + LOCAL_SANDBOX_UIDS - 1. A LOCAL_SANDBOX_UID of 0 keeps
+# them as root. (OJ_LOCAL_SANDBOX_UID, OJ_LOCAL_SANDBOX_UIDS)
+LOCAL_SANDBOX_UID: int = int(os.environ.get("OJ_LOCAL_SANDBOX_UID", "10000"))
+LOCAL_SANDBOX_UIDS: int = int(os.environ.get("OJ_LOCAL_SANDBOX_UIDS", "1000"))
+
+# Start the local backend even when submissions would run as the user of the
+# judge or without seccomp, where they can read the expected outputs and
+# reach the network. Only meant for development and tests.
+# (OJ_LOCAL_SANDBOX_INSECURE)
+LOCAL_SANDBOX_INSECURE: bool = os.environ.get("OJ_LOCAL_SANDBOX_INSECURE", "0") == "1"
+
+# Seconds a compilation and a test case take with the fake backend.
+# (OJ_FAKE_COMPILE_LATENCY, OJ_FAKE_RUN_LATENCY)
+FAKE_COMPILE_LATENCY: float = float(os.environ.get("OJ_FAKE_COMPILE_LATENCY", "0"))
+FAKE_RUN_LATENCY: float = float(os.environ.get("OJ_FAKE_RUN_LATENCY", "0"))
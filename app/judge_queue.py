@@ -0,0 +1,528 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+from datetime import datetime
+from app import judge_config
+from app.code_judge import judge_in_docker, fail_submission_sync, running_tasks
+from app.container_pool import process_alive
+
+logger = logging.getLogger(__name__)
+
+# Jobs of higher priority are judged first. Rejudge batches queue their jobs
+# below live submissions, and at most REJUDGE_CONCURRENCY of them run at the
+# same time.
+PRIORITY_LIVE = 1
+PRIORITY_REJUDGE = 0
+
+# Set by enqueue to wake up the scheduler of this process.
+_wakeup: asyncio.Event | None = None
+
+# Jobs of this process cancelled by an admin, see `watch_cancelled`.
+_cancelled: set[int] = set()
+
+async def enqueue(
+    submission_id: int,
+    priority: int = PRIORITY_LIVE,
+    force: bool = False
+) -> int:
+    """
+    Put a submission into the judge queue.
+
+    A submission has one queued job at most: if it is already queued, the
+    job takes the higher priority and force of both. A job being judged
+    started before the request, so a new job is queued behind it, and is
+    only claimed once it is done.
+
+    Args:
+        submission_id (int): id of the submission.
+        priority (int): priority of the job.
+        force (bool): run the code even if a result of identical code on
+            the same tests is stored, see app/result_cache.py.
+
+    Returns:
+        int: position of the job in the queue, starting from 1.
+    """
+    loop = asyncio.get_event_loop()
+    position = await loop.run_in_executor(
+        None,
+        enqueue_sync,
+        submission_id,
+        priority,
+        force
+    )
+    if _wakeup is not None:
+        _wakeup.set()
+    return position
+
+def enqueue_sync(
+    submission_id: int,
+    priority: int = PRIORITY_LIVE,
+    force: bool = False
+) -> int:
+    conn = sqlite3.connect('./app/oj_system.db', isolation_level=None)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute(
+            "SELECT id FROM judge_queue WHERE submission_id = ? AND status = 'queued'",
+            (submission_id, )
+        )
+        row = cursor.fetchone()
+        if row:
+            job_id = row[0]
+            cursor.execute(
+                """UPDATE judge_queue SET priority = MAX(priority, ?),
+                force = MAX(COALESCE(force, 0), ?) WHERE id = ?""",
+                (priority, int(force), job_id)
+            )
+            position = get_position(cursor, job_id)
+        else:
+            cursor.execute(
+                """INSERT INTO judge_queue (
+                    submission_id, priority, status, enqueue_time, force
+                ) VALUES (?, ?, ?, ?, ?)""",
+                (
+                    submission_id,
+                    priority,
+                    "queued",
+                    datetime.now().isoformat(),
+                    int(force),
+                )
+            )
+            position = get_position(cursor, cursor.lastrowid)
+        cursor.execute("COMMIT")
+    finally:
+        conn.close()
+
+    return position
+
+def get_position(cursor: sqlite3.Cursor, job_id: int) -> int:
+    """
+    Count queued jobs judged before the job, the job included.
+    """
+    cursor.execute(
+        """SELECT COUNT(*) FROM judge_queue AS other, judge_queue AS job
+        WHERE job.id = ? AND other.status = 'queued' AND (
+            other.priority > job.priority
+            OR (other.priority = job.priority AND other.id <= job.id)
+        )""",
+        (job_id, )
+    )
+    return cursor.fetchone()[0]
+
+def claim_sync() -> tuple | None:
+    """
+    Take the next queued job and mark it running. Jobs of submissions
+    still being judged wait for them.
+
+    Returns:
+        A tuple containing job id, submission id, problem id, code,
+        language and whether the job is forced, or None if the queue is
+        empty.
+    """
+    conn = sqlite3.connect('./app/oj_system.db', isolation_level=None)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute(
+            """SELECT judge_queue.id, submissions.id, submissions.problem_id,
+                submissions.code, submissions.language, judge_queue.force
+            FROM judge_queue JOIN submissions
+            ON submissions.id = judge_queue.submission_id
+            WHERE judge_queue.status = 'queued' AND NOT EXISTS (
+                SELECT 1 FROM judge_queue AS other
+                WHERE other.submission_id = judge_queue.submission_id
+                AND other.status IN ('running', 'cancelling')
+            ) AND (
+                judge_queue.priority >= ?
+                OR (SELECT COUNT(*) FROM judge_queue
+                    WHERE status = 'running' AND priority < ?) < ?
+            )
+            ORDER BY judge_queue.priority DESC, judge_queue.id
+            LIMIT 1""",
+            (PRIORITY_LIVE, PRIORITY_LIVE, judge_config.REJUDGE_CONCURRENCY)
+        )
+        row = cursor.fetchone()
+        if row:
+            cursor.execute(
+                "UPDATE judge_queue SET status = ?, worker = ? WHERE id = ?",
+                ("running", os.getpid(), row[0])
+            )
+        cursor.execute("COMMIT")
+    finally:
+        conn.close()
+
+    return row
+
+def finish_sync(job_id: int, failed: bool = False):
+    """
+    Remove a judged job, failed jobs are kept so that they are not retried,
+    their submissions are left unknown by the judge, see
+    code_judge.fail_submission_sync.
+    """
+    with sqlite3.connect('./app/oj_system.db') as conn:
+        cursor = conn.cursor()
+        if failed:
+            cursor.execute(
+                "UPDATE judge_queue SET status = ? WHERE id = ?",
+                ("failed", job_id)
+            )
+        else:
+            cursor.execute("DELETE FROM judge_queue WHERE id = ?", (job_id, ))
+        conn.commit()
+
+async def create_batch(submission_ids: list, filters: dict, force: bool = False) -> tuple:
+    """
+    Queue a rejudge batch of submissions at PRIORITY_REJUDGE. Submissions
+    which already have a job are left to it.
+
+    Args:
+        submission_ids (list): ids of the submissions.
+        filters (dict): filters the submissions were selected with.
+        force (bool): run the code even if results can be reused.
+
+    Returns:
+        A tuple containing the id of the batch and the number of submissions
+        queued by it.
+    """
+    loop = asyncio.get_event_loop()
+    batch = await loop.run_in_executor(
+        None,
+        create_batch_sync,
+        submission_ids,
+        filters,
+        force
+    )
+    if _wakeup is not None:
+        _wakeup.set()
+    return batch
+
+def create_batch_sync(submission_ids: list, filters: dict, force: bool = False) -> tuple:
+    now = datetime.now().isoformat()
+    conn = sqlite3.connect('./app/oj_system.db', isolation_level=None)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute(
+            """INSERT INTO rejudge_batches (
+                filters, total, cancelled, status, create_time
+            ) VALUES (?, ?, ?, ?, ?)""",
+            (json.dumps(filters), len(submission_ids), 0, "running", now)
+        )
+        batch_id = cursor.lastrowid
+        cursor.executemany(
+            """INSERT INTO judge_queue (
+                submission_id, priority, status, enqueue_time, force, batch_id
+            ) SELECT ?, ?, ?, ?, ?, ? WHERE NOT EXISTS (
+                SELECT 1 FROM judge_queue WHERE submission_id = ?
+                AND status IN ('queued', 'running', 'cancelling')
+            )""",
+            [
+                (
+                    submission_id, PRIORITY_REJUDGE, "queued", now, int(force),
+                    batch_id, submission_id
+                )
+                for submission_id in submission_ids
+            ]
+        )
+        queued = cursor.rowcount
+        cursor.execute(
+            "UPDATE rejudge_batches SET total = ? WHERE id = ?",
+            (queued, batch_id)
+        )
+        cursor.execute("COMMIT")
+    finally:
+        conn.close()
+
+    return batch_id, queued
+
+def batch_progress_sync(batch_id: int) -> dict | None:
+    """
+    Get the progress of a rejudge batch.
+
+    Returns:
+        dict: counts of its jobs, None if the batch does not exist.
+    """
+    with sqlite3.connect('./app/oj_system.db') as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """SELECT filters, total, cancelled, status, create_time
+            FROM rejudge_batches WHERE id = ?""",
+            (batch_id, )
+        )
+        row = cursor.fetchone()
+        if not row:
+            return None
+        cursor.execute(
+            """SELECT status, COUNT(*) FROM judge_queue
+            WHERE batch_id = ? GROUP BY status""",
+            (batch_id, )
+        )
+        counts = dict(cursor.fetchall())
+
+    filters, total, cancelled, status, create_time = row
+    queued = counts.get("queued", 0)
+    running = counts.get("running", 0) + counts.get("cancelling", 0)
+    failed = counts.get("failed", 0)
+    if status == "running" and queued + running == 0:
+        status = "finished"
+    return {
+        "batch_id": batch_id,
+        "filters": json.loads(filters),
+        "status": status,
+        "total": total,
+        "done": total - cancelled - queued - running - failed,
+        "queued": queued,
+        "running": running,
+        "failed": failed,
+        "cancelled": cancelled,
+        "create_time": create_time,
+    }
+
+def cancel_batch_sync(batch_id: int) -> dict | None:
+    """
+    Cancel a rejudge batch, removing its queued jobs. Jobs already running
+    are finished.
+
+    Returns:
+        dict: progress of the batch, None if the batch does not exist.
+    """
+    with sqlite3.connect('./app/oj_system.db') as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "DELETE FROM judge_queue WHERE batch_id = ? AND status = 'queued'",
+            (batch_id, )
+        )
+        cursor.execute(
+            """UPDATE rejudge_batches SET status = 'cancelled',
+            cancelled = cancelled + ? WHERE id = ?""",
+            (cursor.rowcount, batch_id)
+        )
+        conn.commit()
+
+    return batch_progress_sync(batch_id)
+
+def cancel_sync(submission_id: int) -> str | None:
+    """
+    Cancel the jobs of a submission. A queued job is removed at once, a
+    running one is marked 'cancelling' for the worker judging it, which
+    kills its sandbox, see `watch_cancelled`.
+
+    Returns:
+        str: "cancelled" if no job was running, "cancelling" otherwise, None
+        if the submission has no job.
+    """
+    conn = sqlite3.connect('./app/oj_system.db', isolation_level=None)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute(
+            """SELECT id, status FROM judge_queue WHERE submission_id = ?
+            AND status IN ('queued', 'running', 'cancelling')""",
+            (submission_id, )
+        )
+        rows = cursor.fetchall()
+        status = None
+        for job_id, job_status in rows:
+            if job_status == "queued":
+                remove_cancelled(cursor, job_id)
+                status = status or "cancelled"
+            else:
+                cursor.execute(
+                    "UPDATE judge_queue SET status = 'cancelling' WHERE id = ?",
+                    (job_id, )
+                )
+                status = "cancelling"
+        cursor.execute("COMMIT")
+    finally:
+        conn.close()
+
+    return status
+
+def remove_cancelled(cursor: sqlite3.Cursor, job_id: int):
+    """
+    Remove a cancelled job, counting it in its rejudge batch. Submissions
+    never judged become 'cancelled', the others keep their last result.
+    """
+    cursor.execute(
+        "SELECT submission_id, batch_id FROM judge_queue WHERE id = ?",
+        (job_id, )
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return
+    submission_id, batch_id = row
+    cursor.execute("DELETE FROM judge_queue WHERE id = ?", (job_id, ))
+    cursor.execute(
+        "UPDATE submissions SET status = 'cancelled' WHERE id = ? AND status = 'pending'",
+        (submission_id, )
+    )
+    if batch_id is not None:
+        cursor.execute(
+            "UPDATE rejudge_batches SET cancelled = cancelled + 1 WHERE id = ?",
+            (batch_id, )
+        )
+
+def finish_cancelled_sync(job_id: int):
+    """
+    Remove a job whose judging was stopped after it was cancelled.
+    """
+    with sqlite3.connect('./app/oj_system.db') as conn:
+        cursor = conn.cursor()
+        remove_cancelled(cursor, job_id)
+        conn.commit()
+
+def cancelled_jobs_sync() -> list:
+    """
+    Get jobs of this process marked 'cancelling'.
+
+    Returns:
+        list: ids of the jobs.
+    """
+    with sqlite3.connect('./app/oj_system.db') as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """SELECT id FROM judge_queue
+            WHERE status = 'cancelling' AND worker = ?""",
+            (os.getpid(), )
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+async def watch_cancelled():
+    """
+    Stop judging cancelled jobs of this process. Their tasks are cancelled,
+    and their sandboxes are killed once released by the judge.
+    """
+    loop = asyncio.get_event_loop()
+    while True:
+        await asyncio.sleep(judge_config.QUEUE_POLL_INTERVAL)
+        try:
+            jobs = await loop.run_in_executor(None, cancelled_jobs_sync)
+        except sqlite3.Error:
+            continue
+        for job_id in jobs:
+            task = running_tasks.get(job_id)
+            if task is not None and job_id not in _cancelled:
+                _cancelled.add(job_id)
+                task.cancel()
+
+async def recover():
+    """
+    Queue again the jobs of workers which are gone and pending submissions
+    which have never been queued.
+    """
+    loop = asyncio.get_event_loop()
+    await loop.run_in_executor(None, recover_sync)
+
+def recover_sync():
+    with sqlite3.connect('./app/oj_system.db') as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT id, worker FROM judge_queue WHERE status = 'running'"
+        )
+        for job_id, worker in cursor.fetchall():
+            if worker is not None and worker != os.getpid() \
+                and process_alive(worker):
+                continue
+            cursor.execute(
+                "UPDATE judge_queue SET status = 'queued' WHERE id = ?",
+                (job_id, )
+            )
+        
+        # Cancelled jobs of workers which are gone are not judged again
+        cursor.execute(
+            "SELECT id, worker FROM judge_queue WHERE status = 'cancelling'"
+        )
+        for job_id, worker in cursor.fetchall():
+            if worker is not None and worker != os.getpid() \
+                and process_alive(worker):
+                continue
+            remove_cancelled(cursor, job_id)
+        
+        cursor.execute(
+            """INSERT INTO judge_queue (
+                submission_id, priority, status, enqueue_time
+            ) SELECT id, ?, ?, ? FROM submissions
+            WHERE status = 'pending'
+            AND id NOT IN (SELECT submission_id FROM judge_queue)""",
+            (PRIORITY_LIVE, "queued", datetime.now().isoformat())
+        )
+        conn.commit()
+
+async def run_scheduler(concurrency: int = judge_config.JUDGE_CONCURRENCY):
+    """
+    Judge queued submissions, at most `concurrency` at the same time. Once
+    cancelled, it returns after its judges are stopped.
+
+    Args:
+        concurrency (int): number of submissions judged at the same time.
+    """
+    global _wakeup
+    _wakeup = asyncio.Event()
+
+    loop = asyncio.get_event_loop()
+    slots = asyncio.Semaphore(concurrency)
+    tasks: set = set()
+    watcher = asyncio.create_task(watch_cancelled())
+    try:
+        while True:
+            await slots.acquire()
+            _wakeup.clear()
+            try:
+                job = await loop.run_in_executor(None, claim_sync)
+            except sqlite3.Error:
+                # Tables may be rebuilt by a reset
+                logger.exception("Failed to read the judge queue")
+                job = None
+
+            if job is None:
+                slots.release()
+                try:
+                    await asyncio.wait_for(
+                        _wakeup.wait(),
+                        judge_config.QUEUE_POLL_INTERVAL
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            task = asyncio.create_task(judge_job(job, slots))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    finally:
+        _wakeup = None
+        watcher.cancel()
+        for task in tasks:
+            task.cancel()
+        
+        # Judges release their sandboxes before the pools are closed
+        await asyncio.gather(watcher, *tasks, return_exceptions=True)
+
+async def judge_job(job: tuple, slots: asyncio.Semaphore):
+    """
+    Judge a claimed job and remove it from the queue.
+    """
+    job_id, submission_id, problem_id, code, language, force = job
+    loop = asyncio.get_event_loop()
+    running_tasks[job_id] = asyncio.current_task()
+    try:
+        await judge_in_docker(submission_id, problem_id, code, language, bool(force))
+    except asyncio.CancelledError:
+        if job_id not in _cancelled:
+            # Left running, it is queued again once this worker is gone
+            raise
+        await loop.run_in_executor(None, finish_cancelled_sync, job_id)
+    except Exception:
+        logger.exception("Failed to judge submission %s", submission_id)
+        await loop.run_in_executor(None, finish_sync, job_id, True)
+        await loop.run_in_executor(
+            None, fail_submission_sync, submission_id, problem_id
+        )
+    else:
+        await loop.run_in_executor(None, finish_sync, job_id)
+    finally:
+        running_tasks.pop(job_id, None)
+        _cancelled.discard(job_id)
+        slots.release()
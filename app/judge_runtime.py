@@ -0,0 +1,207 @@
+"""
+Runtime of the judge, built once per process.
+
+It holds what every run needs and should not rebuild: the Docker client
+with its connection pool, the seccomp profile serialized for
+`security_opt`, the container arguments of each pool and the pools
+themselves. The runtime is rebuilt only when the settings it was built from
+change, see `config_fingerprint`, and the pools of the old runtime are then
+closed. Languages come from app/language_registry.py, so registering one
+rebuilds the runtime too.
+
+With the local and fake backends (OJ_SANDBOX_BACKEND) the pools hold local
+or fake sandboxes instead, and neither Docker nor the profile is used.
+"""
+import docker
+import json
+import logging
+import os
+import threading
+from app import container_pool
+from app import fake_sandbox
+from app import judge_config
+from app import language_registry
+from app import local_sandbox
+
+logger = logging.getLogger(__name__)
+
+SECCOMP_PROFILE = './app/default_seccomp.json'
+
+def config_fingerprint() -> tuple:
+    """
+    Settings the runtime is built from, compared on each use of the runtime.
+    It reads the database, so the judge calls it out of the event loop.
+    """
+    try:
+        seccomp_mtime = os.stat(SECCOMP_PROFILE).st_mtime_ns
+    except OSError:
+        seccomp_mtime = None
+    return (
+        judge_config.SANDBOX_BACKEND,
+        seccomp_mtime,
+        # Languages are reloaded only once their version changes
+        language_registry.current_version(),
+        judge_config.POOL_SIZE,
+        judge_config.POOL_MAX_USES,
+        judge_config.COMPILE_MEMORY_LIMIT,
+        judge_config.CCACHE_VOLUME,
+        judge_config.CCACHE_SIZE,
+        judge_config.TESTCASE_DIR,
+    )
+
+def load_seccomp() -> str:
+    """
+    Read the seccomp profile, serialized for `security_opt`.
+    """
+    with open(os.path.abspath(SECCOMP_PROFILE), 'r') as f:
+        return json.dumps(json.load(f), separators=(',', ':'))
+
+class JudgeRuntime:
+    """
+    Shared state of the judge in a process.
+
+    Attributes:
+        fingerprint (tuple): settings the runtime was built from.
+        client (docker.DockerClient): client shared by all pools, created on
+            first use.
+        backend (str): sandbox backend of the pools.
+        languages (dict): languages of the registry, by name.
+        seccomp (str): serialized seccomp profile.
+        templates (dict): container arguments of each pool, by pool name.
+        pools (dict): pools created so far, by pool name.
+    """
+    def __init__(self, client: docker.DockerClient | None = None):
+        self.fingerprint = config_fingerprint()
+        self.client = client
+        self.backend = judge_config.SANDBOX_BACKEND
+        self.languages = language_registry.all_languages()
+        self.seccomp = load_seccomp() if self.backend == "docker" else ""
+
+        self.templates: dict[str, dict] = {}
+        if self.backend == "docker":
+            for name, language in self.languages.items():
+                self.templates[name] = container_pool.sandbox_args(self.seccomp)
+                if language.compiled:
+                    self.templates[f"{name}:compiler"] = \
+                        container_pool.compiler_args(
+                            self.seccomp,
+                            ccache=name in language_registry.BUILTIN_LANGUAGES
+                        )
+
+        self.pools: dict[str, container_pool.ContainerPool] = {}
+        self._lock = threading.Lock()
+
+    def get_pool(self, language: str, compiler: bool = False) -> container_pool.ContainerPool:
+        """
+        Get the pool of a language, creating it on first use.
+
+        Args:
+            language (str): language of the code.
+            compiler (bool): get the pool of compiler containers instead.
+        """
+        name = f"{language}:compiler" if compiler else language
+        with self._lock:
+            if name not in self.pools:
+                self.pools[name] = self._make_pool(language, name, compiler)
+            return self.pools[name]
+
+    def _make_pool(self, language: str, name: str, compiler: bool) -> container_pool.ContainerPool:
+        if self.backend == "fake":
+            return fake_sandbox.FakePool(
+                name, judge_config.POOL_SIZE, judge_config.POOL_MAX_USES
+            )
+        if self.backend == "local":
+            # Like the memory limits of the containers, until the judge sets them
+            return local_sandbox.LocalPool(
+                name,
+                judge_config.COMPILE_MEMORY_LIMIT if compiler else 128,
+                judge_config.POOL_SIZE,
+                judge_config.POOL_MAX_USES
+            )
+
+        if self.client is None:
+            # Exec calls of all run threads keep their connections, next to
+            # the calls of pools starting containers
+            self.client = docker.from_env(
+                max_pool_size=judge_config.RUN_THREADS + judge_config.POOL_SIZE
+            )
+            # Containers of a crashed judge are never released
+            container_pool.reap_orphans(self.client)
+        return container_pool.ContainerPool(
+            self.client,
+            self.languages[language].image,
+            self.templates[name],
+            judge_config.POOL_SIZE,
+            judge_config.POOL_MAX_USES
+        )
+
+    def warm(self):
+        """
+        Pre-start containers of all languages.
+        """
+        for name, language in self.languages.items():
+            for compiler in ((False, True) if language.compiled else (False, )):
+                try:
+                    self.get_pool(name, compiler).warm()
+                except Exception:
+                    # Images of registered languages may be missing
+                    logger.exception("Failed to warm sandbox pool of %s", name)
+
+    def close(self):
+        """
+        Close all pools, containers still leased are removed once released.
+        """
+        with self._lock:
+            pools = list(self.pools.values())
+            self.pools.clear()
+        for pool in pools:
+            pool.close()
+
+_runtime: JudgeRuntime | None = None
+_runtime_lock = threading.Lock()
+
+def get_runtime() -> JudgeRuntime:
+    """
+    Get the runtime of the process, rebuilding it if the settings changed.
+    """
+    global _runtime
+
+    fingerprint = config_fingerprint()
+    with _runtime_lock:
+        if _runtime is not None and _runtime.fingerprint == fingerprint:
+            return _runtime
+        old = _runtime
+        _runtime = JudgeRuntime(old.client if old is not None else None)
+        runtime = _runtime
+
+    if old is not None:
+        logger.info("Judge settings changed, rebuilding the judge runtime")
+        old.close()
+    return runtime
+
+def get_pool(language: str, compiler: bool = False) -> container_pool.ContainerPool:
+    """
+    Get the pool of a language from the runtime, see JudgeRuntime.get_pool.
+    """
+    return get_runtime().get_pool(language, compiler)
+
+def warm_pools():
+    """
+    Pre-start containers of all languages.
+    """
+    try:
+        get_runtime().warm()
+    except Exception:
+        logger.exception("Failed to warm sandbox pools")
+
+def close_pools():
+    """
+    Remove idle containers of all pools.
+    """
+    global _runtime
+
+    with _runtime_lock:
+        runtime = _runtime
+        _runtime = None
+    if runtime is not None:
+        runtime.close()
@@ -0,0 +1,117 @@
+"""
+Judge worker process.
+
+Workers take jobs from the judge queue in the database, so the API only
+enqueues submissions and reads results. The app starts OJ_JUDGE_WORKERS of
+them, more can be started on the same host with:
+
+    python -m app.judge_worker [--concurrency N]
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from app import judge_config
+from app.judge_runtime import warm_pools, close_pools
+from app.judge_queue import recover, run_scheduler
+
+logger = logging.getLogger(__name__)
+
+async def serve(concurrency: int):
+    """
+    Judge queued submissions until the worker is terminated.
+
+    Args:
+        concurrency (int): number of submissions judged at the same time.
+    """
+    loop = asyncio.get_event_loop()
+    task = asyncio.current_task()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, task.cancel)
+
+    threading.Thread(target=warm_pools, daemon=True).start()
+    try:
+        await recover()
+        await run_scheduler(concurrency)
+    except asyncio.CancelledError:
+        pass
+    finally:
+        close_pools()
+
+def watch_parent(parent_pid: int):
+    """
+    Terminate the worker once the app which started it is gone.
+    """
+    while os.getppid() == parent_pid:
+        time.sleep(1)
+    os.kill(os.getpid(), signal.SIGTERM)
+
+def run_worker(concurrency: int, parent_pid: int | None = None):
+    """
+    Entry of a worker process.
+
+    Args:
+        concurrency (int): number of submissions judged at the same time.
+        parent_pid (int, optional): pid of the app which started the worker.
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(processName)s %(levelname)s %(message)s"
+    )
+    if parent_pid is not None:
+        threading.Thread(target=watch_parent, args=(parent_pid, ), daemon=True).start()
+    asyncio.run(serve(concurrency))
+
+def start_workers(count: int, concurrency: int) -> list:
+    """
+    Start judge worker processes.
+
+    Args:
+        count (int): number of processes.
+        concurrency (int): number of submissions judged by each process.
+
+    Returns:
+        list: the started processes.
+    """
+    context = multiprocessing.get_context("spawn")
+    workers = []
+    for i in range(count):
+        worker = context.Process(
+            target=run_worker,
+            args=(concurrency, os.getpid()),
+            name=f"judge-worker-{i}",
+            daemon=True
+        )
+        worker.start()
+        workers.append(worker)
+    return workers
+
+def stop_workers(workers: list, timeout: float = 5.0):
+    """
+    Terminate judge worker processes.
+    """
+    for worker in workers:
+        worker.terminate()
+    deadline = time.monotonic() + timeout
+    for worker in workers:
+        worker.join(max(0.0, deadline - time.monotonic()))
+        if worker.is_alive():
+            worker.kill()
+
+def main():
+    parser = argparse.ArgumentParser(description="Judge worker of the OJ system")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=judge_config.JUDGE_CONCURRENCY,
+        help="number of submissions judged at the same time"
+    )
+    args = parser.parse_args()
+    run_worker(args.concurrency)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Registry of the languages the judge runs.
+
+Python and C++ are built in. Rows of the `languages` table add languages,
+never replacing the built-in ones, so that a new runtime is a data change: a
+language is a source file `main<file_ext>`, an optional `compile_cmd`
+building the file `main` from it, a `run_cmd`, the image of its sandbox and
+multipliers of the limits of problems.
+
+The registry is kept in memory and reloaded once the `languages` version in
+`config_versions` changes, which `invalidate` bumps on every change of the
+table, so that all processes of the judge see it.
+"""
+import shlex
+import sqlite3
+import threading
+from dataclasses import dataclass
+from app import judge_config
+
+# Flags have to match the precompiled <bits/stdc++.h> of the image,
+# -fpch-preprocess lets ccache cache compilations using it
+CPP_COMPILE_CMD = "g++ -o main main.cpp -std=c++17 -fpch-preprocess"
+
+@dataclass(frozen=True)
+class Language:
+    """
+    A language of submissions.
+
+    Attributes:
+        name (str): name of the language, as submitted.
+        file_ext (str): extension of the source file, with its dot.
+        compile_cmd (str): shell command building `main` from the source,
+            empty for interpreted languages.
+        run_cmd (str): command running the program.
+        image (str): image of its sandbox and compiler containers.
+        time_factor (float): multiplier of the time limit of problems.
+        memory_factor (float): multiplier of the memory limit of problems.
+    """
+    name: str
+    file_ext: str
+    compile_cmd: str
+    run_cmd: str
+    image: str
+    time_factor: float = 1.0
+    memory_factor: float = 1.0
+
+    @property
+    def source(self) -> str:
+        """
+        File name of the source.
+        """
+        return f"main{self.file_ext}"
+
+    @property
+    def compiled(self) -> bool:
+        return bool(self.compile_cmd)
+
+    def run_args(self) -> list:
+        """
+        Command running the program, as a list of arguments.
+        """
+        return shlex.split(self.run_cmd)
+
+BUILTIN_LANGUAGES: dict[str, Language] = {
+    "python": Language(
+        "python", ".py", "", "python3 main.py", judge_config.IMAGES["python"]
+    ),
+    "cpp": Language(
+        "cpp", ".cpp", CPP_COMPILE_CMD, "./main", judge_config.IMAGES["cpp"]
+    ),
+}
+
+_languages: dict[str, Language] | None = None
+_version: int | None = None
+_lock = threading.Lock()
+
+def read_version(cursor: sqlite3.Cursor) -> int:
+    """
+    Version of the `languages` table, 0 before its first change.
+    """
+    try:
+        cursor.execute(
+            "SELECT version FROM config_versions WHERE name = 'languages'"
+        )
+    except sqlite3.OperationalError:
+        # Not created yet
+        return 0
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+def invalidate(cursor: sqlite3.Cursor):
+    """
+    Bump the version of the `languages` table after changing it, in the
+    transaction of the change.
+    """
+    global _languages
+
+    cursor.execute(
+        """INSERT INTO config_versions (name, version) VALUES ('languages', 1)
+        ON CONFLICT(name) DO UPDATE SET version = version + 1"""
+    )
+    with _lock:
+        _languages = None
+
+def load(cursor: sqlite3.Cursor) -> dict[str, Language]:
+    """
+    Read all languages, the built-in ones and rows of the table.
+    """
+    languages = dict(BUILTIN_LANGUAGES)
+    try:
+        cursor.execute(
+            """SELECT name, file_ext, compile_cmd, run_cmd, image,
+            time_factor, memory_factor FROM languages"""
+        )
+        rows = cursor.fetchall()
+    except sqlite3.OperationalError:
+        rows = []
+
+    for name, file_ext, compile_cmd, run_cmd, image, time_factor, memory_factor in rows:
+        if name in BUILTIN_LANGUAGES:
+            # Rows written before built-in languages were refused
+            continue
+        languages[name] = Language(
+            name,
+            file_ext,
+            compile_cmd or "",
+            run_cmd,
+            image,
+            time_factor or 1.0,
+            memory_factor or 1.0
+        )
+    return languages
+
+def current_version() -> int:
+    """
+    Version of the `languages` table, see `invalidate`.
+    """
+    with sqlite3.connect('./app/oj_system.db') as conn:
+        return read_version(conn.cursor())
+
+def all_languages() -> dict[str, Language]:
+    """
+    Get all languages by name, reloading them if the table changed.
+    """
+    global _languages, _version
+
+    with sqlite3.connect('./app/oj_system.db') as conn:
+        cursor = conn.cursor()
+        version = read_version(cursor)
+        with _lock:
+            if _languages is not None and _version == version:
+                return _languages
+        languages = load(cursor)
+
+    with _lock:
+        _languages = languages
+        _version = version
+    return languages
+
+def get_language(name: str) -> Language | None:
+    """
+    Get a language, None if it is not registered.
+    """
+    return all_languages().get(name)
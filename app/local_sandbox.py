@@ -0,0 +1,371 @@
+"""
+Local sandbox backend, running submissions as confined processes of the host.
+
+A run costs a fork and an exec instead of a Docker exec call, so this is the
+backend for high-volume practice traffic and for hosts without a Docker
+daemon. Each command runs in the working directory of its sandbox with:
+
+    rlimits     address space (the memory limit of the sandbox), file size
+                and, under the sandbox user, number of processes.
+    namespaces  new PID, network, IPC and UTS namespaces where the kernel
+                allows them, inside a new user namespace when the judge is
+                not root. The command is the first process of its PID
+                namespace, so that nothing it starts can signal processes
+                outside of it.
+    user        a user of the LOCAL_SANDBOX_UID range taken by this sandbox
+                only, owning its 0700 working directory, so that sandboxes
+                can neither signal each other nor touch each other's files.
+                The judge has to run as root and the test inputs have to be
+                reachable by these users. Expected outputs stay readable by
+                the judge only.
+    seccomp     a deny list of syscalls, with the libseccomp bindings or
+                pyseccomp.
+
+A pool refuses to start when submissions would run as the user of the judge
+or without seccomp, unless LOCAL_SANDBOX_INSECURE is set.
+
+The isolation is weaker than a container: the file system of the host is
+visible with the permissions of the sandbox user, CPU time is enforced by
+the runner only, and allocations over the memory limit fail instead of
+being killed, so they usually end as RE rather than MLE. The tools of the
+judge images (python3, g++) are those of the host.
+"""
+import ctypes
+import errno
+import fcntl
+import logging
+import os
+import resource
+import shutil
+import signal
+import subprocess
+import tempfile
+import uuid
+from collections.abc import Callable
+from app import container_pool
+from app import judge_config
+from app import testcase_store
+
+try:
+    import seccomp
+except ImportError:
+    try:
+        import pyseccomp as seccomp
+    except ImportError:
+        seccomp = None
+
+logger = logging.getLogger(__name__)
+
+# Flags of unshare(2).
+CLONE_NEWUTS = 0x04000000
+CLONE_NEWIPC = 0x08000000
+CLONE_NEWUSER = 0x10000000
+CLONE_NEWPID = 0x20000000
+CLONE_NEWNET = 0x40000000
+
+# Bytes a file written in the sandbox may reach, outputs of cases are
+# limited further by the runner.
+FILE_SIZE_LIMIT = 1 << 30
+
+# Processes of the user of a sandbox.
+PROCESS_LIMIT = 1024
+
+# Syscalls denied by the seccomp filter.
+DENIED_SYSCALLS = [
+    "ptrace", "process_vm_readv", "process_vm_writev", "mount", "umount2",
+    "pivot_root", "chroot", "unshare", "setns", "bpf", "perf_event_open",
+    "userfaultfd", "keyctl", "add_key", "request_key", "init_module",
+    "finit_module", "delete_module", "kexec_load", "reboot", "swapon",
+    "swapoff", "socket", "socketpair",
+]
+
+# Environment variable marking processes of a sandbox, so that kill() finds
+# the ones which left its process groups.
+MARKER = "OJ_SANDBOX_ID"
+
+_libc = ctypes.CDLL(None, use_errno=True)
+
+def insecure_reasons() -> list:
+    """
+    Reasons why submissions of the local backend would not be confined.
+
+    Returns:
+        list: messages, empty when they are.
+    """
+    reasons = []
+    if os.geteuid() != 0:
+        reasons.append("the judge is not root, submissions run as its user")
+    elif judge_config.LOCAL_SANDBOX_UID == 0:
+        reasons.append("LOCAL_SANDBOX_UID is 0, submissions run as root")
+    if seccomp is None:
+        reasons.append("neither seccomp nor pyseccomp is installed")
+    return reasons
+
+def unshare_namespaces() -> bool:
+    """
+    Enter new PID, network, IPC and UTS namespaces if the kernel allows it.
+
+    Returns:
+        bool: whether children of the process start a new PID namespace.
+    """
+    flags = CLONE_NEWNET | CLONE_NEWIPC | CLONE_NEWUTS
+    if os.geteuid() == 0:
+        if _libc.unshare(flags | CLONE_NEWPID) == 0:
+            return True
+        _libc.unshare(flags)
+        return False
+
+    # Without root, a user namespace mapping the user to itself owns them
+    uid = os.geteuid()
+    gid = os.getegid()
+    if _libc.unshare(CLONE_NEWUSER | CLONE_NEWPID | flags) != 0:
+        return False
+    try:
+        with open("/proc/self/setgroups", "w") as f:
+            f.write("deny")
+        with open("/proc/self/uid_map", "w") as f:
+            f.write(f"{uid} {uid} 1")
+        with open("/proc/self/gid_map", "w") as f:
+            f.write(f"{gid} {gid} 1")
+    except OSError:
+        pass
+    return True
+
+def enter_pid_namespace():
+    """
+    Fork the first process of the new PID namespace, which goes on to exec
+    the command, and wait for it outside of the namespace, exiting like it.
+    Once the first process exits, the kernel kills the rest of the
+    namespace.
+    """
+    pid = os.fork()
+    if pid == 0:
+        return
+
+    # Only the command keeps the pipes of the caller open
+    os.closerange(3, resource.getrlimit(resource.RLIMIT_NOFILE)[0])
+    for fd in (0, 1, 2):
+        os.close(fd)
+    _, status = os.waitpid(pid, 0)
+    if os.WIFSIGNALED(status):
+        number = os.WTERMSIG(status)
+        resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+        if number not in (signal.SIGKILL, signal.SIGSTOP):
+            signal.signal(number, signal.SIG_DFL)
+        os.kill(os.getpid(), number)
+    os._exit(os.waitstatus_to_exitcode(status))
+
+def allocate_uid() -> tuple:
+    """
+    Take a user of the LOCAL_SANDBOX_UID range which no other sandbox of the
+    host runs as, by locking its file under SANDBOX_DIR for as long as the
+    sandbox lives. Locks of a judge which is gone are released by the
+    kernel.
+
+    Returns:
+        A tuple containing the uid and the descriptor holding its lock.
+
+    Raises:
+        RuntimeError: every user of the range is taken.
+    """
+    directory = os.path.join(os.path.abspath(judge_config.SANDBOX_DIR), "uids")
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    first = judge_config.LOCAL_SANDBOX_UID
+    for uid in range(first, first + judge_config.LOCAL_SANDBOX_UIDS):
+        fd = os.open(
+            os.path.join(directory, str(uid)),
+            os.O_RDWR | os.O_CREAT | os.O_CLOEXEC,
+            0o600
+        )
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            continue
+        return uid, fd
+    raise RuntimeError("every user of LOCAL_SANDBOX_UIDS runs a sandbox")
+
+def load_seccomp():
+    """
+    Deny syscalls of DENIED_SYSCALLS to the process and its children.
+    """
+    if seccomp is None:
+        return
+    syscall_filter = seccomp.SyscallFilter(defaction=seccomp.ALLOW)
+    for name in DENIED_SYSCALLS:
+        try:
+            syscall_filter.add_rule(seccomp.ERRNO(errno.EPERM), name)
+        except (RuntimeError, ValueError):
+            # Not a syscall of this architecture
+            continue
+    syscall_filter.load()
+
+class LocalSandbox(container_pool.Sandbox):
+    """
+    A working directory on the host where commands run confined.
+
+    Attributes:
+        sandbox_id (str): value of MARKER in the environment of its processes.
+        memory_limit (int): address space limit of each process in MB.
+        uid (int | None): user its processes run as, None keeps the user of
+            the judge.
+    """
+    RUNNER: list = ["python3", os.path.abspath("./app/sandbox_runner.py")]
+
+    def __init__(
+        self,
+        workdir: str,
+        memory_limit: int,
+        uid: int | None = None,
+        uid_lock: int | None = None
+    ):
+        super().__init__(workdir)
+        self.sandbox_id = uuid.uuid4().hex
+        self.memory_limit = memory_limit
+        self.uid = uid
+        self._uid_lock = uid_lock
+        self._groups: set[int] = set()
+
+    def input_path(self, digest: str) -> str:
+        return os.path.abspath(testcase_store.file_path("input", digest))
+
+    def set_limits(self, memory_limit: int, cpu_quota: int):
+        """
+        Update the address space limit, CPU time is left to the runner.
+        """
+        self.memory_limit = memory_limit
+
+    def _confine(self):
+        # Runs in the child between fork and exec
+        os.setsid()
+        if unshare_namespaces():
+            enter_pid_namespace()
+        if self.uid is not None:
+            os.setgroups([])
+            os.setgid(self.uid)
+            os.setuid(self.uid)
+            os.umask(0o022)
+            resource.setrlimit(resource.RLIMIT_NPROC, (PROCESS_LIMIT, PROCESS_LIMIT))
+        memory = self.memory_limit * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+        resource.setrlimit(resource.RLIMIT_FSIZE, (FILE_SIZE_LIMIT, FILE_SIZE_LIMIT))
+        resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+        load_seccomp()
+
+    def _popen(self, cmd: list, stdout, stderr) -> subprocess.Popen:
+        process = subprocess.Popen(
+            cmd,
+            cwd=self.workdir,
+            stdin=subprocess.DEVNULL,
+            stdout=stdout,
+            stderr=stderr,
+            env={
+                "PATH": "/usr/local/bin:/usr/bin:/bin",
+                "LANG": "C.UTF-8",
+                MARKER: self.sandbox_id,
+            },
+            preexec_fn=self._confine,
+            close_fds=True
+        )
+        # The child leads its own session and process group
+        self._groups.add(process.pid)
+        return process
+
+    def exec_run(self, cmd: list) -> tuple:
+        try:
+            process = self._popen(cmd, subprocess.PIPE, subprocess.PIPE)
+        except OSError as e:
+            return None, b"", str(e).encode()
+        try:
+            stdout, stderr = process.communicate()
+        finally:
+            self._groups.discard(process.pid)
+        return process.returncode, stdout, stderr
+
+    def exec_stream(self, cmd: list, on_stdout: Callable[[bytes], None]) -> tuple:
+        with tempfile.TemporaryFile() as error:
+            try:
+                process = self._popen(cmd, subprocess.PIPE, error)
+            except OSError as e:
+                return None, str(e).encode()
+            try:
+                while True:
+                    data = os.read(process.stdout.fileno(), 1 << 16)
+                    if not data:
+                        break
+                    on_stdout(data)
+                process.stdout.close()
+                exit_code = process.wait()
+            finally:
+                self._groups.discard(process.pid)
+            error.seek(0)
+            return exit_code, error.read()
+
+    def kill(self):
+        """
+        Kill the process groups of running commands, and processes which
+        left them but still carry the marker of the sandbox.
+        """
+        for group in list(self._groups):
+            try:
+                os.killpg(group, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+
+        marker = f"{MARKER}={self.sandbox_id}".encode()
+        for name in os.listdir("/proc"):
+            if not name.isdigit():
+                continue
+            try:
+                with open(f"/proc/{name}/environ", "rb") as f:
+                    if marker not in f.read().split(b"\0"):
+                        continue
+                os.kill(int(name), signal.SIGKILL)
+            except (OSError, ValueError):
+                continue
+
+    def remove(self):
+        """
+        Remove the working directory and give the user back.
+        """
+        super().remove()
+        if self._uid_lock is not None:
+            os.close(self._uid_lock)
+            self._uid_lock = None
+
+class LocalPool(container_pool.ContainerPool):
+    """
+    Pool of local sandboxes, leased like containers.
+    """
+    def __init__(self, name: str, memory_limit: int, size: int, max_uses: int):
+        """
+        Raises:
+            RuntimeError: submissions would not be confined, see
+                insecure_reasons(), and LOCAL_SANDBOX_INSECURE is not set.
+        """
+        reasons = insecure_reasons()
+        if reasons and not judge_config.LOCAL_SANDBOX_INSECURE:
+            raise RuntimeError(
+                "Refusing to start the local sandbox backend: " + "; ".join(reasons)
+            )
+        if reasons:
+            logger.warning(
+                "INSECURE local sandbox backend, submissions can read the "
+                "expected outputs: %s", "; ".join(reasons)
+            )
+        super().__init__(None, name, {}, size, max_uses)
+        self.memory_limit = memory_limit
+
+    def _start(self) -> LocalSandbox:
+        workdir = self._make_workdir()
+        if os.geteuid() != 0 or judge_config.LOCAL_SANDBOX_UID == 0:
+            return LocalSandbox(workdir, self.memory_limit)
+
+        try:
+            uid, uid_lock = allocate_uid()
+        except Exception:
+            shutil.rmtree(workdir, ignore_errors=True)
+            raise
+        os.chown(workdir, uid, uid)
+        os.chmod(workdir, 0o700)
+        return LocalSandbox(workdir, self.memory_limit, uid, uid_lock)
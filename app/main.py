@@ -10,14 +10,40 @@ from app.api.api_export import export_data
 from app.api.api_import import import_data
 from app.api.api_logs import logs
 from app.initialize_table import create_table
+from app.judge_runtime import warm_pools, close_pools
+from app.judge_queue import recover, run_scheduler
+from app.judge_worker import start_workers, stop_workers
+from app import judge_config
 from starlette.middleware.sessions import SessionMiddleware
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
+import threading
+import asyncio
 
 # Call the function before the app starts listening for requests
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await create_table()
-    yield
+    
+    # Queue again submissions left by the last run
+    await recover()
+    
+    if judge_config.INLINE_JUDGE:
+        # Start sandbox containers without delaying the startup
+        threading.Thread(target=warm_pools, daemon=True).start()
+        scheduler = asyncio.create_task(run_scheduler())
+        yield
+        scheduler.cancel()
+        with suppress(asyncio.CancelledError):
+            await scheduler
+        close_pools()
+    else:
+        # Judge in worker processes, the app only enqueues submissions
+        workers = start_workers(
+            judge_config.JUDGE_WORKERS,
+            judge_config.JUDGE_CONCURRENCY
+        )
+        yield
+        stop_workers(workers)
         
 app = FastAPI(
     title="Simple OJ System - Student Template",
@@ -1,6 +1,7 @@
 from dataclasses import dataclass, asdict, field
 import os
 import json
+from app import checkers
 
 save_dir = "./problems/"
 
@@ -27,6 +28,14 @@ class ProblemProfile:
             memory_limit(int): memory limit (e.g., "128MB").
             author(str): author of the problem.
             difficulty(str): difficulty level.
+            fail_fast(int): stop judging after this many failed test cases,
+                0 runs all of them.
+            checker(str): "exact" compares lines, "float" compares tokens
+                with numbers within eps, "special" runs checker_code.
+            eps(float): absolute or relative tolerance of the float checker.
+            checker_code(str): testlib-style C++ checker of the special mode,
+                run as `checker input output answer`.
+            output_limit(int): limit of the output of each test case in MB.
     """
     id: str
     title: str
@@ -44,6 +53,11 @@ class ProblemProfile:
     memory_limit: int = 128
     author: str = ''
     difficulty: str = ''
+    fail_fast: int = 0
+    checker: str = 'exact'
+    eps: float = 1e-6
+    checker_code: str = ''
+    output_limit: int = 64
     
     def to_dict(self):
         """Change ProblemProfile to dict"""
@@ -51,4 +65,31 @@ class ProblemProfile:
         data['samples'] = json.dumps(data['samples'], ensure_ascii=False)
         data['testcases'] = json.dumps(data['testcases'], ensure_ascii=False)
         data['tags'] = json.dumps(data['tags'], ensure_ascii=False)
-        return data
\ No newline at end of file
+        return data
+
+def valid_judge_settings(
+    fail_fast,
+    checker,
+    eps,
+    checker_code,
+    output_limit
+) -> bool:
+    """
+    Check the judging settings of a problem, see ProblemProfile, for both
+    POST /api/problems/ and imports.
+
+    Returns:
+        bool: True means the settings can be judged with.
+    """
+    if not isinstance(fail_fast, int) or isinstance(fail_fast, bool) or fail_fast < 0:
+        return False
+    if checker not in checkers.MODES:
+        return False
+    if not isinstance(eps, (int, float)) or isinstance(eps, bool) or eps < 0:
+        return False
+    if not isinstance(checker_code, str) or (checker == "special" and not checker_code):
+        return False
+    if not isinstance(output_limit, int) or isinstance(output_limit, bool) \
+            or output_limit <= 0:
+        return False
+    return True
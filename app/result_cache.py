@@ -0,0 +1,125 @@
+"""
+Results of judged code, reused by identical submissions.
+
+A result is keyed by the hash of the normalized code, the language and the
+version of the test set it was judged against, so that resubmitting the same
+code, or rejudging it while the tests are unchanged, takes the stored log
+instead of running it again. Jobs queued with `force` always run.
+
+Logs also keep a hash of each case, so that after test data changes only
+the cases whose hash changed run again, see `case_hashes`.
+
+Only complete logs are stored, a log with an unknown case is judged again.
+"""
+import hashlib
+import json
+import sqlite3
+from dataclasses import asdict
+from datetime import datetime
+from app.language_registry import Language
+
+def normalize_code(code: str) -> str:
+    """
+    Drop differences which never change a program, which are line endings
+    only: whitespace may be part of a string literal.
+    """
+    return code.replace("\r\n", "\n").replace("\r", "\n")
+
+def code_hash(code: str, language: Language) -> str:
+    """
+    Hash of the normalized code together with the definition of its language,
+    so that changing the commands or the image of a language judges its
+    code again.
+    """
+    data = json.dumps([normalize_code(code), asdict(language)], ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+def testset_version(requirements: tuple) -> str:
+    """
+    Version of the tests of a problem, the hash of everything judging
+    depends on: the manifest of test cases, the limits, the fail-fast policy
+    and the checker.
+
+    Args:
+        requirements (tuple): requirements of the problem, see
+            code_judge.get_requirements.
+    """
+    data = json.dumps(requirements, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+def case_hashes(requirements: tuple, language: Language) -> list:
+    """
+    Hash of each test case of a problem, covering the content of the case
+    and everything else its verdict depends on but the code: the limits,
+    the checker and the language. Logs keep them, so that a rejudge only
+    runs the cases whose hash changed.
+
+    Args:
+        requirements (tuple): requirements of the problem, see
+            code_judge.get_requirements.
+        language (Language): language of the code.
+    """
+    settings = json.dumps([requirements[1:], asdict(language)], ensure_ascii=False)
+    hashes = []
+    for item in requirements[0]:
+        data = json.dumps([item["input"], item["output"], settings])
+        hashes.append(hashlib.sha256(data.encode("utf-8")).hexdigest()[:16])
+    return hashes
+
+def reusable_cases(previous: list, hashes: list) -> dict:
+    """
+    Find cases whose verdict in a previous log of the same code still holds.
+
+    Only verdicts of cases which ran on their own are kept: runtime errors
+    may have been set on following cases, and skipped or unknown cases
+    never ran.
+
+    Args:
+        previous (list): previous log of the submission.
+        hashes (list): hash of each current case.
+
+    Returns:
+        dict: previous log entry of each reusable case, by index.
+    """
+    verdicts = {
+        item["hash"]: item for item in previous
+        if isinstance(item, dict) and "hash" in item
+        and item.get("result") in ("AC", "WA", "TLE", "MLE", "OLE")
+    }
+    return {i: verdicts[h] for i, h in enumerate(hashes) if h in verdicts}
+
+def lookup_sync(code_hash: str, language: str, testset: str) -> list | None:
+    """
+    Get the stored log of code, None if it was never judged on the tests.
+    """
+    with sqlite3.connect('./app/oj_system.db') as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """SELECT log FROM judge_results
+            WHERE code_hash = ? AND language = ? AND testset_version = ?""",
+            (code_hash, language, testset)
+        )
+        row = cursor.fetchone()
+    return json.loads(row[0]) if row else None
+
+def store_sync(code_hash: str, language: str, testset: str, log: list):
+    """
+    Store the log of judged code, unless some case of it is unknown.
+    """
+    if any(item["result"] == "UNK" for item in log):
+        return
+    with sqlite3.connect('./app/oj_system.db') as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """INSERT OR REPLACE INTO judge_results (
+                code_hash, language, testset_version, log, judge_time
+            ) VALUES (?, ?, ?, ?, ?)""",
+            (
+                code_hash,
+                language,
+                testset,
+                json.dumps(log),
+                datetime.now().isoformat(),
+            )
+        )
+        conn.commit()
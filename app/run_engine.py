@@ -0,0 +1,152 @@
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from app import judge_config
+from app.container_pool import Sandbox
+
+@dataclass
+class RunResult:
+    """
+    Result of one command run in a sandbox.
+
+    Attributes:
+        exit_code (int): exit code of the command, None if it was not started.
+        stdout (bytes): standard output.
+        stderr (bytes): standard error.
+        time (float): wall time in seconds.
+        timed_out (bool): whether the command was killed at the deadline.
+    """
+    exit_code: int | None = None
+    stdout: bytes = b""
+    stderr: bytes = b""
+    time: float = 0.0
+    timed_out: bool = False
+
+# Threads waiting for Docker exec calls, shared by all submissions.
+_executor = ThreadPoolExecutor(
+    max_workers=judge_config.RUN_THREADS,
+    thread_name_prefix="judge-run"
+)
+
+def exec_sync(sandbox: Sandbox, cmd: list) -> RunResult:
+    """
+    Run a command in the sandbox and wait for it.
+    """
+    start_time = time.monotonic()
+    exit_code, stdout, stderr = sandbox.exec_run(cmd)
+    return RunResult(
+        exit_code = exit_code,
+        stdout = stdout,
+        stderr = stderr,
+        time = time.monotonic() - start_time
+    )
+
+async def run(sandbox: Sandbox, cmd: list, timeout: float) -> RunResult:
+    """
+    Run a command in the sandbox, killing it once the deadline passes.
+
+    Args:
+        sandbox (Sandbox): sandbox leased for the submission.
+        cmd (list): command to be run.
+        timeout (float): seconds before the command is killed.
+
+    Returns:
+        RunResult: result of the run.
+    """
+    loop = asyncio.get_event_loop()
+    future = loop.run_in_executor(_executor, exec_sync, sandbox, cmd)
+    try:
+        return await asyncio.wait_for(asyncio.shield(future), timeout)
+    except asyncio.TimeoutError:
+        pass
+
+    # Kill the command so that its thread returns to the pool, the default
+    # executor is used since the pool may be full of blocked runs
+    await loop.run_in_executor(None, sandbox.kill)
+    try:
+        result = await future
+    except Exception:
+        result = RunResult()
+    result.time = timeout
+    result.timed_out = True
+    return result
+
+def stream_sync(
+    sandbox: Sandbox,
+    cmd: list,
+    loop: asyncio.AbstractEventLoop,
+    lines: asyncio.Queue
+) -> RunResult:
+    """
+    Run a command in the sandbox, putting each line of its standard output
+    into `lines` as it is written and None at the end.
+    """
+    start_time = time.monotonic()
+    result = RunResult()
+    buffer = b""
+
+    def on_stdout(data: bytes):
+        nonlocal buffer
+        *complete, buffer = (buffer + data).split(b"\n")
+        for line in complete:
+            loop.call_soon_threadsafe(lines.put_nowait, line)
+
+    try:
+        result.exit_code, result.stderr = sandbox.exec_stream(cmd, on_stdout)
+        if buffer:
+            loop.call_soon_threadsafe(lines.put_nowait, buffer)
+    finally:
+        loop.call_soon_threadsafe(lines.put_nowait, None)
+    result.time = time.monotonic() - start_time
+    return result
+
+async def stream(
+    sandbox: Sandbox,
+    cmd: list,
+    timeout: float,
+    on_line: Callable[[bytes], Awaitable[bool]]
+) -> RunResult:
+    """
+    Run a command in the sandbox, passing each line of its standard output
+    to `on_line` once it is written.
+
+    Args:
+        sandbox (Sandbox): sandbox leased for the submission.
+        cmd (list): command to be run.
+        timeout (float): seconds before the command is killed.
+        on_line (Callable): coroutine called with each line, the command
+            is killed once it returns True.
+
+    Returns:
+        RunResult: result of the run, without the standard output.
+    """
+    loop = asyncio.get_event_loop()
+    lines: asyncio.Queue = asyncio.Queue()
+    future = loop.run_in_executor(_executor, stream_sync, sandbox, cmd, loop, lines)
+    deadline = loop.time() + timeout
+    timed_out = False
+    stopped = False
+    while True:
+        try:
+            line = await asyncio.wait_for(lines.get(), max(0.0, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            timed_out = True
+            break
+        if line is None:
+            break
+        if await on_line(line):
+            stopped = True
+            break
+
+    if timed_out or stopped:
+        await loop.run_in_executor(None, sandbox.kill)
+    try:
+        result = await future
+    except Exception:
+        result = RunResult()
+    if timed_out:
+        result.time = timeout
+        result.timed_out = True
+    return result
@@ -0,0 +1,249 @@
+"""
+Test runner executed inside the sandbox.
+
+It runs test cases of a submission as child processes and prints the JSON
+report of each case on its own line once the case finishes, so that a whole
+submission can cost one exec call and the judge can stop it early. Time and
+memory are taken from the kernel: user + sys CPU time and peak RSS of each
+case from wait4, and OOM kills from the memory cgroup of the sandbox. Only
+the standard library is used, since it runs with the interpreter of the
+sandbox image.
+
+Usage:
+    python3 sandbox_runner.py <spec.json>
+
+The spec is a JSON object:
+    cmd (list): command running the submission.
+    time_limit (float): CPU time limit of each case in seconds.
+    wall_limit (float): wall time limit of each case in seconds, it catches
+        cases which sleep or wait without using CPU.
+    stop_on_error (bool): skip the remaining cases after a runtime error.
+    parallel (int, optional): number of cases run at the same time, cases
+        are started in order. Defaults to 1.
+    output_limit (int, optional): bytes the output and the error file of a
+        case may reach, the case is stopped by SIGXFSZ on its next write.
+        Defaults to 0, no limit.
+    cases (list): cases to run, each one is {id, input, output, error},
+        where input, output and error are file paths.
+"""
+import json
+import math
+import os
+import resource
+import signal
+import sys
+import time
+
+POLL_INTERVAL = 0.002
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+# Files counting OOM kills of the sandbox, for cgroup v2 and v1.
+OOM_EVENT_FILES = [
+    "/sys/fs/cgroup/memory.events",
+    "/sys/fs/cgroup/memory/memory.oom_control",
+]
+
+def read_oom_kills() -> int | None:
+    """
+    Number of processes killed by the OOM killer of the sandbox cgroup.
+
+    Returns:
+        int: the count, None if the cgroup can not be read.
+    """
+    for path in OOM_EVENT_FILES:
+        try:
+            with open(path, "r") as f:
+                for line in f:
+                    key, _, value = line.partition(" ")
+                    if key == "oom_kill":
+                        return int(value)
+        except OSError:
+            continue
+    return None
+
+def read_cpu_time(pid: int) -> float:
+    """
+    CPU time used by a running process so far.
+    """
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            fields = f.read().rpartition(")")[2].split()
+    except OSError:
+        return 0.0
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+def start_case(cmd: list, case: dict, time_limit: float, output_limit: int) -> tuple:
+    """
+    Start a case in its own process group.
+
+    The CPU rlimit only backs up the polling of the runner, it is rounded up
+    to whole seconds by the kernel. The file size rlimit is one byte over
+    the output limit, so that reaching the limit itself is not an error.
+
+    Returns:
+        A tuple containing the pid of the child and the descriptors of its
+        output and error files, kept open by the runner so that their sizes
+        are read from the files the child wrote even if it removed or
+        replaced them.
+    """
+    stdin = os.open(case["input"], os.O_RDONLY)
+    stdout = os.open(case["output"], os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    stderr = os.open(case["error"], os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.setpgid(0, 0)
+            cpu_limit = math.ceil(time_limit) + 1
+            resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, cpu_limit + 1))
+            if output_limit > 0:
+                resource.setrlimit(
+                    resource.RLIMIT_FSIZE, (output_limit + 1, output_limit + 1)
+                )
+                # Ignored by the interpreter of the runner, and exec keeps it
+                signal.signal(signal.SIGXFSZ, signal.SIG_DFL)
+            os.dup2(stdin, 0)
+            os.dup2(stdout, 1)
+            os.dup2(stderr, 2)
+            os.execvp(cmd[0], cmd)
+        finally:
+            os._exit(127)
+
+    os.close(stdin)
+    return pid, stdout, stderr
+
+def make_report(
+    case: dict,
+    status: int,
+    rusage,
+    wall_time: float,
+    timed_out: bool,
+    oom_killed: bool,
+    time_limit: float,
+    output_limit: int,
+    output_size: int,
+    error_size: int
+) -> dict:
+    """
+    Summarize a finished case.
+    """
+    cpu_time = rusage.ru_utime + rusage.ru_stime
+    if os.WIFSIGNALED(status) and os.WTERMSIG(status) == signal.SIGXCPU:
+        timed_out = True
+    if cpu_time > time_limit:
+        timed_out = True
+
+    report = {
+        "id": case["id"],
+        "status": "timeout" if timed_out else "finished",
+        "exit_code": None,
+        "signal": None,
+        "time": wall_time,
+        "cpu_time": cpu_time,
+        "memory": rusage.ru_maxrss / 1024,
+        "oom_killed": oom_killed,
+        "output_size": output_size,
+        "error_size": error_size,
+    }
+    report["output_limit_exceeded"] = output_limit > 0 and (
+        (os.WIFSIGNALED(status) and os.WTERMSIG(status) == signal.SIGXFSZ)
+        or report["output_size"] > output_limit
+        or report["error_size"] > output_limit
+    )
+    if os.WIFSIGNALED(status):
+        report["signal"] = os.WTERMSIG(status)
+    else:
+        report["exit_code"] = os.WEXITSTATUS(status)
+    return report
+
+def is_runtime_error(report: dict) -> bool:
+    """
+    Whether the case crashed. Cases stopped by a limit are not, any other
+    signal is, SIGKILL included. The judge classifies reports with it too,
+    so that cases skipped here always follow a runtime error of its log.
+    """
+    if report["status"] != "finished" or report["oom_killed"] \
+        or report.get("output_limit_exceeded"):
+        return False
+    return report["signal"] is not None or report["exit_code"] != 0 \
+        or report["error_size"] > 0
+
+def run_cases(spec: dict):
+    """
+    Run all cases of the spec.
+
+    Yields:
+        dict: report of each case once it finishes, skipped cases at last.
+    """
+    cmd = spec["cmd"]
+    time_limit = spec["time_limit"]
+    wall_limit = spec.get("wall_limit", time_limit)
+    parallel = max(1, spec.get("parallel", 1))
+    output_limit = spec.get("output_limit", 0)
+    pending = list(spec["cases"])
+    running: dict = {}
+    stop = False
+
+    while pending or running:
+        while pending and not stop and len(running) < parallel:
+            case = pending.pop(0)
+            oom_kills = read_oom_kills()
+            pid, stdout, stderr = start_case(cmd, case, time_limit, output_limit)
+            running[pid] = [case, time.monotonic(), False, oom_kills, stdout, stderr]
+
+        if not running:
+            break
+
+        pid, status, rusage = os.wait4(-1, os.WNOHANG)
+        if pid == 0:
+            # Kill cases out of time
+            now = time.monotonic()
+            for child, item in running.items():
+                if item[2]:
+                    continue
+                if now - item[1] > wall_limit or read_cpu_time(child) > time_limit:
+                    item[2] = True
+                    try:
+                        os.killpg(child, signal.SIGKILL)
+                    except ProcessLookupError:
+                        pass
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        if pid not in running:
+            continue
+        case, start, timed_out, oom_kills, stdout, stderr = running.pop(pid)
+        output_size = os.fstat(stdout).st_size
+        error_size = os.fstat(stderr).st_size
+        os.close(stdout)
+        os.close(stderr)
+        oom_killed = False
+        if os.WIFSIGNALED(status) and os.WTERMSIG(status) == signal.SIGKILL \
+            and not timed_out:
+            # Without a cgroup to ask, the kill may come from anyone
+            now_kills = read_oom_kills()
+            oom_killed = oom_kills is not None and now_kills is not None \
+                and now_kills > oom_kills
+
+        report = make_report(
+            case, status, rusage, time.monotonic() - start,
+            timed_out, oom_killed, time_limit, output_limit,
+            output_size, error_size
+        )
+        if spec.get("stop_on_error") and is_runtime_error(report):
+            stop = True
+        yield report
+
+    for case in pending:
+        yield {"id": case["id"], "status": "skipped"}
+
+def main():
+    with open(sys.argv[1], "r", encoding="utf-8") as f:
+        spec = json.load(f)
+
+    for report in run_cases(spec):
+        print(json.dumps(report), flush=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Content-addressed store of test data.
+
+Every input and output is a file named by the sha256 of its content, under
+`input/` or `output/` of the store, and `problems.testcases` only keeps a
+manifest of the hashes and sizes:
+
+    [{"input": hash, "input_size": n, "output": hash, "output_size": n}, ...]
+
+Inputs are bind-mounted read-only into the sandboxes at /testcases, so cases
+read them directly. Outputs are never mounted, they are only compared on the
+host, and are kept readable by the judge only (0600 under a 0700 `output/`)
+since the local backend runs submissions on the host.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from app import judge_config
+
+# Mount point of the inputs in the sandbox.
+SANDBOX_PATH = "/testcases"
+
+# Characters of test data encoded and written at a time.
+WRITE_CHUNK_SIZE = 1 << 20
+
+def input_dir() -> str:
+    """
+    Host directory of the inputs, created on first use.
+    """
+    path = os.path.abspath(os.path.join(judge_config.TESTCASE_DIR, "input"))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def file_path(kind: str, digest: str) -> str:
+    """
+    Host path of a stored file.
+
+    Args:
+        kind (str): "input" or "output".
+        digest (str): hash of the content.
+    """
+    return os.path.join(judge_config.TESTCASE_DIR, kind, digest[:2], digest)
+
+def sandbox_path(digest: str) -> str:
+    """
+    Path of a stored input inside the sandbox.
+    """
+    return f"{SANDBOX_PATH}/{digest[:2]}/{digest}"
+
+def put(kind: str, text: str) -> tuple:
+    """
+    Store text as UTF-8, encoding it chunk by chunk so that large test data
+    is never encoded as a whole in memory.
+
+    Args:
+        kind (str): "input" or "output".
+        text (str): content to be stored.
+
+    Returns:
+        A tuple containing the hash and the size of the file.
+    """
+    sha = hashlib.sha256()
+    for start in range(0, len(text), WRITE_CHUNK_SIZE):
+        sha.update(text[start:start + WRITE_CHUNK_SIZE].encode("utf-8"))
+    digest = sha.hexdigest()
+
+    path = file_path(kind, digest)
+    os.makedirs(os.path.dirname(path), mode=0o755, exist_ok=True)
+    if kind == "output":
+        # Also closes the directory of outputs stored by older versions
+        os.chmod(os.path.join(judge_config.TESTCASE_DIR, kind), 0o700)
+    if os.path.exists(path):
+        return digest, os.path.getsize(path)
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp_")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for start in range(0, len(text), WRITE_CHUNK_SIZE):
+                f.write(text[start:start + WRITE_CHUNK_SIZE].encode("utf-8"))
+
+        # Inputs are readable by the sandbox user, outputs by the judge only
+        os.chmod(tmp_path, 0o644 if kind == "input" else 0o600)
+        os.replace(tmp_path, path)
+    except OSError:
+        os.remove(tmp_path)
+        raise
+    return digest, os.path.getsize(path)
+
+def read(kind: str, digest: str) -> str:
+    """
+    Read a stored file as text.
+    """
+    with open(file_path(kind, digest), "r", encoding="utf-8", newline="") as f:
+        return f.read()
+
+def store_testcases(testcases: list) -> list:
+    """
+    Store test cases given as [{input, output}].
+
+    Returns:
+        list: manifest of the test cases.
+
+    Raises:
+        KeyError, TypeError: a test case is not {input, output}.
+    """
+    manifest = []
+    for item in testcases:
+        input_hash, input_size = put("input", str(item["input"]))
+        output_hash, output_size = put("output", str(item["output"]))
+        manifest.append({
+            "input": input_hash,
+            "input_size": input_size,
+            "output": output_hash,
+            "output_size": output_size,
+        })
+    return manifest
+
+def load_manifest(testcases: str) -> list:
+    """
+    Parse `problems.testcases`, storing test cases of rows written before
+    the store existed.
+
+    Args:
+        testcases (str): the column.
+
+    Returns:
+        list: manifest of the test cases.
+    """
+    items = json.loads(testcases)
+    if items and "input_size" not in items[0]:
+        return store_testcases(items)
+    return items
+
+def load_testcases(manifest: list) -> list:
+    """
+    Read test cases of a manifest back as [{input, output}].
+    """
+    return [
+        {"input": read("input", item["input"]), "output": read("output", item["output"])}
+        for item in manifest
+    ]
+
+def migrate(cursor):
+    """
+    Move test cases stored inline in `problems` into the store.
+
+    Args:
+        cursor (sqlite3.Cursor): cursor of the database.
+    """
+    cursor.execute("SELECT id, testcases FROM problems")
+    for problem_id, testcases in cursor.fetchall():
+        items = json.loads(testcases)
+        if items and "input_size" not in items[0]:
+            cursor.execute(
+                "UPDATE problems SET testcases = ? WHERE id = ?",
+                (json.dumps(store_testcases(items)), problem_id)
+            )
+
+def clear():
+    """
+    Remove all stored files, the directories themselves are kept since the
+    sandboxes mount them.
+    """
+    for kind in ("input", "output"):
+        path = os.path.join(judge_config.TESTCASE_DIR, kind)
+        if not os.path.isdir(path):
+            continue
+        for name in os.listdir(path):
+            shutil.rmtree(os.path.join(path, name), ignore_errors=True)
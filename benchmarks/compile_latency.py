@@ -0,0 +1,108 @@
+"""
+Compile latency of C++ submissions in the judge image.
+
+It compiles typical competitive programs in a container of the cpp image
+with the command of the judge and reports the latency of:
+
+    plain        the precompiled <bits/stdc++.h> hidden, like the old image
+    pch          the precompiled header
+    pch+ccache   the precompiled header and ccache, every source new (miss)
+    warm ccache  the same sources compiled again (hit), like compilations
+                 evicted from the compile cache of the judge
+
+Usage:
+    python benchmarks/compile_latency.py [--image cpp-eval-env] [--runs 10]
+"""
+import argparse
+import statistics
+import sys
+import time
+import docker
+
+sys.path.insert(0, ".")
+from app.language_registry import CPP_COMPILE_CMD
+
+SOURCE = """#include <bits/stdc++.h>
+using namespace std;
+const int bench_run = %d;
+int main() {
+    int n;
+    cin >> n;
+    vector<long long> a(n);
+    for (auto &x : a) cin >> x;
+    sort(a.begin(), a.end());
+    map<long long, int> count;
+    for (auto x : a) count[x]++;
+    cout << count.size() + bench_run * 0 << endl;
+}
+"""
+
+def find_header(container) -> str:
+    result = container.exec_run([
+        "sh", "-c",
+        "echo '#include <bits/stdc++.h>' | g++ -std=c++17 -x c++ -H -fsyntax-only - 2>&1"
+        " | grep -m1 'bits/stdc++.h' | awk '{print $2}'"
+    ])
+    return result.output.decode().strip()
+
+def compile_runs(container, runs: int, offset: int, environment: dict) -> list:
+    """
+    Compile `runs` sources and return the latency of each compilation.
+    """
+    latencies = []
+    for i in range(runs):
+        container.exec_run(
+            ["sh", "-c", f"cat > /bench/main.cpp <<'EOF'\n{SOURCE % (offset + i)}EOF"]
+        )
+        start = time.monotonic()
+        result = container.exec_run(
+            ["sh", "-c", CPP_COMPILE_CMD],
+            workdir="/bench",
+            environment=environment
+        )
+        latencies.append(time.monotonic() - start)
+        if result.exit_code != 0:
+            raise RuntimeError(result.output.decode(errors="replace"))
+    return latencies
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile latency of C++ submissions")
+    parser.add_argument("--image", default="cpp-eval-env", help="image of the judge")
+    parser.add_argument("--runs", type=int, default=10, help="compilations of each mode")
+    args = parser.parse_args()
+
+    client = docker.from_env()
+    container = client.containers.run(
+        args.image,
+        ["sleep", "infinity"],
+        detach=True,
+        tmpfs={"/bench": "rw,exec", "/ccache": "rw"}
+    )
+    try:
+        header = find_header(container)
+        ccache = {
+            "PATH": "/opt/ccache/bin:/usr/local/sbin:/usr/local/bin"
+                ":/usr/sbin:/usr/bin:/sbin:/bin",
+            "CCACHE_DIR": "/ccache",
+            "CCACHE_SLOPPINESS": "pch_defines,time_macros",
+        }
+
+        results = {}
+        container.exec_run(["mv", f"{header}.gch", f"{header}.gch.off"])
+        results["plain"] = compile_runs(container, args.runs, 0, {})
+        container.exec_run(["mv", f"{header}.gch.off", f"{header}.gch"])
+        results["pch"] = compile_runs(container, args.runs, 0, {})
+        results["pch+ccache"] = compile_runs(container, args.runs, 0, ccache)
+        results["warm ccache"] = compile_runs(container, args.runs, 0, ccache)
+    finally:
+        container.remove(force=True)
+
+    print(f"{'mode':<12} {'median':>8} {'mean':>8} {'max':>8}")
+    for mode, latencies in results.items():
+        print(
+            f"{mode:<12} {statistics.median(latencies):>8.3f}"
+            f" {statistics.mean(latencies):>8.3f} {max(latencies):>8.3f}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Throughput and latency of the judge pipeline.
+
+It pushes submissions through the whole pipeline of the app, POST
+/api/submissions/ -> judge queue -> judge -> update_log, and reports the
+submissions judged per second and the end-to-end latency of each one, from
+its submit request until its result is written.
+
+The app runs in a temporary directory with its own database, with the fake
+sandbox backend by default, so that only the pipeline itself is measured:
+
+    python benchmarks/judge_throughput.py [--submissions 200] [--cases 10]
+        [--run-latency 0.005] [--compile-latency 0.2] [--language python]
+        [--workers 0] [--concurrency 4] [--backend fake] [--distinct N]
+
+--workers 0 judges in the event loop of the app, like the tests. Every
+submission is different code unless --distinct is smaller than
+--submissions, then identical code takes the stored result of the first
+one judged, see app/result_cache.py.
+"""
+import argparse
+import math
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+CODE = {
+    "python": "a, b = map(int, input().split())\nprint(a + b)\n",
+    "cpp": "#include <bits/stdc++.h>\nint main() { long long a, b; std::cin >> a >> b;"
+        " std::cout << a + b << std::endl; }\n",
+}
+
+COMMENT = {"python": "#", "cpp": "//"}
+
+def percentile(values: list, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of the judge pipeline")
+    parser.add_argument("--submissions", type=int, default=200, help="submissions to judge")
+    parser.add_argument("--cases", type=int, default=10, help="test cases of the problem")
+    parser.add_argument("--language", default="python", choices=sorted(CODE))
+    parser.add_argument("--backend", default="fake", help="sandbox backend")
+    parser.add_argument("--compile-latency", type=float, default=0.2,
+                        help="seconds of a compilation with the fake backend")
+    parser.add_argument("--run-latency", type=float, default=0.005,
+                        help="seconds of a test case with the fake backend")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="judge worker processes, 0 judges in the app")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="submissions judged at the same time by a judge")
+    parser.add_argument("--distinct", type=int, default=0,
+                        help="different programs submitted, all of them by default")
+    args = parser.parse_args()
+
+    # Settings are read once the app is imported
+    os.environ.update({
+        "OJ_SANDBOX_BACKEND": args.backend,
+        "OJ_FAKE_COMPILE_LATENCY": str(args.compile_latency),
+        "OJ_FAKE_RUN_LATENCY": str(args.run_latency),
+        "OJ_INLINE_JUDGE": "0" if args.workers else "1",
+        "OJ_JUDGE_WORKERS": str(args.workers),
+        "OJ_JUDGE_CONCURRENCY": str(args.concurrency),
+    })
+
+    # The app keeps its files under ./app
+    workdir = tempfile.mkdtemp(prefix="judge_throughput_")
+    os.makedirs(os.path.join(workdir, "app"))
+    for name in ("sandbox_runner.py", "default_seccomp.json"):
+        os.symlink(os.path.join(ROOT, "app", name), os.path.join(workdir, "app", name))
+    sys.path.insert(0, ROOT)
+    os.chdir(workdir)
+
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as client:
+        client.post("/api/auth/login", json={
+            "username": "admin", "password": "admintestpassword"
+        })
+        problem_id = "bench_" + uuid.uuid4().hex[:8]
+        client.post("/api/problems/", json={
+            "id": problem_id,
+            "title": "A + B",
+            "description": "a + b",
+            "input_description": "two integers",
+            "output_description": "their sum",
+            "samples": [{"input": "1 2\n", "output": "3\n"}],
+            "constraints": "",
+            "testcases": [
+                {"input": f"{i} {i + 1}\n", "output": f"{2 * i + 1}\n"}
+                for i in range(args.cases)
+            ],
+        })
+
+        # A session may only submit 3 times a minute
+        sessions = []
+        for _ in range(math.ceil(args.submissions / 3)):
+            username = "bench_" + uuid.uuid4().hex[:8]
+            user = {"username": username, "password": "benchpassword"}
+            client.post("/api/users/", json=user)
+            client.cookies.clear()
+            client.post("/api/auth/login", json=user)
+            sessions.append(list(client.cookies.jar))
+
+        distinct = args.distinct or args.submissions
+        submitted: dict[int, float] = {}
+        start = time.monotonic()
+        for i in range(args.submissions):
+            client.cookies.clear()
+            for cookie in sessions[i // 3]:
+                client.cookies.jar.set_cookie(cookie)
+            submit_time = time.monotonic()
+            response = client.post("/api/submissions/", json={
+                "problem_id": problem_id,
+                "language": args.language,
+                "code": CODE[args.language] + f"{COMMENT[args.language]} {i % distinct}\n",
+            })
+            submitted[int(response.json()["data"]["submission_id"])] = submit_time
+
+        # Results are written by update_log
+        latencies = []
+        pending = set(submitted)
+        with sqlite3.connect('./app/oj_system.db') as conn:
+            cursor = conn.cursor()
+            while pending:
+                cursor.execute(
+                    f"""SELECT id FROM submissions WHERE status != 'pending'
+                    AND id IN ({",".join("?" * len(pending))})""",
+                    tuple(pending)
+                )
+                now = time.monotonic()
+                for (submission_id, ) in cursor.fetchall():
+                    latencies.append(now - submitted[submission_id])
+                    pending.discard(submission_id)
+                time.sleep(0.002)
+        elapsed = time.monotonic() - start
+
+    print(f"backend {args.backend}, {args.submissions} submissions of {args.cases} cases")
+    print(f"throughput {args.submissions / elapsed:.1f} submissions/s")
+    print(f"{'latency':<8} {'p50':>8} {'p95':>8} {'p99':>8} {'mean':>8}")
+    print(
+        f"{'seconds':<8} {percentile(latencies, 50):>8.3f} {percentile(latencies, 95):>8.3f}"
+        f" {percentile(latencies, 99):>8.3f} {statistics.mean(latencies):>8.3f}"
+    )
+
+if __name__ == "__main__":
+    main()
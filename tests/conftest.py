@@ -1,6 +1,13 @@
+import os
+
 import pytest
 from fastapi.testclient import TestClient
 
+# Judge in the app with the fake sandbox backend, so that verdicts do not
+# depend on Docker
+os.environ.setdefault("OJ_SANDBOX_BACKEND", "fake")
+os.environ.setdefault("OJ_INLINE_JUDGE", "1")
+
 from app.main import app
 
 
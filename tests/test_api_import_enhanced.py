@@ -584,3 +584,54 @@ def test_export_reset_import_login_workflow(client):
     problems_data = problems_response.json()["data"]
     problem_ids = [prob["id"] for prob in problems_data]
     assert problem_id in problem_ids
+
+
+def test_data_import_judge_settings(client):
+    """Test POST /api/import/ - judge settings are checked like POST /api/problems/"""
+    setup_admin_session(client)
+
+    problem_id = "import_settings_" + uuid.uuid4().hex[:4]
+    problem = {
+        "id": problem_id,
+        "title": "导入设置",
+        "description": "计算a+b",
+        "input_description": "两个整数",
+        "output_description": "它们的和",
+        "samples": [{"input": "1 2\n", "output": "3\n"}],
+        "constraints": "",
+        "testcases": [{"input": "1 2\n", "output": "3\n"}],
+        "hint": "",
+        "source": "",
+        "tags": [],
+        "time_limit": 1.0,
+        "memory_limit": 128,
+        "author": "",
+        "difficulty": ""
+    }
+
+    def import_problem(**settings):
+        content = json.dumps({
+            "users": [], "problems": [dict(problem, **settings)], "submissions": []
+        }).encode('utf-8')
+        files = {"file": ("data.json", io.BytesIO(content), "application/json")}
+        return client.post("/api/import/", files=files)
+
+    for settings in (
+        {"fail_fast": True}, {"fail_fast": -1}, {"eps": -0.1},
+        {"output_limit": 0}, {"checker": "special"}
+    ):
+        assert import_problem(**settings).status_code == 400
+
+    # The testcase version is kept, and bumped when test cases change
+    assert import_problem(fail_fast=1).status_code == 200
+    version = client.get(f"/api/problems/{problem_id}").json()["data"]["testcase_version"]
+    assert version == 1
+    assert import_problem(fail_fast=2).status_code == 200
+    data = client.get(f"/api/problems/{problem_id}").json()["data"]
+    assert data["testcase_version"] == 1
+    assert data["fail_fast"] == 2
+
+    problem["testcases"] = [{"input": "1 3\n", "output": "4\n"}]
+    assert import_problem().status_code == 200
+    data = client.get(f"/api/problems/{problem_id}").json()["data"]
+    assert data["testcase_version"] == 2
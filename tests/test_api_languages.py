@@ -1,6 +1,7 @@
 import uuid
 import pytest
-from test_helpers import setup_admin_session, setup_user_session, reset_system, create_test_user
+from test_helpers import setup_admin_session, setup_user_session, reset_system, create_test_user, \
+    wait_for_judging
 
 
 def test_register_language(client):
@@ -11,9 +12,9 @@ def test_register_language(client):
     # Set up admin session
     setup_admin_session(client)
     
-    # Register C++ language
+    # Register C++11, next to the built-in C++
     language_data = {
-        "name": "cpp",
+        "name": "cpp11",
         "file_ext": ".cpp",
         "compile_cmd": "g++ -o main main.cpp -std=c++11",
         "run_cmd": "./main"
@@ -24,7 +25,18 @@ def test_register_language(client):
     data = response.json()
     assert data["code"] == 200
     assert data["msg"] == "language registered"
-    assert data["data"]["name"] == "cpp"
+    assert data["data"]["name"] == "cpp11"
+    
+    # Built-in languages cannot be replaced
+    response = client.post("/api/languages/", json=dict(language_data, name="cpp"))
+    assert response.status_code == 400
+    assert response.json()["msg"] == "language exists"
+    
+    # Only admins register languages
+    username, password, _ = create_test_user(client)
+    setup_user_session(client, username, password)
+    response = client.post("/api/languages/", json=dict(language_data, name="cpp14"))
+    assert response.status_code == 403
 
 def test_get_supported_languages(client):
     """Test GET /api/languages/"""
@@ -34,9 +46,9 @@ def test_get_supported_languages(client):
     # Set up admin session
     setup_admin_session(client)
     
-    # Register C++ language
+    # Register C++11 language
     cpp_language = {
-        "name": "cpp",
+        "name": "cpp11",
         "file_ext": ".cpp",
         "compile_cmd": "g++ -o main main.cpp -std=c++11",
         "run_cmd": "./main"
@@ -54,4 +66,79 @@ def test_get_supported_languages(client):
     assert "data" in data
     assert isinstance(data["data"], dict)
     assert "name" in data["data"]
-    assert isinstance(data["data"]["name"], list)
\ No newline at end of file
+    assert isinstance(data["data"]["name"], list)
+    assert data["data"]["name"][:2] == ["python", "cpp"]
+    assert "cpp11" in data["data"]["name"]
+
+def test_registered_language_is_judged(client):
+    """Test a registered language is compiled and run by the judge"""
+    reset_system(client)
+    setup_admin_session(client)
+
+    # Multipliers of limits must be positive
+    response = client.post("/api/languages/", json={
+        "name": "pypy",
+        "file_ext": ".py",
+        "run_cmd": "pypy3 main.py",
+        "time_factor": 0
+    })
+    assert response.status_code == 400
+
+    languages = [
+        {
+            "name": "pypy",
+            "file_ext": ".py",
+            "run_cmd": "pypy3 main.py",
+            "image": "pypy-eval-env",
+            "time_factor": 0.5
+        },
+        {
+            "name": "c",
+            "file_ext": ".c",
+            "compile_cmd": "gcc -o main main.c -O2",
+            "run_cmd": "./main",
+            "image": "cpp-eval-env"
+        },
+    ]
+    for language in languages:
+        response = client.post("/api/languages/", json=language)
+        assert response.status_code == 200
+
+    problem_id = "test_language_" + uuid.uuid4().hex[:4]
+    client.post("/api/problems/", json={
+        "id": problem_id,
+        "title": "测试语言",
+        "description": "计算a+b",
+        "input_description": "两个整数",
+        "output_description": "它们的和",
+        "samples": [{"input": "1 2\n", "output": "3\n"}],
+        "testcases": [{"input": "1 2\n", "output": "3\n"}],
+        "constraints": "|a|,|b| <= 10^9",
+        "time_limit": 1.0,
+        "memory_limit": 128
+    })
+
+    expected = {
+        ("pypy", "print(3)"): ("AC", None),
+        ("pypy", "# fake: TLE"): ("TLE", 0.5),
+        ("c", "int main() {}\n// fake: CE"): ("CE", None),
+        ("java", "class Main {}"): ("UNK", None),
+    }
+    submission_ids = {}
+    for (language, code) in expected:
+        response = client.post("/api/submissions/", json={
+            "problem_id": problem_id,
+            "language": language,
+            "code": code
+        })
+        submission_ids[(language, code)] = response.json()["data"]["submission_id"]
+
+    wait_for_judging(problem_id)
+
+    for key, (result, case_time) in expected.items():
+        response = client.get(f"/api/submissions/{submission_ids[key]}/log")
+        details = response.json()["data"]["details"]
+        assert details[0]["result"] == result
+        if case_time is not None:
+            # Time limit of the problem times the factor of the language
+            assert details[0]["time"] == case_time
@@ -1,5 +1,7 @@
+import time
 import uuid
 
+from app.fake_sandbox import FakeSandbox
 from test_helpers import setup_user_session, reset_system, create_test_user, setup_admin_session
 
 
@@ -106,6 +108,7 @@ def test_get_problem_info(client):
     assert data["msg"] == "success"
     assert data["data"]["id"] == problem_id
     assert data["data"]["title"] == "测试题目"
+    assert data["data"]["testcases"] == [{"input": "1 2", "output": "3"}]
     # Test non-existent problem
     response = client.get("/api/problems/nonexistent")
     assert response.status_code == 404
@@ -154,3 +157,161 @@ def test_delete_problem(client):
     # Test non-existent problem
     response = client.delete("/api/problems/nonexistent")
     assert response.status_code == 404
+
+
+def test_problem_fail_fast(client):
+    """Test fail-fast policy of problems"""
+    reset_system(client)
+    setup_admin_session(client)
+
+    problem_id = "test_fail_fast_" + uuid.uuid4().hex[:4]
+    problem_data = {
+        "id": problem_id,
+        "title": "测试题目",
+        "description": "这是一个测试题目",
+        "input_description": "输入描述",
+        "output_description": "输出描述",
+        "samples": [{"input": "1 2", "output": "3"}],
+        "constraints": "|a|,|b| <= 10^9",
+        "testcases": [{"input": "1 2", "output": "3"}],
+        "fail_fast": -1
+    }
+
+    # Invalid policy
+    response = client.post("/api/problems/", json=problem_data)
+    assert response.status_code == 400
+
+    problem_data["fail_fast"] = 2
+    response = client.post("/api/problems/", json=problem_data)
+    assert response.status_code == 200
+
+    response = client.get(f"/api/problems/{problem_id}")
+    assert response.status_code == 200
+    assert response.json()["data"]["fail_fast"] == 2
+
+
+def test_problem_checker(client):
+    """Test checker mode of problems"""
+    reset_system(client)
+    setup_admin_session(client)
+
+    problem_id = "test_checker_" + uuid.uuid4().hex[:4]
+    problem_data = {
+        "id": problem_id,
+        "title": "测试题目",
+        "description": "这是一个测试题目",
+        "input_description": "输入描述",
+        "output_description": "输出描述",
+        "samples": [{"input": "1 3", "output": "0.333333"}],
+        "constraints": "|a|,|b| <= 10^9",
+        "testcases": [{"input": "1 3", "output": "0.333333"}],
+        "checker": "fuzzy"
+    }
+
+    # Unknown checker
+    response = client.post("/api/problems/", json=problem_data)
+    assert response.status_code == 400
+
+    problem_data["checker"] = "float"
+    problem_data["eps"] = 1e-4
+    response = client.post("/api/problems/", json=problem_data)
+    assert response.status_code == 200
+
+    data = client.get(f"/api/problems/{problem_id}").json()["data"]
+    assert data["checker"] == "float"
+    assert data["eps"] == 1e-4
+
+    # Special judges need their checker program
+    problem_data["id"] = problem_id + "_special"
+    problem_data["checker"] = "special"
+    response = client.post("/api/problems/", json=problem_data)
+    assert response.status_code == 400
+
+    problem_data["checker_code"] = '#include "testlib.h"\nint main() {}\n'
+    response = client.post("/api/problems/", json=problem_data)
+    assert response.status_code == 200
+
+    data = client.get(f"/api/problems/{problem_id}_special").json()["data"]
+    assert data["checker"] == "special"
+    assert data["checker_code"] == problem_data["checker_code"]
+
+
+def test_update_testcases(client, monkeypatch):
+    """Test PUT /api/problems/{problem_id}/testcases rejudges changed cases only"""
+    reset_system(client)
+    setup_admin_session(client)
+
+    # Count cases run by the fake sandbox
+    runs = []
+    run_case = FakeSandbox._run_case
+
+    def counted(self, case, verdict, time_limit):
+        runs.append(case)
+        return run_case(self, case, verdict, time_limit)
+
+    monkeypatch.setattr(FakeSandbox, "_run_case", counted)
+
+    problem_id = "test_testcases_" + uuid.uuid4().hex[:4]
+    testcases = [
+        {"input": "1 2\n", "output": "3\n"},
+        {"input": "3 4\n", "output": "7\n"},
+        {"input": "5 6\n", "output": "11\n"}
+    ]
+    client.post("/api/problems/", json={
+        "id": problem_id,
+        "title": "测试数据",
+        "description": "计算a+b",
+        "input_description": "两个整数",
+        "output_description": "它们的和",
+        "samples": [{"input": "1 2\n", "output": "3\n"}],
+        "constraints": "|a|,|b| <= 10^9",
+        "testcases": testcases
+    })
+
+    response = client.post("/api/submissions/", json={
+        "problem_id": problem_id,
+        "language": "python",
+        "code": "a, b = map(int, input().split())\nprint(a + b)"
+    })
+    submission_id = response.json()["data"]["submission_id"]
+    time.sleep(0.5)
+    assert len(runs) == 3
+
+    # Invalid mode
+    response = client.put(f"/api/problems/{problem_id}/testcases", json={
+        "testcases": [], "mode": "merge"
+    })
+    assert response.status_code == 400
+
+    response = client.put("/api/problems/nonexistent/testcases", json={"testcases": []})
+    assert response.status_code == 404
+
+    # An appended case is the only one to run
+    response = client.put(f"/api/problems/{problem_id}/testcases", json={
+        "testcases": [{"input": "7 8\n", "output": "15\n"}],
+        "mode": "append",
+        "rejudge": True
+    })
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert data["testcase_version"] == 2
+    assert data["testcases"] == 4
+    assert data["rejudged"] == 1
+    time.sleep(0.5)
+    assert len(runs) == 4
+
+    # So is an edited one
+    testcases[1] = {"input": "3 5\n", "output": "8\n"}
+    response = client.put(f"/api/problems/{problem_id}/testcases", json={
+        "testcases": testcases + [{"input": "7 8\n", "output": "15\n"}],
+        "rejudge": True
+    })
+    assert response.json()["data"]["testcase_version"] == 3
+    time.sleep(0.5)
+    assert len(runs) == 5
+
+    response = client.get(f"/api/submissions/{submission_id}/log")
+    details = response.json()["data"]["details"]
+    assert [item["result"] for item in details] == ["AC"] * 4
+    assert [item["id"] for item in details] == [1, 2, 3, 4]
+    assert client.get(f"/api/problems/{problem_id}").json()["data"]["testcase_version"] == 3
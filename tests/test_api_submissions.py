@@ -1,7 +1,11 @@
 import uuid
 import time
+import threading
 import pytest
-from test_helpers import setup_admin_session, setup_user_session
+from app import code_judge
+from app import judge_config
+from app.fake_sandbox import FakeSandbox
+from test_helpers import setup_admin_session, setup_user_session, wait_for_judging
 
 
 def test_submit_solution(client):
@@ -46,6 +50,7 @@ def test_submit_solution(client):
     assert "data" in data
     assert "submission_id" in data["data"]
     assert data["data"]["status"] == "pending"
+    assert data["data"]["queue_position"] >= 1
 
     # Test invalid problem_id
     submission_data["problem_id"] = "nonexistent"
@@ -210,4 +215,294 @@ def test_rejudge_submission(client):
 
     # Test non-existent submission
     response = client.put("/api/submissions/999999/rejudge")
-    assert response.status_code == 404
\ No newline at end of file
+    assert response.status_code == 404
+
+def test_judge_verdicts(client):
+    """Test verdicts of the judge pipeline with the fake sandbox backend"""
+    setup_admin_session(client)
+
+    problem_id = "test_verdicts_" + uuid.uuid4().hex[:4]
+    problem_data = {
+        "id": problem_id,
+        "title": "测试判题",
+        "description": "计算a+b",
+        "input_description": "两个整数",
+        "output_description": "它们的和",
+        "samples": [{"input": "1 2\n", "output": "3\n"}],
+        "testcases": [
+            {"input": "1 2\n", "output": "3\n"},
+            {"input": "10 20\n", "output": "30\n"}
+        ],
+        "constraints": "|a|,|b| <= 10^9",
+        "time_limit": 1.0,
+        "memory_limit": 128
+    }
+    client.post("/api/problems/", json=problem_data)
+
+    expected = {
+        ("python", "print(3)\n# fake: WA"): ["WA", "WA"],
+        ("python", "# fake: TLE"): ["TLE", "TLE"],
+        ("cpp", "int main() {}\n// fake: CE"): ["CE", "CE"],
+    }
+    submission_ids = {}
+    for (language, code) in expected:
+        response = client.post("/api/submissions/", json={
+            "problem_id": problem_id,
+            "language": language,
+            "code": code
+        })
+        submission_ids[(language, code)] = response.json()["data"]["submission_id"]
+
+    wait_for_judging(problem_id)
+
+    for key, results in expected.items():
+        response = client.get(f"/api/submissions/{submission_ids[key]}/log")
+        details = response.json()["data"]["details"]
+        assert [item["result"] for item in details] == results
+
+
+def test_identical_code_reuses_result(client, monkeypatch):
+    """Test identical code judged on the same tests is not run again"""
+    setup_admin_session(client)
+
+    # Count runs of the fake sandbox
+    runs = []
+    exec_stream = FakeSandbox.exec_stream
+
+    def counted(self, cmd, on_stdout):
+        runs.append(cmd)
+        return exec_stream(self, cmd, on_stdout)
+
+    monkeypatch.setattr(FakeSandbox, "exec_stream", counted)
+
+    problem_id = "test_reuse_" + uuid.uuid4().hex[:4]
+    client.post("/api/problems/", json={
+        "id": problem_id,
+        "title": "测试复用",
+        "description": "计算a+b",
+        "input_description": "两个整数",
+        "output_description": "它们的和",
+        "samples": [{"input": "1 2\n", "output": "3\n"}],
+        "testcases": [{"input": "1 2\n", "output": "3\n"}],
+        "constraints": "|a|,|b| <= 10^9"
+    })
+
+    code = "a, b = map(int, input().split())\nprint(a + b)  # " + uuid.uuid4().hex
+    submission_ids = []
+    for variant in (code, code.replace("\n", "\r\n")):
+        response = client.post("/api/submissions/", json={
+            "problem_id": problem_id,
+            "language": "python",
+            "code": variant
+        })
+        submission_ids.append(response.json()["data"]["submission_id"])
+        wait_for_judging(problem_id)
+    assert len(runs) == 1
+
+    response = client.get(f"/api/submissions/{submission_ids[1]}/log")
+    assert [item["result"] for item in response.json()["data"]["details"]] == ["AC"]
+
+    # Rejudging reuses the result too, unless forced
+    client.put(f"/api/submissions/{submission_ids[1]}/rejudge")
+    wait_for_judging(problem_id)
+    assert len(runs) == 1
+
+    response = client.put(
+        f"/api/submissions/{submission_ids[1]}/rejudge", json={"force": "yes"}
+    )
+    assert response.status_code == 400
+
+    client.put(f"/api/submissions/{submission_ids[1]}/rejudge", json={"force": True})
+    wait_for_judging(problem_id)
+    assert len(runs) == 2
+
+
+def test_rejudge_batch(client, monkeypatch):
+    """Test POST /api/submissions/rejudge and progress and cancellation of batches"""
+    setup_admin_session(client)
+
+    problem_id = "test_batch_" + uuid.uuid4().hex[:4]
+    client.post("/api/problems/", json={
+        "id": problem_id,
+        "title": "测试重测",
+        "description": "计算a+b",
+        "input_description": "两个整数",
+        "output_description": "它们的和",
+        "samples": [{"input": "1 2\n", "output": "3\n"}],
+        "testcases": [{"input": "1 2\n", "output": "3\n"}],
+        "constraints": "|a|,|b| <= 10^9"
+    })
+    for code in ("print(3)", "print(4)"):
+        client.post("/api/submissions/", json={
+            "problem_id": problem_id,
+            "language": "python",
+            "code": code + "  # " + uuid.uuid4().hex
+        })
+    wait_for_judging(problem_id)
+
+    response = client.post("/api/submissions/rejudge", json={"min_id": "1"})
+    assert response.status_code == 400
+
+    response = client.post("/api/submissions/rejudge", json={
+        "problem_id": problem_id,
+        "language": "python",
+        "force": True
+    })
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert data["total"] == 2
+
+    wait_for_judging(problem_id)
+    response = client.get(f"/api/submissions/rejudge/{data['batch_id']}")
+    progress = response.json()["data"]
+    assert progress["status"] == "finished"
+    assert progress["done"] == 2
+    assert progress["filters"] == {"problem_id": problem_id, "language": "python"}
+
+    # Batches wait while their share of judges is taken
+    monkeypatch.setattr(judge_config, "REJUDGE_CONCURRENCY", 0)
+    response = client.post("/api/submissions/rejudge", json={"problem_id": problem_id})
+    batch_id = response.json()["data"]["batch_id"]
+    progress = client.get(f"/api/submissions/rejudge/{batch_id}").json()["data"]
+    assert progress["queued"] == 2
+
+    # Submissions already queued are left to their jobs
+    response = client.post("/api/submissions/rejudge", json={"problem_id": problem_id})
+    assert response.json()["data"]["total"] == 0
+    assert response.json()["data"]["merged"] == 2
+
+    response = client.post(f"/api/submissions/rejudge/{batch_id}/cancel")
+    assert response.status_code == 200
+    progress = response.json()["data"]
+    assert progress["status"] == "cancelled"
+    assert progress["cancelled"] == 2
+    assert progress["queued"] == 0
+
+    response = client.get("/api/submissions/rejudge/999999")
+    assert response.status_code == 404
+
+
+def test_cancel_and_coalesce(client, monkeypatch):
+    """Test POST /api/submissions/{submission_id}/cancel and merging of duplicate jobs"""
+    setup_admin_session(client)
+
+    # Cases take long enough to be cancelled while running
+    monkeypatch.setattr(judge_config, "FAKE_RUN_LATENCY", 5.0)
+    started = threading.Event()
+    exec_stream = FakeSandbox.exec_stream
+
+    def signalled(self, cmd, on_stdout):
+        started.set()
+        return exec_stream(self, cmd, on_stdout)
+
+    monkeypatch.setattr(FakeSandbox, "exec_stream", signalled)
+
+    problem_id = "test_cancel_" + uuid.uuid4().hex[:4]
+    client.post("/api/problems/", json={
+        "id": problem_id,
+        "title": "测试取消",
+        "description": "计算a+b",
+        "input_description": "两个整数",
+        "output_description": "它们的和",
+        "samples": [{"input": "1 2\n", "output": "3\n"}],
+        "testcases": [{"input": "1 2\n", "output": "3\n"}],
+        "constraints": "|a|,|b| <= 10^9"
+    })
+    response = client.post("/api/submissions/", json={
+        "problem_id": problem_id,
+        "language": "python",
+        "code": "print(3)  # " + uuid.uuid4().hex
+    })
+    submission_id = response.json()["data"]["submission_id"]
+    assert started.wait(5)
+
+    # A rejudge is queued behind the running job, and cancelled with it
+    response = client.put(f"/api/submissions/{submission_id}/rejudge")
+    assert response.json()["data"]["queue_position"] == 1
+
+    response = client.post(f"/api/submissions/{submission_id}/cancel")
+    assert response.status_code == 200
+    assert response.json()["data"]["status"] == "cancelling"
+
+    # The judge stops long before the case would end
+    wait_for_judging(problem_id, timeout=2)
+    response = client.get(f"/api/submissions/?problem_id={problem_id}")
+    assert response.json()["data"]["submissions"][0]["status"] == "cancelled"
+
+    response = client.post(f"/api/submissions/{submission_id}/cancel")
+    assert response.status_code == 409
+    response = client.post("/api/submissions/999999/cancel")
+    assert response.status_code == 404
+
+
+def test_failed_judge(client, monkeypatch):
+    """Test a submission whose judging fails is left unknown instead of pending"""
+    setup_admin_session(client)
+
+    async def broken_lease(pool):
+        raise RuntimeError("no sandbox")
+
+    monkeypatch.setattr(code_judge, "lease_sandbox", broken_lease)
+
+    problem_id = "test_failed_" + uuid.uuid4().hex[:4]
+    client.post("/api/problems/", json={
+        "id": problem_id,
+        "title": "测试失败",
+        "description": "计算a+b",
+        "input_description": "两个整数",
+        "output_description": "它们的和",
+        "samples": [{"input": "1 2\n", "output": "3\n"}],
+        "testcases": [
+            {"input": "1 2\n", "output": "3\n"},
+            {"input": "10 20\n", "output": "30\n"}
+        ],
+        "constraints": "|a|,|b| <= 10^9"
+    })
+    response = client.post("/api/submissions/", json={
+        "problem_id": problem_id,
+        "language": "python",
+        "code": "print(3)  # " + uuid.uuid4().hex
+    })
+    submission_id = response.json()["data"]["submission_id"]
+    wait_for_judging(problem_id)
+
+    response = client.get(f"/api/submissions/?problem_id={problem_id}")
+    assert response.json()["data"]["submissions"][0]["status"] == "error"
+    response = client.get(f"/api/submissions/{submission_id}/log")
+    assert [item["result"] for item in response.json()["data"]["details"]] == ["UNK", "UNK"]
+
+
+def test_more_judges_than_sandboxes(client, monkeypatch):
+    """Test judges beyond the sandboxes of a pool wait for them instead of hanging"""
+    setup_admin_session(client)
+
+    # Four judges share a single sandbox of each language
+    monkeypatch.setattr(judge_config, "POOL_SIZE", 1)
+    monkeypatch.setattr(judge_config, "FAKE_RUN_LATENCY", 0.1)
+
+    problem_id = "test_slots_" + uuid.uuid4().hex[:4]
+    client.post("/api/problems/", json={
+        "id": problem_id,
+        "title": "测试排队",
+        "description": "计算a+b",
+        "input_description": "两个整数",
+        "output_description": "它们的和",
+        "samples": [{"input": "1 2\n", "output": "3\n"}],
+        "testcases": [{"input": "1 2\n", "output": "3\n"}],
+        "constraints": "|a|,|b| <= 10^9"
+    })
+    submission_ids = []
+    for i in range(judge_config.JUDGE_CONCURRENCY * 2):
+        language, code = ("python", "print(3)") if i % 2 else ("cpp", "int main() {}")
+        response = client.post("/api/submissions/", json={
+            "problem_id": problem_id,
+            "language": language,
+            "code": f"{code}  // {uuid.uuid4().hex}" if language == "cpp"
+                else f"{code}  # {uuid.uuid4().hex}"
+        })
+        submission_ids.append(response.json()["data"]["submission_id"])
+
+    wait_for_judging(problem_id)
+    for submission_id in submission_ids:
+        response = client.get(f"/api/submissions/{submission_id}/log")
+        assert [item["result"] for item in response.json()["data"]["details"]] == ["AC"]
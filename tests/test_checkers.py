@@ -0,0 +1,81 @@
+import random
+
+import pytest
+
+from app import checkers
+
+
+def line_check(answer: str, output: str) -> str:
+    """The line-by-line comparison the judge used before the streaming checker"""
+    ans_out = answer.split('\n')
+    test_out = output.split('\n')
+    ans_out.pop()
+    if test_out[-1] == '':
+        test_out.pop()
+    if not test_out:
+        return "WA"
+    if test_out[-1] == '':
+        test_out.pop()
+    if len(test_out) != len(ans_out):
+        return "WA"
+    for ans, test in zip(ans_out, test_out):
+        if test.endswith(' '):
+            test = test[:-1]
+        if ans != test:
+            return "WA"
+    return "AC"
+
+
+def check(tmp_path, answer: str, output: str) -> checkers.CheckResult:
+    (tmp_path / "answer").write_bytes(answer.encode())
+    (tmp_path / "output").write_bytes(output.encode())
+    return checkers.check_files(str(tmp_path / "answer"), str(tmp_path / "output"))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 65536])
+def test_same_verdicts_as_line_check(tmp_path, monkeypatch, chunk_size):
+    """Test the streaming checker agrees with the line comparison"""
+    monkeypatch.setattr(checkers, "CHUNK_SIZE", chunk_size)
+    rng = random.Random(chunk_size)
+    for _ in range(500):
+        answer = "".join(rng.choice("ab \n") for _ in range(rng.randint(0, 8)))
+        output = "".join(rng.choice("ab \n") for _ in range(rng.randint(0, 8)))
+        assert check(tmp_path, answer, output).result == line_check(answer, output), \
+            (answer, output)
+
+
+def test_mismatch_position(tmp_path):
+    """Test the first mismatch is reported with its line and column"""
+    result = check(tmp_path, "1 2\n3 4\n", "1 2\n3 5\n")
+    assert result.result == "WA"
+    assert result.message == "line 2, column 3: expected '4', found '5'"
+
+    result = check(tmp_path, "1\n2\n", "1 \n")
+    assert result.message == "line 2, column 1: expected '2', found end of output"
+
+    assert check(tmp_path, "1\n", "").message == "empty output"
+    assert check(tmp_path, "1\n2\n", "1 \n2 \n\n").result == "AC"
+
+
+@pytest.mark.parametrize("chunk_size, token_block", [(1, 2), (3, 2), (65536, 65536)])
+def test_float_tokens(tmp_path, monkeypatch, chunk_size, token_block):
+    """Test the float checker accepts numbers within eps"""
+    monkeypatch.setattr(checkers, "CHUNK_SIZE", chunk_size)
+    monkeypatch.setattr(checkers, "TOKEN_BLOCK", token_block)
+
+    def check_floats(answer: str, output: str) -> checkers.CheckResult:
+        (tmp_path / "answer").write_bytes(answer.encode())
+        (tmp_path / "output").write_bytes(output.encode())
+        return checkers.check_files(
+            str(tmp_path / "answer"), str(tmp_path / "output"), "float", 1e-6
+        )
+
+    assert check_floats("0.3333333 yes\n1000000\n", "0.33333331  yes 1000000.5").result == "AC"
+    assert check_floats("1 2 3\n", "1\n2\n3\n\n").result == "AC"
+    assert check_floats("nan inf\n", "nan inf\n").result == "AC"
+
+    result = check_floats("1.5 2.5 3.5\n", "1.5 2.5 3.6\n")
+    assert result.result == "WA"
+    assert result.message == "token 3: expected '3.5', found '3.6'"
+    assert check_floats("1 yes\n", "1 no\n").message == "token 2: expected 'yes', found 'no'"
+    assert check_floats("1 2\n", "1\n").message == "token 2: expected '2', found end of output"
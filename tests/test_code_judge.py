@@ -0,0 +1,213 @@
+import asyncio
+import time
+
+import pytest
+
+from app import code_judge
+from app import judge_config
+from app import judge_runtime
+from app import language_registry
+from app import local_sandbox
+from app import testcase_store
+from app.fake_sandbox import FakePool
+
+
+# Case 1 ends after the cases started next to it, case 2 runs out of CPU
+# time, case 3 out of memory and case 5 answers wrong
+CODE = """
+import time
+n = int(input())
+if n == 1:
+    time.sleep(0.6)
+if n == 2:
+    while True:
+        pass
+if n == 3:
+    data = b"x" * (100 << 20)
+print(n * 2 if n != 5 else 0)
+"""
+
+
+def test_parallel_cases(tmp_path, monkeypatch):
+    """Test cases run in parallel keep the order of the log and their own limits"""
+    monkeypatch.setattr(judge_config, "SANDBOX_DIR", str(tmp_path / "sandbox"))
+    monkeypatch.setattr(judge_config, "TESTCASE_DIR", str(tmp_path / "testcases"))
+    monkeypatch.setattr(judge_config, "LOCAL_SANDBOX_UID", 0)
+    monkeypatch.setattr(judge_config, "LOCAL_SANDBOX_INSECURE", True)
+    monkeypatch.setattr(judge_config, "CASE_PARALLELISM", 3)
+    monkeypatch.setattr(judge_config, "JUDGE_MODE", "batch")
+
+    manifest = testcase_store.store_testcases([
+        {"input": f"{n}\n", "output": f"{n * 2}\n"} for n in range(1, 6)
+    ])
+    log = [{"id": i + 1, "result": "UNK", "time": 0.0, "memory": 0} for i in range(5)]
+
+    pool = local_sandbox.LocalPool("test", 128, 1, 10)
+    sandbox = pool.lease()
+    try:
+        asyncio.run(code_judge.judge_in_sandbox(
+            sandbox, CODE, language_registry.BUILTIN_LANGUAGES["python"],
+            manifest, 0.5, 64, log
+        ))
+    finally:
+        pool.release(sandbox)
+        pool.close()
+
+    assert [item["id"] for item in log] == [1, 2, 3, 4, 5]
+    assert [item["result"] for item in log] == ["AC", "TLE", "MLE", "AC", "WA"]
+    assert log[1]["time"] == 0.5
+    assert log[2]["memory"] == 64
+    assert log[0]["memory"] < 64
+
+
+CHECKER = """
+#include <fstream>
+#include <iterator>
+#include <string>
+std::string read(const char *path) {
+    std::ifstream f(path);
+    return std::string(std::istreambuf_iterator<char>(f), {});
+}
+int main(int argc, char **argv) {
+    return read(argv[2]) == read(argv[3]) ? 0 : 1;
+}
+"""
+
+# Replaces its output with a link to where the answer used to be written
+LINK_TO_ANSWER = """
+from pathlib import Path
+output = Path("/proc/self/fd/1").resolve()
+output.unlink()
+output.symlink_to("answer.txt")
+"""
+
+
+def test_special_judge_reads_regular_output_only(tmp_path, monkeypatch):
+    """Test the special judge only checks outputs which are regular files"""
+    monkeypatch.setattr(judge_config, "SANDBOX_BACKEND", "local")
+    monkeypatch.setattr(judge_config, "SANDBOX_DIR", str(tmp_path / "sandbox"))
+    monkeypatch.setattr(judge_config, "TESTCASE_DIR", str(tmp_path / "testcases"))
+    monkeypatch.setattr(judge_config, "COMPILE_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(judge_config, "LOCAL_SANDBOX_UID", 0)
+    monkeypatch.setattr(judge_config, "LOCAL_SANDBOX_INSECURE", True)
+
+    manifest = testcase_store.store_testcases([{"input": "3\n", "output": "6\n"}])
+    pool = local_sandbox.LocalPool("test", 128, 1, 10)
+    results = []
+    try:
+        for code in ("print(int(input()) * 2)", LINK_TO_ANSWER):
+            log = [{"id": 1, "result": "UNK", "time": 0.0, "memory": 0}]
+            sandbox = pool.lease()
+            try:
+                asyncio.run(code_judge.judge_in_sandbox(
+                    sandbox, code, language_registry.BUILTIN_LANGUAGES["python"],
+                    manifest, 1.0, 64, log, checker="special", checker_code=CHECKER
+                ))
+            finally:
+                pool.release(sandbox)
+            results.append(log[0]["result"])
+    finally:
+        pool.close()
+        judge_runtime.close_pools()
+
+    assert results == ["AC", "WA"]
+
+
+def test_cancelled_lease_releases_sandbox(tmp_path, monkeypatch):
+    """Test a sandbox leased for a cancelled caller goes back to its pool"""
+    monkeypatch.setattr(judge_config, "SANDBOX_DIR", str(tmp_path))
+    pool = FakePool("test", 1, 10)
+    held = pool.lease()
+
+    async def main():
+        task = asyncio.create_task(code_judge.lease_sandbox(pool))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        # The waiting lease gets the sandbox and gives it back
+        await code_judge.release_sandbox(pool, held)
+        for _ in range(50):
+            if pool._idle:
+                break
+            await asyncio.sleep(0.1)
+
+    asyncio.run(main())
+    assert pool._idle == [held]
+    pool.close()
+
+
+def judge_fake(tmp_path, monkeypatch, code: str, cases: int, **kwargs) -> list:
+    """Judge python code against `cases` cases in a fake sandbox, returning the log"""
+    monkeypatch.setattr(judge_config, "SANDBOX_DIR", str(tmp_path / "sandbox"))
+    monkeypatch.setattr(judge_config, "TESTCASE_DIR", str(tmp_path / "testcases"))
+    manifest = testcase_store.store_testcases([
+        {"input": f"{n}\n", "output": f"{n * 2}\n"} for n in range(1, cases + 1)
+    ])
+    log = [{"id": i + 1, "result": "UNK", "time": 0.0, "memory": 0} for i in range(cases)]
+
+    pool = FakePool("test", 1, 10)
+    sandbox = pool.lease()
+    try:
+        asyncio.run(code_judge.judge_in_sandbox(
+            sandbox, code, language_registry.BUILTIN_LANGUAGES["python"],
+            manifest, 1.0, 64, log, **kwargs
+        ))
+    finally:
+        pool.release(sandbox)
+        pool.close()
+    return log
+
+
+
+@pytest.mark.parametrize("mode", ["batch", "case"])
+def test_parallel_memory_limits(tmp_path, monkeypatch, mode):
+    """Test each case run in parallel gets its own memory verdict and figure"""
+    monkeypatch.setattr(judge_config, "JUDGE_MODE", mode)
+    monkeypatch.setattr(judge_config, "CASE_PARALLELISM", 3)
+
+    log = judge_fake(tmp_path, monkeypatch, "print(0)  # fake: MLE", 4)
+    assert [item["id"] for item in log] == [1, 2, 3, 4]
+    assert [item["result"] for item in log] == ["MLE"] * 4
+    assert [item["memory"] for item in log] == [64] * 4
+
+    # Cases within the limit keep the peak of their own process
+    log = judge_fake(tmp_path, monkeypatch, "print(0)  # fake: WA", 4)
+    assert [item["result"] for item in log] == ["WA"] * 4
+    assert [item["memory"] for item in log] == [1.0] * 4
+
+
+@pytest.mark.parametrize("mode", ["batch", "case"])
+def test_parallel_cpu_time_limits(tmp_path, monkeypatch, mode):
+    """Test cases run in parallel are timed out on their own CPU time"""
+    monkeypatch.setattr(judge_config, "JUDGE_MODE", mode)
+    monkeypatch.setattr(judge_config, "CASE_PARALLELISM", 3)
+    monkeypatch.setattr(judge_config, "FAKE_RUN_LATENCY", 0.3)
+
+    start = time.monotonic()
+    log = judge_fake(tmp_path, monkeypatch, "# fake: TLE", 3)
+    elapsed = time.monotonic() - start
+    assert [item["result"] for item in log] == ["TLE"] * 3
+    assert [item["time"] for item in log] == [1.0] * 3
+
+    # Cases judged one call each run side by side
+    if mode == "case":
+        assert elapsed < 0.8
+
+    # Cases within the limit report their CPU time
+    log = judge_fake(tmp_path, monkeypatch, "print(0)  # fake: WA", 3)
+    assert [item["time"] for item in log] == [0.3] * 3
+
+
+@pytest.mark.parametrize("mode", ["batch", "case"])
+def test_fail_fast_skips_remaining_cases(tmp_path, monkeypatch, mode):
+    """Test cases after the fail-fast policy is met are skipped in both judge modes"""
+    monkeypatch.setattr(judge_config, "JUDGE_MODE", mode)
+
+    log = judge_fake(tmp_path, monkeypatch, "print(0)  # fake: WA", 5, fail_fast=2)
+    assert [item["result"] for item in log] == ["WA", "WA", "SKIPPED", "SKIPPED", "SKIPPED"]
+
+    # Without a policy every case runs
+    log = judge_fake(tmp_path, monkeypatch, "print(0)  # fake: WA", 5)
+    assert [item["result"] for item in log] == ["WA"] * 5
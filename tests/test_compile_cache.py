@@ -0,0 +1,74 @@
+import os
+
+from app import compile_cache
+from app import judge_config
+
+
+def test_lru_eviction(tmp_path, monkeypatch):
+    """Test the least recently used entries go once the cache is over its size"""
+    monkeypatch.setattr(judge_config, "COMPILE_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(judge_config, "COMPILE_CACHE_SIZE", 1)
+    binary = tmp_path / "main"
+    binary.write_bytes(b"\0" * 400 * 1024)
+
+    keys = [compile_cache.cache_key(f"code {i}", "image", "cc") for i in range(3)]
+    for i, key in enumerate(keys[:2]):
+        compile_cache.store(key, True, "", str(binary))
+        os.utime(os.path.join(judge_config.COMPILE_CACHE_DIR, key), (i, i))
+
+    # The first entry is used again, the second one is the oldest then
+    entry = compile_cache.lookup(keys[0])
+    assert entry.success
+    assert os.path.getsize(entry.binary) == 400 * 1024
+
+    compile_cache.store(keys[2], True, "", str(binary))
+    assert compile_cache.lookup(keys[1]) is None
+    assert compile_cache.lookup(keys[0]) is not None
+    assert compile_cache.lookup(keys[2]) is not None
+
+    # Failed compilations are cached without a binary
+    key = compile_cache.cache_key("broken", "image", "cc")
+    compile_cache.store(key, False, "error")
+    entry = compile_cache.lookup(key)
+    assert not entry.success
+    assert entry.output == "error"
+    assert entry.binary is None
+
+
+def test_checked_out_binary_survives_eviction(tmp_path, monkeypatch):
+    """Test a binary checked out of the cache stays until it is discarded"""
+    monkeypatch.setattr(judge_config, "COMPILE_CACHE_DIR", str(tmp_path / "cache"))
+    binary = tmp_path / "main"
+    binary.write_bytes(b"binary")
+    key = compile_cache.cache_key("code", "image", "cc")
+    compile_cache.store(key, True, "", str(binary))
+
+    entry = compile_cache.checkout(key)
+    compile_cache.evict(0)
+    assert compile_cache.lookup(key) is None
+    with open(entry.binary, "rb") as f:
+        assert f.read() == b"binary"
+
+    compile_cache.discard(entry)
+    assert not os.path.exists(entry.binary)
+    assert os.listdir(judge_config.COMPILE_CACHE_DIR) == []
+
+
+def test_checkout_after_eviction_is_a_miss(tmp_path, monkeypatch):
+    """Test an entry evicted between the lookup and the checkout is a miss"""
+    monkeypatch.setattr(judge_config, "COMPILE_CACHE_DIR", str(tmp_path / "cache"))
+    binary = tmp_path / "main"
+    binary.write_bytes(b"binary")
+    key = compile_cache.cache_key("code", "image", "cc")
+    compile_cache.store(key, True, "", str(binary))
+
+    lookup = compile_cache.lookup
+
+    def lookup_then_evict(key):
+        entry = lookup(key)
+        compile_cache.evict(0)
+        return entry
+
+    monkeypatch.setattr(compile_cache, "lookup", lookup_then_evict)
+    assert compile_cache.checkout(key) is None
+    assert os.listdir(judge_config.COMPILE_CACHE_DIR) == []
@@ -0,0 +1,40 @@
+import os
+
+from app import container_pool
+from app import judge_config
+from app.fake_sandbox import FakePool
+
+
+def test_pool_reset_and_recycle(tmp_path, monkeypatch):
+    """Test released sandboxes are emptied, and recycled after max_uses leases"""
+    monkeypatch.setattr(judge_config, "SANDBOX_DIR", str(tmp_path))
+    pool = FakePool("test", 1, 2)
+
+    sandbox = pool.lease()
+    os.makedirs(os.path.join(sandbox.workdir, "dir"))
+    with open(os.path.join(sandbox.workdir, "dir", "file"), "w") as f:
+        f.write("left by the last submission")
+    os.symlink("/", os.path.join(sandbox.workdir, "link"))
+    pool.release(sandbox)
+    assert os.listdir(sandbox.workdir) == []
+
+    # The clean sandbox is leased again until it is worn out
+    assert pool.lease() is sandbox
+    pool.release(sandbox)
+    assert not os.path.exists(sandbox.workdir)
+
+    fresh = pool.lease()
+    assert fresh is not sandbox
+    assert fresh.uses == 1
+    pool.release(fresh)
+    pool.close()
+    assert not os.path.exists(fresh.workdir)
+
+
+def test_ccache_only_for_builtin_compilers():
+    """Test compilers of registered languages never mount the ccache volume"""
+    args = container_pool.compiler_args("{}", ccache=True)
+    assert judge_config.CCACHE_VOLUME in args["volumes"]
+    args = container_pool.compiler_args("{}")
+    assert args["volumes"] == {}
+    assert "CCACHE_DIR" not in args.get("environment", {})
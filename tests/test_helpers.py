@@ -1,4 +1,6 @@
-"""Common test helpers that only use documented APIs"""
+"""Common test helpers that only use documented APIs, besides waiting on the judge queue"""
+import sqlite3
+import time
 import uuid
 
 
@@ -94,4 +96,25 @@ def create_test_problem(client, problem_id=None):
     if response.status_code == 200:
         return problem_id, problem_data
     else:
-        raise Exception(f"Failed to create problem: {response.json()}")
\ No newline at end of file
+        raise Exception(f"Failed to create problem: {response.json()}")
+
+
+
+def wait_for_judging(problem_id, timeout=10):
+    """Helper to wait until the judge queue holds no job of a problem"""
+    deadline = time.monotonic() + timeout
+    while True:
+        with sqlite3.connect('./app/oj_system.db') as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """SELECT COUNT(*) FROM judge_queue JOIN submissions
+                ON submissions.id = judge_queue.submission_id
+                WHERE submissions.problem_id = ?
+                AND judge_queue.status IN ('queued', 'running', 'cancelling')""",
+                (problem_id,)
+            )
+            if cursor.fetchone()[0] == 0:
+                return
+        if time.monotonic() > deadline:
+            raise Exception(f"Judging of {problem_id} timed out")
+        time.sleep(0.05)
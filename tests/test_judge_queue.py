@@ -0,0 +1,126 @@
+import asyncio
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+from app import judge_queue
+from app.initialize_table import create_table
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """A database of its own, so that no judge of the app takes its jobs"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "app").mkdir()
+    asyncio.run(create_table())
+    with sqlite3.connect('./app/oj_system.db') as conn:
+        conn.executemany(
+            """INSERT INTO submissions (user_id, problem_id, code, language, status)
+            VALUES (1, 'p', ?, 'python', 'pending')""",
+            [(f"print({i})", ) for i in range(5)]
+        )
+        conn.commit()
+
+
+def job_status(submission_id: int) -> list:
+    with sqlite3.connect('./app/oj_system.db') as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT status FROM judge_queue WHERE submission_id = ? ORDER BY id",
+            (submission_id, )
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def test_queue_position(database):
+    """Test positions follow priority then order, and duplicates are merged"""
+    assert judge_queue.enqueue_sync(1) == 1
+    assert judge_queue.enqueue_sync(2) == 2
+    assert judge_queue.enqueue_sync(3, judge_queue.PRIORITY_REJUDGE) == 3
+
+    # Live submissions go before rejudges queued earlier
+    assert judge_queue.enqueue_sync(4) == 3
+    assert judge_queue.enqueue_sync(3) == 3
+    assert judge_queue.enqueue_sync(1) == 1
+    assert job_status(1) == ["queued"]
+
+    job = judge_queue.claim_sync()
+    assert job[1] == 1
+    assert job_status(1) == ["running"]
+    assert judge_queue.enqueue_sync(2) == 1
+
+    # A request for a running submission queues a job behind it, which is
+    # only claimed once the running one is done
+    assert judge_queue.enqueue_sync(1) == 4
+    assert job_status(1) == ["running", "queued"]
+    assert [judge_queue.claim_sync()[1] for _ in range(3)] == [2, 3, 4]
+    assert judge_queue.claim_sync() is None
+    judge_queue.finish_sync(job[0])
+    assert judge_queue.claim_sync()[1] == 1
+
+
+def test_recover_jobs_of_dead_workers(database):
+    """Test running jobs of dead workers are queued again, others are kept"""
+    for submission_id in (1, 2, 3):
+        judge_queue.enqueue_sync(submission_id)
+        judge_queue.claim_sync()
+
+    # A worker which is gone, and one which is alive
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    with sqlite3.connect('./app/oj_system.db') as conn:
+        conn.execute("UPDATE judge_queue SET worker = ? WHERE submission_id = 1", (process.pid, ))
+        conn.execute("UPDATE judge_queue SET worker = ? WHERE submission_id = 2", (os.getppid(), ))
+        conn.commit()
+
+    judge_queue.recover_sync()
+    assert job_status(1) == ["queued"]
+    assert job_status(2) == ["running"]
+    # Jobs of the recovering process itself are left by a previous run
+    assert job_status(3) == ["queued"]
+    # Pending submissions without a job are queued too
+    assert job_status(4) == ["queued"]
+    assert job_status(5) == ["queued"]
+
+
+def test_cancelling_job_is_not_duplicated(database):
+    """Test a job being cancelled still counts as the job of its submission"""
+    judge_queue.enqueue_sync(1)
+    judge_queue.claim_sync()
+    assert judge_queue.cancel_sync(1) == "cancelling"
+
+    _, queued = judge_queue.create_batch_sync([1, 2], {})
+    assert queued == 1
+    assert job_status(1) == ["cancelling"]
+    assert job_status(2) == ["queued"]
+
+
+def test_scheduler_waits_for_judges(database, monkeypatch):
+    """Test a cancelled scheduler returns only once its judges are stopped"""
+    stopped = []
+
+    async def judge(submission_id, *args):
+        try:
+            await asyncio.sleep(30)
+        finally:
+            await asyncio.sleep(0.1)
+            stopped.append(submission_id)
+
+    monkeypatch.setattr(judge_queue, "judge_in_docker", judge)
+    judge_queue.enqueue_sync(1)
+
+    async def main():
+        scheduler = asyncio.create_task(judge_queue.run_scheduler(1))
+        while job_status(1) != ["running"]:
+            await asyncio.sleep(0.05)
+        scheduler.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await scheduler
+
+    asyncio.run(main())
+    assert stopped == [1]
+    # Left running, it is queued again once this worker is gone
+    assert job_status(1) == ["running"]
@@ -0,0 +1,29 @@
+import sqlite3
+
+from app import judge_config
+from app import judge_runtime
+from app import language_registry
+
+
+def test_runtime_refreshed_on_config_change(monkeypatch):
+    """Test the runtime is built once and rebuilt when settings change"""
+    monkeypatch.setattr(judge_config, "SANDBOX_BACKEND", "docker")
+    judge_runtime.close_pools()
+    runtime = judge_runtime.get_runtime()
+    assert judge_runtime.get_runtime() is runtime
+
+    # Every template uses the profile serialized once
+    for args in runtime.templates.values():
+        assert args["security_opt"][0] == f"seccomp={runtime.seccomp}"
+
+    monkeypatch.setattr(judge_config, "POOL_SIZE", judge_config.POOL_SIZE + 1)
+    refreshed = judge_runtime.get_runtime()
+    assert refreshed is not runtime
+    assert judge_runtime.get_runtime() is refreshed
+
+    # Registering a language bumps the version the runtime was built with
+    with sqlite3.connect('./app/oj_system.db') as conn:
+        language_registry.invalidate(conn.cursor())
+        conn.commit()
+    assert judge_runtime.get_runtime() is not refreshed
+    judge_runtime.close_pools()
@@ -0,0 +1,114 @@
+import os
+import stat
+import threading
+import time
+
+import pytest
+
+from app import judge_config
+from app import local_sandbox
+from app import testcase_store
+
+
+def sandbox_processes(sandbox) -> list:
+    """Pids of the live processes carrying the marker of the sandbox"""
+    marker = f"{local_sandbox.MARKER}={sandbox.sandbox_id}".encode()
+    pids = []
+    for name in os.listdir("/proc"):
+        try:
+            with open(f"/proc/{name}/environ", "rb") as f:
+                if marker not in f.read().split(b"\0"):
+                    continue
+            with open(f"/proc/{name}/stat") as f:
+                if f.read().rpartition(")")[2].split()[0] != "Z":
+                    pids.append(int(name))
+        except (OSError, ValueError):
+            continue
+    return pids
+
+
+def test_local_sandbox(tmp_path, monkeypatch):
+    """Test commands of local sandboxes run in their workdir and are killed"""
+    monkeypatch.setattr(judge_config, "SANDBOX_DIR", str(tmp_path))
+    monkeypatch.setattr(judge_config, "LOCAL_SANDBOX_UID", 0)
+    monkeypatch.setattr(judge_config, "LOCAL_SANDBOX_INSECURE", True)
+    pool = local_sandbox.LocalPool("test", 128, 1, 10)
+    sandbox = pool.lease()
+
+    exit_code, stdout, _ = sandbox.exec_run(["sh", "-c", "echo hi > out; cat out"])
+    assert exit_code == 0
+    assert stdout == b"hi\n"
+
+    # A process leaving the process group of its command is found too
+    exit_code, _ = sandbox.exec_stream(
+        ["sh", "-c", "setsid sleep 60 > /dev/null 2>&1 &"], lambda data: None
+    )
+    assert exit_code == 0
+    sandbox.kill()
+    time.sleep(0.1)
+    assert sandbox_processes(sandbox) == []
+
+    pool.release(sandbox)
+    pool.close()
+
+
+def test_refuse_unconfined_sandbox(tmp_path, monkeypatch):
+    """Test the local backend refuses to run submissions as the judge user"""
+    monkeypatch.setattr(judge_config, "SANDBOX_DIR", str(tmp_path))
+    monkeypatch.setattr(judge_config, "LOCAL_SANDBOX_UID", os.geteuid())
+    monkeypatch.setattr(judge_config, "LOCAL_SANDBOX_INSECURE", False)
+    with pytest.raises(RuntimeError):
+        local_sandbox.LocalPool("test", 128, 1, 10)
+
+
+def test_outputs_readable_by_judge_only(tmp_path, monkeypatch):
+    """Test expected outputs are kept away from the sandbox user"""
+    monkeypatch.setattr(judge_config, "TESTCASE_DIR", str(tmp_path))
+    digest, _ = testcase_store.put("output", "6\n")
+    assert stat.S_IMODE(os.stat(tmp_path / "output").st_mode) == 0o700
+    assert stat.S_IMODE(os.stat(testcase_store.file_path("output", digest)).st_mode) == 0o600
+    digest, _ = testcase_store.put("input", "3\n")
+    assert stat.S_IMODE(os.stat(testcase_store.file_path("input", digest)).st_mode) == 0o644
+
+
+@pytest.mark.skipif(os.geteuid() != 0, reason="sandbox users need a root judge")
+def test_sandboxes_run_as_their_own_users(tmp_path, monkeypatch):
+    """Test sandboxes have their own user and workdir, and cannot kill each other"""
+    os.chmod(tmp_path, 0o755)
+    monkeypatch.setattr(judge_config, "SANDBOX_DIR", str(tmp_path))
+    monkeypatch.setattr(judge_config, "LOCAL_SANDBOX_UID", 20000)
+    monkeypatch.setattr(judge_config, "LOCAL_SANDBOX_UIDS", 2)
+    monkeypatch.setattr(judge_config, "LOCAL_SANDBOX_INSECURE", True)
+    pool = local_sandbox.LocalPool("test", 128, 2, 10)
+    first = pool.lease()
+    second = pool.lease()
+    try:
+        assert {first.uid, second.uid} == {20000, 20001}
+        for sandbox in (first, second):
+            info = os.stat(sandbox.workdir)
+            assert info.st_uid == sandbox.uid
+            assert stat.S_IMODE(info.st_mode) == 0o700
+            _, stdout, _ = sandbox.exec_run(["id", "-u"])
+            assert int(stdout) == sandbox.uid
+
+        # Every user of the range is taken
+        with pytest.raises(RuntimeError):
+            local_sandbox.allocate_uid()
+
+        exit_code, _, _ = second.exec_run(["ls", first.workdir])
+        assert exit_code != 0
+
+        # kill(-1) of one sandbox never reaches the other
+        results = []
+        thread = threading.Thread(
+            target=lambda: results.append(second.exec_run(["sleep", "1"]))
+        )
+        thread.start()
+        time.sleep(0.3)
+        first.exec_run(["sh", "-c", "kill -9 -1; true"])
+        thread.join()
+        assert results[0][0] == 0
+    finally:
+        pool.release(first)
+        pool.release(second)
+        pool.close()
@@ -0,0 +1,14 @@
+from app import language_registry
+from app import result_cache
+
+
+def test_code_hash_keeps_whitespace():
+    """Test only line endings are dropped when hashing code"""
+    python = language_registry.BUILTIN_LANGUAGES["python"]
+    code = 'print("""3  \n""", end="")\n'
+    assert result_cache.code_hash(code, python) != result_cache.code_hash(
+        'print("""3\n""", end="")\n', python
+    )
+    assert result_cache.code_hash(code, python) == result_cache.code_hash(
+        code.replace("\n", "\r\n"), python
+    )
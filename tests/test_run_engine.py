@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+from app import judge_config
+from app import local_sandbox
+from app import run_engine
+
+
+def test_run_timeout(tmp_path, monkeypatch):
+    """Test commands are killed at their deadline and report it"""
+    monkeypatch.setattr(judge_config, "SANDBOX_DIR", str(tmp_path))
+    monkeypatch.setattr(judge_config, "LOCAL_SANDBOX_UID", 0)
+    monkeypatch.setattr(judge_config, "LOCAL_SANDBOX_INSECURE", True)
+    pool = local_sandbox.LocalPool("test", 128, 1, 10)
+    sandbox = pool.lease()
+
+    result = asyncio.run(run_engine.run(sandbox, ["sh", "-c", "echo hi"], 5.0))
+    assert result.exit_code == 0
+    assert result.stdout == b"hi\n"
+    assert not result.timed_out
+
+    start = time.monotonic()
+    result = asyncio.run(run_engine.run(sandbox, ["sh", "-c", "sleep 30"], 0.5))
+    assert time.monotonic() - start < 5
+    assert result.timed_out
+    assert result.time == 0.5
+
+    # Lines written before the deadline are passed on
+    lines = []
+
+    async def collect(line: bytes) -> bool:
+        lines.append(line)
+        return False
+
+    async def stop(line: bytes) -> bool:
+        return line == b"stop"
+
+    start = time.monotonic()
+    result = asyncio.run(run_engine.stream(
+        sandbox,
+        ["sh", "-c", "echo a; echo b; sleep 30"],
+        0.5,
+        collect
+    ))
+    assert time.monotonic() - start < 5
+    assert result.timed_out
+    assert lines == [b"a", b"b"]
+
+    # The command is killed once a line asks for it
+    start = time.monotonic()
+    result = asyncio.run(run_engine.stream(
+        sandbox,
+        ["sh", "-c", "echo stop; sleep 30"],
+        30.0,
+        stop
+    ))
+    assert time.monotonic() - start < 5
+    assert not result.timed_out
+
+    pool.release(sandbox)
+    pool.close()
@@ -0,0 +1,70 @@
+import signal
+import sys
+
+from app import code_judge
+from app import sandbox_runner
+
+
+def run(tmp_path, code: str, output_limit: int) -> dict:
+    (tmp_path / "input").write_text("")
+    spec = {
+        "cmd": [sys.executable, "-c", code],
+        "time_limit": 5.0,
+        "wall_limit": 10.0,
+        "stop_on_error": True,
+        "output_limit": output_limit,
+        "cases": [{
+            "id": 1,
+            "input": str(tmp_path / "input"),
+            "output": str(tmp_path / "1.out"),
+            "error": str(tmp_path / "1.err"),
+        }],
+    }
+    return next(sandbox_runner.run_cases(spec))
+
+
+def test_output_limit(tmp_path):
+    """Test endless output is stopped just over the output limit"""
+    report = run(tmp_path, "while True: print('x' * 1000)", 1 << 16)
+    assert report["output_limit_exceeded"]
+    assert report["output_size"] == (1 << 16) + 1
+    assert not sandbox_runner.is_runtime_error(report)
+
+    report = run(tmp_path, "print('x' * 1000)", 1 << 16)
+    assert not report["output_limit_exceeded"]
+    assert report["exit_code"] == 0
+
+
+def test_removed_output(tmp_path):
+    """Test a case removing or replacing its own output files is still reported"""
+    output = tmp_path / "1.out"
+    report = run(
+        tmp_path,
+        f"import os; print('x' * 99); os.remove({str(output)!r}); "
+        f"os.remove({str(tmp_path / '1.err')!r})",
+        1 << 16
+    )
+    assert report["status"] == "finished"
+    assert report["output_size"] == 100
+    assert report["error_size"] == 0
+
+    report = run(
+        tmp_path,
+        f"import os; print('x', flush=True); os.remove({str(output)!r}); "
+        f"os.symlink('missing', {str(output)!r})",
+        1 << 16
+    )
+    assert report["output_size"] == 2
+    assert report["exit_code"] == 0
+
+
+def test_killed_case_is_runtime_error(tmp_path):
+    """Test a case killed by SIGKILL outside of the limits is a runtime error for the judge too"""
+    report = run(tmp_path, "import os, signal; os.kill(os.getpid(), signal.SIGKILL)", 0)
+    assert report["signal"] == signal.SIGKILL
+    assert not report["oom_killed"]
+    assert sandbox_runner.is_runtime_error(report)
+
+    entry = {"id": 1, "result": "UNK", "time": 0.0, "memory": 0}
+    assert not code_judge.judge_case(report, 5.0, 1024, entry)
+    assert entry["result"] == "RE"